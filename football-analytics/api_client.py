@@ -0,0 +1,198 @@
+"""Cliente HTTP de football-data.org para el importador.
+
+Reutiliza una sola `requests.Session`, limita la tasa con un token bucket,
+reintenta con backoff exponencial ante 429/5xx y envía ETag/If-Modified-Since
+para saltarse los recursos que no cambiaron. La URL base es configurable
+(API_BASE_URL), de modo que se puede probar sin red contra un servidor local,
+p. ej. `python -m http.server` sobre un directorio con respuestas grabadas.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Configuración del cliente de la API
+API_CONFIG = {
+    'base_url': os.getenv('API_BASE_URL', 'http://api.football-data.org/v4/'),
+    # El plan gratuito permite 10 peticiones por minuto
+    'rate_per_minute': float(os.getenv('API_RATE_PER_MINUTE', '10')),
+    'burst': int(os.getenv('API_RATE_BURST', '1')),
+    'max_workers': int(os.getenv('API_MAX_WORKERS', '4')),
+    'max_retries': int(os.getenv('API_MAX_RETRIES', '5')),
+    'backoff_seconds': float(os.getenv('API_BACKOFF_SECONDS', '2')),
+    'timeout': float(os.getenv('API_TIMEOUT_SECONDS', '30')),
+    # Directorio donde se guardan ETag/Last-Modified y el último cuerpo recibido
+    'cache_dir': os.getenv('API_CACHE_DIR', '.api_cache')
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Limitador de tasa: `rate` fichas por segundo con capacidad `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya una ficha disponible"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ApiResponse:
+    """Cuerpo JSON de una respuesta y si el recurso no cambió (304)"""
+
+    def __init__(self, data, not_modified=False):
+        self.data = data
+        self.not_modified = not_modified
+
+
+class ApiClient:
+    def __init__(self, api_key, base_url=None, session=None, config=None):
+        self.config = dict(API_CONFIG, **(config or {}))
+        self.base_url = base_url or self.config['base_url']
+        self.session = session or requests.Session()
+        self.session.headers.update({'X-Auth-Token': api_key})
+        self.bucket = TokenBucket(self.config['rate_per_minute'] / 60.0, self.config['burst'])
+        self.stats = {'requests': 0, 'not_modified': 0, 'retries': 0}
+        self._stats_lock = threading.Lock()
+
+    # Caché de validadores condicionales (ETag / Last-Modified)
+    def _cache_path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.config['cache_dir'], f"{digest}.json")
+
+    def _load_cached(self, url):
+        try:
+            with open(self._cache_path(url), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store_cached(self, url, response, data):
+        if not self.config['cache_dir']:
+            return
+        entry = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'data': data
+        }
+        if not entry['etag'] and not entry['last_modified']:
+            return
+        os.makedirs(self.config['cache_dir'], exist_ok=True)
+        path = self._cache_path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _retry_delay(self, attempt, response=None):
+        """Backoff exponencial con jitter; respeta Retry-After si la API lo envía"""
+        if response is not None:
+            for header in ('Retry-After', 'X-RequestCounter-Reset'):
+                value = response.headers.get(header)
+                if value and value.isdigit():
+                    return float(value)
+        return self.config['backoff_seconds'] * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def get_json(self, path, params=None):
+        """GET con limitación de tasa, reintentos y petición condicional"""
+        url = requests.Request('GET', self.base_url + path, params=params).prepare().url
+        cached = self._load_cached(url) if self.config['cache_dir'] else None
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        max_retries = self.config['max_retries']
+        for attempt in range(max_retries + 1):
+            self.bucket.acquire()
+            self._count('requests')
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.config['timeout'])
+            except requests.RequestException as e:
+                if attempt == max_retries:
+                    raise
+                print(f"⚠️ Error de red en {path} ({e}); reintento {attempt + 1} de {max_retries}")
+                self._count('retries')
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code == 304:
+                if cached and cached.get('data') is not None:
+                    self._count('not_modified')
+                    return ApiResponse(cached['data'], not_modified=True)
+                # 304 sin cuerpo que reutilizar (entrada de caché incompleta): se pide entero
+                if headers and attempt < max_retries:
+                    print(f"⚠️ HTTP 304 en {path} sin cuerpo guardado; se repite sin petición condicional")
+                    self._count('retries')
+                    headers, cached = {}, None
+                    continue
+                raise requests.HTTPError(f"HTTP 304 en {path} sin cuerpo guardado que reutilizar",
+                                         response=response)
+            if response.status_code in RETRY_STATUS and attempt < max_retries:
+                print(f"⚠️ HTTP {response.status_code} en {path}; reintento {attempt + 1} de {max_retries}")
+                self._count('retries')
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+            response.raise_for_status()
+            data = response.json()
+            self._store_cached(url, response, data)
+            return ApiResponse(data)
+
+    def iter_fetch(self, requests_list):
+        """Descarga en paralelo (clave, path, params) y entrega (clave, ApiResponse o excepción) en orden.
+
+        El pool está acotado por `max_workers` y todas las peticiones pasan
+        por el mismo token bucket. Como mucho hay `max_workers` respuestas
+        descargadas a la espera de que el consumidor las pida.
+        """
+        def fetch(item):
+            key, path, params = item
+            try:
+                return key, self.get_json(path, params)
+            except Exception as e:
+                return key, e
+
+        max_workers = self.config['max_workers']
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            try:
+                for item in requests_list:
+                    pending.append(pool.submit(fetch, item))
+                    if len(pending) >= max_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Si el consumidor se detiene, las peticiones aún no iniciadas no se hacen
+                for future in pending:
+                    future.cancel()
+
+    def fetch_many(self, requests_list):
+        """Descarga en paralelo una lista de (clave, path, params); devuelve {clave: ApiResponse o excepción}"""
+        return dict(self.iter_fetch(requests_list))
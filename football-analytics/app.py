@@ -1,15 +1,30 @@
 import os
 import dash
-from dash import dcc, html, Input, Output, dash_table
+from dash import dcc, html, Input, Output, dash_table, ctx
 import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
-import networkx as nx
-from sqlalchemy import create_engine, text
+import time
+from flask import jsonify, request, g, Response
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-import time
+from db import get_engine, pool_stats
+from cache import match_cache, figure_cache, get_data_version
+from processing import process_match_data, derived_column
+from graphs import (
+    create_empty_figure, build_edge_weights, create_graph_figure, head_to_head_edges, layout_cache_stats,
+    GRAPH_PROGRESS_STEPS
+)
+from snapshot import preload_snapshot, get_snapshot, filter_snapshot
+from metrics import CONTENT_TYPE, REQUEST_SECONDS, span, instrumented, register_collector, render_metrics
+from rollups import ROLLUPS_READY_QUERY, build_kpi_queries, build_head_to_head_queries, combine_kpis
+from ratings import build_ranking_query
+from trends import TRENDS_CONFIG, TREND_METRICS, TREND_PERIODS, rolling_form, slice_form, trend_series
+from background import create_background_manager, start_warmup, warmup_status, cancel_warmup
+from queries import (
+    build_match_query, build_page_query, normalize_filters, filters_from_store, filter_hash,
+    FILTER_OPTIONS_QUERIES, TABLE_COLUMNS
+)
 # Cargar variables de entorno
 load_dotenv()
 
@@ -35,8 +50,27 @@ app = dash.Dash(
 
 server = app.server
 
+# Abrir la instantánea columnar al arrancar (memory-mapped, compartida entre workers)
+try:
+    preload_snapshot()
+except Exception as e:
+    logger.warning(f"⚠️ No se pudo abrir la instantánea: {str(e)[:200]}")
+
+# Filas por página de la tabla de detalle (paginación en el servidor)
+TABLE_PAGE_SIZE = int(os.getenv('TABLE_PAGE_SIZE', '10'))
+
+# Rango de fechas inicial del dashboard (también el que se precalienta)
+DEFAULT_START_DATE = datetime(2023, 1, 1)
+DEFAULT_END_DATE = datetime.now()
+
+# Figuras pesadas en un proceso aparte; resultados en disco por entradas y versión de datos
+background_manager = create_background_manager(cache_by=[get_data_version])
+
 # Layout de la aplicación
 app.layout = html.Div(style={'fontFamily': 'Open Sans, sans-serif'}, children=[
+    dcc.Location(id='url'),
+    # Filtros normalizados y su hash; los datos se quedan en la caché del servidor
+    dcc.Store(id='filtered-data'),
     # Header
     html.Div(style={
         'backgroundColor': '#2c3e50', 
@@ -62,8 +96,8 @@ app.layout = html.Div(style={'fontFamily': 'Open Sans, sans-serif'}, children=[
             id='date-range',
             min_date_allowed=datetime(2020, 1, 1),
             max_date_allowed=datetime.now(),
-            start_date=datetime(2023, 1, 1),
-            end_date=datetime.now()
+            start_date=DEFAULT_START_DATE,
+            end_date=DEFAULT_END_DATE
         ),
         dcc.Dropdown(
             id='competition-filter', 
@@ -98,12 +132,48 @@ app.layout = html.Div(style={'fontFamily': 'Open Sans, sans-serif'}, children=[
     }, children=[
         dcc.Graph(id='goals-comparison-chart'),
         dcc.Graph(id='results-distribution'),
-        dcc.Graph(id='directed-graph')       # Gráfico dirigido
+        dcc.Graph(id='directed-graph'),      # Gráfico dirigido
+        # Progreso de las figuras en segundo plano y botón para cancelarlas
+        html.Div(style={'display': 'flex', 'gap': '10px', 'alignItems': 'center'}, children=[
+            html.Progress(id='graph-progress', value='0', max=str(GRAPH_PROGRESS_STEPS),
+                          style={'visibility': 'hidden'}),
+            html.Button("Cancelar", id='cancel-figures', disabled=True, className='btn btn-sm btn-secondary')
+        ]),
+        dcc.Graph(id='ratings-chart'),       # Ranking Elo / PageRank a fecha
+        # Evolución de la forma (media de los últimos partidos) por equipo
+        html.Div(children=[
+            html.Div(style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '20px'}, children=[
+                dcc.RadioItems(
+                    id='trend-metric',
+                    options=[{'label': label, 'value': metric} for metric, label in TREND_METRICS.items()],
+                    value='points',
+                    inline=True
+                ),
+                dcc.RadioItems(
+                    id='trend-period',
+                    options=[{'label': label, 'value': period} for period, label in TREND_PERIODS.items()],
+                    value='match',
+                    inline=True
+                )
+            ]),
+            dcc.Graph(id='trend-chart')
+        ])
     ]),
     # Tabla de datos
     html.Div(style={'marginBottom': '20px'}, children=[
         html.H3("Detalle de Partidos", style={'marginBottom': '10px'}),
-        html.Div(id='matches-table')
+        dash_table.DataTable(
+            id='matches-table',
+            columns=[{"name": col, "id": col} for col in TABLE_COLUMNS],
+            page_current=0,
+            page_size=TABLE_PAGE_SIZE,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='single',
+            filter_action='custom',
+            filter_query='',
+            style_table={'overflowX': 'auto'}
+        )
     ]),
     
     # Footer
@@ -118,243 +188,181 @@ app.layout = html.Div(style={'fontFamily': 'Open Sans, sans-serif'}, children=[
         html.P(f"Última actualización: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     ])
 ])
-# CONFIGURACIÓN DE BASE DE DATOS
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'db'),
-    'port': os.getenv('DB_PORT', '3306'),
-    'user': os.getenv('DB_USER', 'futbol_user'),
-    'password': os.getenv('DB_PASSWORD', 'futbol_pass'),
-    'database': os.getenv('DB_NAME', 'futbol_db'),
-    'auth_plugin': 'mysql_native_password'
-}
 
-def get_db_connection():
-    """Establece conexión con la base de datos MySQL con reintentos"""
-    max_retries = 5
-    retry_delay = 5
-    
-    for attempt in range(max_retries):
-        try:
-            engine = create_engine(
-                f"mysql+mysqlconnector://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}",
-                pool_pre_ping=True,
-                pool_recycle=3600,
-                connect_args={
-                    'connect_timeout': 10,
-                    'auth_plugin': DB_CONFIG['auth_plugin']
-                }
-            )
-            logger.info("✅ Conexión exitosa a MySQL")
-            return engine
-        except Exception as e:
-            logger.error(f"⚠️ Intento {attempt + 1} de {max_retries}: Error de conexión - {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-    
-    raise ConnectionError("❌ No se pudo conectar a la base de datos después de varios intentos")
+def load_match_data(start_date=None, end_date=None, competition_ids=None, team_ids=None):
+    """Carga los partidos filtrados, sirviendo desde la caché mientras no haya una importación nueva"""
+    return load_filtered_data(normalize_filters(start_date, end_date, competition_ids, team_ids))
 
-def load_match_data():
-    """Carga los datos de partidos desde la base de datos"""
+def load_filtered_data(filters):
+    """Carga los partidos para una tupla de filtros ya normalizada"""
+    key = ('matches',) + filters
+    version = get_data_version()
+    df = match_cache.get(key, version)
+    if df is not None:
+        return df
+    df = fetch_filtered_data(filters, version)
+    if not df.empty:
+        match_cache.set(key, df, version)
+    return df
+
+def fetch_filtered_data(filters, version):
+    """Partidos filtrados sin pasar por la caché"""
+    # La instantánea en disco evita el join en MySQL mientras esté al día
+    snapshot = get_snapshot(version)
+    if snapshot is not None:
+        with span('snapshot_filter'):
+            return filter_snapshot(snapshot, filters)
+    return query_match_data(*filters)
+
+def query_match_data(start_key=None, end_key=None, competition_ids=(), team_ids=()):
+    """Carga los datos de partidos desde la base de datos, filtrando en SQL"""
     try:
-        engine = get_db_connection()
-        query = text("""
-            SELECT
-                ht.name as home_team,
-                at.name as away_team,
-                fm.home_score,
-                fm.away_score,
-                ms.possession_home,
-                ms.shots_on_target_home,
-                ms.shots_on_target_away,
-                CONCAT(d.year, '-', LPAD(d.month, 2, '0'), '-', LPAD(d.day, 2, '0')) AS match_date,  -- Crear la fecha
-                c.name as competition
-            FROM facts_matches fm
-            JOIN dim_teams ht ON fm.home_team_id = ht.id
-            JOIN dim_teams at ON fm.away_team_id = at.id
-            JOIN dim_match_stats ms ON fm.stats_id = ms.id
-            JOIN dim_dates d ON fm.date_id = d.id
-            JOIN dim_competitions c ON fm.competition_id = c.id
-            WHERE fm.home_score IS NOT NULL
-            ORDER BY match_date DESC
-            LIMIT 1000
-        """)
+        engine = get_engine()
+        query, params = build_match_query(start_key, end_key, competition_ids, team_ids)
         
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
+        # La conexión vuelve al pool al salir del bloque
+        with span('sql_matches'), engine.connect() as conn:
+            df = pd.read_sql(query, conn, params=params)
         
-        if not df.empty:
-# Procesamiento de datos
-            df['match_date'] = pd.to_datetime(df['match_date'])
-            df['result'] = df.apply(
-                lambda x: 'Local' if x['home_score'] > x['away_score'] else 
-                         'Visitante' if x['home_score'] < x['away_score'] else 'Empate',
-                axis=1
-            )
-            df['total_goals'] = df['home_score'] + df['away_score']
-            df['possession_away'] = 100 - df['possession_home']
+        # Procesamiento de datos
+        with span('post_processing'):
+            df = process_match_data(df)
         
         return df
     except Exception as e:
         logger.error(f"❌ Error al cargar datos: {str(e)}")
         return pd.DataFrame()
-    finally:
-        if 'engine' in locals():
-            engine.dispose()
-
-def create_empty_figure(message):
-    # Función mejorada para crear grafos dirigidos
-def create_directed_graph(df, graph_type='wins', threshold=3):
-    """Crea un grafo dirigido con manejo robusto de errores"""
+
+def load_table_page(filters, page_current, page_size, sort_by, filter_query):
+    """Carga una página de la tabla de detalle (orden, filtros y paginación en SQL)"""
+    key = ('table', filters, page_current, page_size, repr(sort_by), filter_query or '')
+    version = get_data_version()
+    page = match_cache.get(key, version)
+    if page is not None:
+        return page
+    (page_query, page_params), (count_query, count_params) = build_page_query(
+        filters, page_current, page_size, sort_by, filter_query
+    )
+    with span('sql_table_page'), get_engine().connect() as conn:
+        total = conn.execute(count_query, count_params).scalar() or 0
+        df = pd.read_sql(page_query, conn, params=page_params)
+    page = (df.to_dict('records'), total)
+    match_cache.set(key, page, version)
+    return page
+
+def rollups_ready():
+    """Indica si el importador ya generó las tablas de resumen"""
+    version = get_data_version()
+    ready = match_cache.get('rollups_ready', version)
+    if ready is not None:
+        return ready
     try:
-        if df.empty or 'home_team' not in df.columns or 'away_team' not in df.columns:
-            return create_empty_figure("Datos insuficientes")
-        
-        G = nx.DiGraph()
-        all_teams = pd.unique(df[['home_team', 'away_team']].values.ravel('K'))
-        G.add_nodes_from(all_teams)
-        # Validar columnas requeridas
-        required_cols = ['home_score', 'away_score'] if graph_type in ['wins', 'goals', 'home-away'] else []
-        if any(col not in df.columns for col in required_cols):
-            return create_empty_figure("Datos requeridos no disponibles")
-        
-        edge_data = []
-        
-        if graph_type == 'wins':
-            for _, row in df.iterrows():
-                if row['home_score'] > row['away_score']:
-                    edge_data.append((row['home_team'], row['away_team'], {'weight': 1}))
-                elif row['home_score'] < row['away_score']:
-                    edge_data.append((row['away_team'], row['home_team'], {'weight': 1}))
-        
-        elif graph_type == 'goals':
-            for _, row in df.iterrows():
-                goal_diff = row['home_score'] - row['away_score']
-                if goal_diff > 0:
-                    edge_data.append((row['home_team'], row['away_team'], {'weight': goal_diff}))
-                elif goal_diff < 0:
-                    edge_data.append((row['away_team'], row['home_team'], {'weight': abs(goal_diff)}))
-        
-        elif graph_type == 'home-away':
-            home_wins = df[df['result'] == 'Local'].groupby(['home_team', 'away_team']).size()
-            away_wins = df[df['result'] == 'Visitante'].groupby(['home_team', 'away_team']).size()
-            
-            for (home, away), count in home_wins.items():
-                if count >= threshold:
-                    edge_data.append((home, away, {'weight': count}))
-            
-            for (home, away), count in away_wins.items():
-                if count >= threshold:
-                    edge_data.append((away, home, {'weight': count}))
-        
-    """Crea una figura vacía con un mensaje"""
-    return go.Figure(data=[], layout=go.Layout(title=message))
-# Añadir relaciones con manejo seguro
-        for edge in edge_data:
-            try:
-                G.add_edge(edge[0], edge[1], **edge[2])
-            except Exception as e:
-                logger.warning(f"Error añadiendo arista: {str(e)[:200]}")
-                continue
-# Eliminar nodos aislados
-        G.remove_nodes_from(list(nx.isolates(G)))
-        
-        if len(G.nodes) == 0:
-            return create_empty_figure("No hay relaciones significativas")
-        
-        # Generar visualización con cálculo seguro de pesos
-        pos = nx.spring_layout(G, k=0.5, iterations=50)
-        edge_weights = [d.get('weight', 1) for _, _, d in G.edges(data=True)]
-        max_weight = max(edge_weights) if edge_weights else 1
-        
-        edge_traces = []
-        for edge in G.edges(data=True):
-            x0, y0 = pos[edge[0]]
-            x1, y1 = pos[edge[1]]
-            
-            line_width = 1 + 2 * edge[2].get('weight', 1) / max_weight
-            
-            edge_trace = go.Scatter(
-                x=[x0, x1], y=[y0, y1],
-                line=dict(width=line_width, color='#888'),
-                hoverinfo='text',
-                text=edge[2].get('label', ''),
-                mode='lines',
-                line_shape='spline'
-            )
-            edge_traces.append(edge_trace)
-        
-        node_trace = go.Scatter(
-            x=[pos[node][0] for node in G.nodes()],
-            y=[pos[node][1] for node in G.nodes()],
-            mode='markers+text',
-            text=list(G.nodes()),
-            textposition="top center",
-            marker=dict(
-                showscale=True,
-                colorscale='Rainbow',
-                size=20,
-                color=[G.in_degree(node, weight='weight') for node in G.nodes()],
-                colorbar=dict(title='Influencia Recibida')
-            )
-        )
-        
-        fig = go.Figure(data=edge_traces + [node_trace],
-                     layout=go.Layout(
-                        title=f'Relaciones entre Equipos - {graph_type}',
-                        showlegend=False,
-                        hovermode='closest',
-                        margin=dict(b=20,l=5,r=5,t=40),
-                        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-                        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False)))
-        
-        return fig
-    
+        with get_engine().connect() as conn:
+            ready = bool(conn.execute(ROLLUPS_READY_QUERY).scalar())
     except Exception as e:
-# Callbacks
-@app.callback(
-    [Output('competition-filter', 'options'),
-     Output('team-filter', 'options'),
-     Output('total-matches', 'children'),
-     Output('home-win-rate', 'children'),
-     Output('avg-possession', 'children'),
-     Output('goals-per-match', 'children'),
-     Output('goals-comparison-chart', 'figure'),
-     Output('results-distribution', 'figure'),
-     Output('matches-table', 'children'),
-     Output('directed-graph', 'figure')],    # Salida para el gráfico dirigido
-    [Input('date-range', 'start_date'),
-     Input('date-range', 'end_date'),
-     Input('competition-filter', 'value'),
-     Input('team-filter', 'value')]
-)
-def update_dashboard(start_date, end_date, selected_comps, selected_teams):
+        logger.warning(f"⚠️ Tablas de resumen no disponibles: {str(e)[:200]}")
+        ready = False
+    match_cache.set('rollups_ready', ready, version)
+    return ready
+
+def load_kpis(filters):
+    """KPIs sumando filas de agg_team_day; None si no hay tablas de resumen"""
+    if not rollups_ready():
+        return None
+    key = ('kpis', filters)
+    version = get_data_version()
+    kpis = match_cache.get(key, version)
+    if kpis is not None:
+        return kpis
+    with span('sql_kpis'), get_engine().connect() as conn:
+        rows = [
+            (conn.execute(query, params).mappings().one(), sign)
+            for query, params, sign in build_kpi_queries(filters)
+        ]
+    kpis = combine_kpis(rows)
+    match_cache.set(key, kpis, version)
+    return kpis
+
+def load_head_to_head(filters):
+    """Enfrentamientos (local, visitante, victorias) desde agg_head_to_head; None si no hay resúmenes"""
+    if not rollups_ready():
+        return None
+    key = ('head_to_head', filters)
+    version = get_data_version()
+    head_to_head = match_cache.get(key, version)
+    if head_to_head is not None:
+        return head_to_head
+    with span('sql_head_to_head'), get_engine().connect() as conn:
+        parts = [pd.read_sql(query, conn, params=params) for query, params in build_head_to_head_queries(filters)]
+    head_to_head = pd.concat(parts, ignore_index=True)
+    match_cache.set(key, head_to_head, version)
+    return head_to_head
+
+def load_ratings(filters):
+    """Ranking Elo/PageRank al cierre del rango desde team_ratings (sin recalcular la historia)"""
+    key = ('ratings', filters)
+    version = get_data_version()
+    ranking = match_cache.get(key, version)
+    if ranking is not None:
+        return ranking
+    query, params = build_ranking_query(filters)
     try:
-        df = load_match_data()
-        if df.empty:
-            return [], [], "0", "0%", "0%", "0", {}, {}, "No hay datos disponibles", create_empty_figure("No hay datos disponibles")
-        logger.error(f"Error al crear grafo: {str(e)[:200]}")
-        return create_empty_figure("Error generando gráfico")
-# Filtrar por fechas
-        start_date = pd.to_datetime(start_date) if start_date else df['match_date'].min()
-        end_date = pd.to_datetime(end_date) if end_date else df['match_date'].max()
-        filtered_df = df[(df['match_date'] >= start_date) & (df['match_date'] <= end_date)]
-        
-        # Aplicar filtros
-        if selected_comps:
-            filtered_df = filtered_df[filtered_df['competition'].isin(selected_comps)]
-        if selected_teams:
-            filtered_df = filtered_df[
-                (filtered_df['home_team'].isin(selected_teams)) | 
-                (filtered_df['away_team'].isin(selected_teams))
-            ]
- # Calcular métricas
-        total_matches = len(filtered_df)
-        home_win_rate = filtered_df['result'].value_counts(normalize=True).get('Local', 0) * 100
-        avg_possession = filtered_df['possession_home'].mean()
-        goals_per_match = filtered_df['total_goals'].mean() if total_matches > 0 else 0
-        
-        # Gráficos
-        goals_fig = px.box(
+        with span('sql_ratings'), get_engine().connect() as conn:
+            ranking = pd.read_sql(query, conn, params=params)
+    except Exception as e:
+        logger.warning(f"⚠️ Ratings no disponibles: {str(e)[:200]}")
+        return pd.DataFrame()
+    match_cache.set(key, ranking, version)
+    return ranking
+
+def load_form(filters):
+    """Forma de los equipos recortada al rango de fechas.
+
+    Se calcula una vez por competiciones y versión de datos sobre todo el
+    histórico, para todos sus equipos: la forma de un equipo solo depende
+    de sus partidos, así que cambiar el filtro de equipos o mover el rango
+    de fechas reutiliza el mismo cálculo (los equipos los elige trend_series).
+    """
+    start_key, end_key, competition_ids, _ = filters
+    key = ('form', competition_ids)
+    version = get_data_version()
+    form = match_cache.get(key, version)
+    if form is None:
+        # El histórico completo no se guarda en la caché de partidos: solo su forma
+        history = fetch_filtered_data((None, None, competition_ids, ()), version)
+        with span('trend_form'):
+            form = rolling_form(history)
+        match_cache.set(key, form, version)
+    return slice_form(form, start_key, end_key)
+
+def load_filter_options():
+    """Opciones de competiciones y equipos directamente de las dimensiones"""
+    version = get_data_version()
+    options = match_cache.get('filter_options', version)
+    if options is not None:
+        return options
+    try:
+        with get_engine().connect() as conn:
+            comps = conn.execute(FILTER_OPTIONS_QUERIES['competitions']).fetchall()
+            teams = conn.execute(FILTER_OPTIONS_QUERIES['teams']).fetchall()
+    except Exception as e:
+        logger.error(f"❌ Error al cargar opciones de filtros: {str(e)}")
+        return [], []
+    options = (
+        [{'label': name, 'value': comp_id} for comp_id, name in comps],
+        [{'label': name, 'value': team_id} for team_id, name in teams]
+    )
+    match_cache.set('filter_options', options, version)
+    return options
+
+# Figuras: las construyen los callbacks (en segundo plano si hay gestor) y el precalentado.
+# Un error se propaga como excepción para que cached_figure no lo guarde.
+def goals_figure(filters, progress=None):
+    filtered_df = load_filtered_data(filters)
+    if filtered_df.empty:
+        return {}
+    with span('figure_goals'):
+        return px.box(
             filtered_df.melt(
                 value_vars=['home_score', 'away_score'], 
                 var_name='tipo', 
@@ -365,47 +373,355 @@ def update_dashboard(start_date, end_date, selected_comps, selected_teams):
             color='tipo',
             title='Distribución de Goles por Equipo'
         )
-        
-        results_fig = px.pie(
+
+def results_figure(filters, progress=None):
+    filtered_df = load_filtered_data(filters)
+    if filtered_df.empty:
+        return {}
+    with span('figure_results'):
+        return px.pie(
             filtered_df,
             names='result',
             title='Distribución de Resultados',
             hole=0.4
         )
-        
-        # Tabla de datos
-        table = dash_table.DataTable(
-            columns=[{"name": col, "id": col} for col in filtered_df.columns],
-            data=filtered_df.to_dict('records'),
-            page_size=10,
-            style_table={'overflowX': 'auto'},
-            filter_action='native',
-            sort_action='native'
-        )
-     # Opciones para filtros
-        comp_options = [{'label': comp, 'value': comp} for comp in df['competition'].unique()]
-        all_teams = set(df['home_team']).union(set(df['away_team']))
-        team_options = [{'label': team, 'value': team} for team in sorted(all_teams)]
-        
-        # Crear gráfico dirigido
-        directed_graph = create_directed_graph(filtered_df, graph_type='wins', threshold=3)
-        
+
+def directed_graph_figure(filters, progress=None):
+    head_to_head = load_head_to_head(filters)
+    if head_to_head is not None:
+        if head_to_head.empty:
+            return create_empty_figure("No hay datos disponibles")
+        if progress is not None:
+            progress(1)
+        return create_graph_figure(head_to_head_edges(head_to_head), graph_type='wins', progress=progress)
+    filtered_df = load_filtered_data(filters)
+    if filtered_df.empty:
+        return create_empty_figure("No hay datos disponibles")
+    if progress is not None:
+        progress(1)
+    # Crear gráfico dirigido
+    with span('graph_edges'):
+        edges = build_edge_weights(filtered_df, graph_type='wins', threshold=3)
+    return create_graph_figure(edges, graph_type='wins', progress=progress)
+
+FIGURE_BUILDERS = {
+    'goals': goals_figure,
+    'results': results_figure,
+    'directed_graph': directed_graph_figure
+}
+
+def cached_figure(name, filters, progress=None):
+    """Figura para unos filtros, desde la caché de figuras si ya se construyó con esta versión de datos"""
+    key = (name, filters)
+    version = get_data_version()
+    figure = figure_cache.get(key, version)
+    if figure is not None:
+        return figure
+    figure = FIGURE_BUILDERS[name](filters, progress)
+    figure_cache.set(key, figure, version)
+    return figure
+
+# Precalentado tras cada importación: rango por defecto, solo y con cada competición
+def warmup_plan():
+    start_date, end_date = DEFAULT_START_DATE.date(), DEFAULT_END_DATE.date()
+    competitions, _ = load_filter_options()
+    return [normalize_filters(start_date, end_date, None, None)] + [
+        normalize_filters(start_date, end_date, [option['value']], None) for option in competitions
+    ]
+
+def claim_warmup(version):
+    # Con la caché compartida solo un worker precalienta cada versión
+    return match_cache.add(('warmup', version), os.getpid(), version)
+
+def warmup_cancelled(version):
+    # La cancelación puede llegar a cualquier worker: se marca en la caché compartida
+    return match_cache.get(('warmup_cancel', version), version) is not None
+
+WARMUP_TASKS = [load_filtered_data, load_kpis, load_head_to_head, load_ratings, load_form] + [
+    (lambda filters, name=name: cached_figure(name, filters)) for name in FIGURE_BUILDERS
+]
+
+# Endpoint de diagnóstico del pool de conexiones y la caché
+@server.route('/health/db')
+def db_health():
+    return jsonify({'pool': pool_stats(), 'cache': match_cache.stats(),
+                    'figures': figure_cache.stats(), 'warmup': warmup_status()})
+
+# Detiene el precalentado de la versión actual (p. ej. si compite con el tráfico tras una importación)
+@server.route('/health/warmup/cancel', methods=['POST'])
+def warmup_cancel():
+    version = get_data_version()
+    match_cache.set(('warmup_cancel', version), os.getpid(), version)
+    cancel_warmup()
+    return jsonify({'warmup': warmup_status()})
+
+# Métricas en formato Prometheus: etapas, callbacks, peticiones, pool, cachés y precalentado
+@register_collector
+def runtime_metrics():
+    pool = pool_stats()
+    cache = match_cache.stats()
+    layouts = layout_cache_stats()
+    figures = figure_cache.stats()
+    warmup = warmup_status()
+    return [
+        ('dashboard_db_pool', 'Estado del pool de conexiones', 'gauge',
+         [({'stat': name}, pool[name]) for name in ('pool_size', 'checked_in', 'checked_out', 'overflow') if name in pool]),
+        ('dashboard_db_pool_events_total', 'Conexiones creadas y préstamos del pool', 'counter',
+         [({'event': name}, pool[name]) for name in ('connections_created', 'checkouts')]),
+        ('dashboard_cache_entries', 'Entradas en la caché de consultas', 'gauge', [({}, cache['entries'])]),
+        ('dashboard_cache_bytes', 'Tamaño aproximado de la caché de consultas', 'gauge', [({}, cache['bytes'])]),
+        ('dashboard_cache_requests_total', 'Aciertos y fallos de la caché de consultas', 'counter',
+         [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])]),
+        ('dashboard_layout_cache_entries', 'Layouts de grafo en caché', 'gauge', [({}, layouts['entries'])]),
+        ('dashboard_figure_cache_entries', 'Figuras en caché', 'gauge', [({}, figures['entries'])]),
+        ('dashboard_warmup_steps', 'Progreso del precalentado de la versión actual', 'gauge',
+         [({'stat': 'done'}, warmup['done']), ({'stat': 'total'}, warmup['total'])])
+    ]
+
+@server.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Cada worker arranca su hilo de precalentado con la primera petición (después del fork)
+    start_warmup(get_data_version, warmup_plan, WARMUP_TASKS, claim_warmup, warmup_cancelled)
+
+@server.after_request
+def observe_request(response):
+    # Las figuras se serializan a JSON después del callback: esta duración las incluye
+    if request.endpoint != 'metrics' and hasattr(g, 'request_start'):
+        # La regla de la ruta (no la URL) mantiene acotado el número de series
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'desconocido'
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@server.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype=CONTENT_TYPE)
+
+# Callbacks
+# Cada salida tiene su propio callback: un cambio de filtro solo recalcula lo
+# que depende de él y el grafo dirigido no bloquea los KPIs.
+def get_store_data(store):
+    """Carga bajo demanda el conjunto filtrado (desde la caché) a partir del dcc.Store"""
+    if not store:
+        return pd.DataFrame()
+    return load_filtered_data(filters_from_store(store['filters']))
+
+@app.callback(
+    [Output('competition-filter', 'options'),
+     Output('team-filter', 'options')],
+    Input('url', 'pathname')
+)
+@instrumented('filter_options')
+def update_filter_options(_pathname):
+    # Las opciones no dependen de los filtros: se cargan una vez por página
+    return load_filter_options()
+
+@app.callback(
+    Output('filtered-data', 'data'),
+    [Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('competition-filter', 'value'),
+     Input('team-filter', 'value')]
+)
+@instrumented('filtered_data')
+def update_filtered_data(start_date, end_date, selected_comps, selected_teams):
+    # Solo los filtros normalizados: cada callback carga lo que necesita (resúmenes,
+    # ratings, figuras en segundo plano) y el conjunto de partidos solo si lo usa
+    filters = normalize_filters(start_date, end_date, selected_comps, selected_teams)
+    return {'key': filter_hash(filters), 'filters': filters}
+
+@app.callback(
+    [Output('total-matches', 'children'),
+     Output('home-win-rate', 'children'),
+     Output('avg-possession', 'children'),
+     Output('goals-per-match', 'children')],
+    Input('filtered-data', 'data')
+)
+@instrumented('kpis')
+def update_kpis(store):
+    try:
+        if not store:
+            return "0", "0%", "0%", "0"
+        # Con tablas de resumen los KPIs no dependen del número de partidos
+        kpis = load_kpis(filters_from_store(store['filters']))
+        if kpis is not None:
+            if kpis['total_matches'] == 0:
+                return "0", "0%", "0%", "0"
+            return (
+                f"{kpis['total_matches']}",
+                f"{kpis['home_win_rate']:.1f}%",
+                f"{kpis['avg_possession']:.1f}%",
+                f"{kpis['goals_per_match']:.2f}"
+            )
+        filtered_df = get_store_data(store)
+        if filtered_df.empty:
+            return "0", "0%", "0%", "0"
+        # Calcular métricas
+        total_matches = len(filtered_df)
+        home_win_rate = filtered_df['result'].value_counts(normalize=True).get('Local', 0) * 100
+        avg_possession = filtered_df['possession_home'].mean()
+        goals_per_match = derived_column(filtered_df, 'total_goals').mean() if total_matches > 0 else 0
         return (
-            comp_options,
-            team_options,
             f"{total_matches}",
             f"{home_win_rate:.1f}%",
             f"{avg_possession:.1f}%",
-            f"{goals_per_match:.2f}",
-            goals_fig,
-            results_fig,
-            table,
-            directed_graph     # Gráfico dirigido
+            f"{goals_per_match:.2f}"
         )
-        
     except Exception as e:
-        logger.error(f"❌ Error en callback: {str(e)}")
-        return [], [], "Error", "Error", "Error", "Error", {}, {}, "Error al cargar datos", create_empty_figure("Error al cargar datos")
+        logger.error(f"❌ Error en KPIs: {str(e)}")
+        return "Error", "Error", "Error", "Error"
+
+def background_options(progress=False):
+    """Opciones de @app.callback para calcular una figura en segundo plano (vacías sin gestor).
+
+    El botón de cancelar detiene el proceso y, con `progress`, la barra
+    muestra los pasos de GRAPH_PROGRESS_STEPS.
+    """
+    if background_manager is None:
+        return {}
+    options = dict(background=True, manager=background_manager, cancel=[Input('cancel-figures', 'n_clicks')])
+    if progress:
+        options.update(
+            progress=[Output('graph-progress', 'value')],
+            progress_default=['0'],
+            running=[
+                (Output('graph-progress', 'style'), {'visibility': 'visible'}, {'visibility': 'hidden'}),
+                (Output('cancel-figures', 'disabled'), False, True)
+            ]
+        )
+    return options
+
+def figure_output(name, store, empty_figure, set_progress=None):
+    """Figura cacheada para el dcc.Store; los errores no se guardan en la caché"""
+    try:
+        if not store:
+            return empty_figure("No hay datos disponibles")
+        progress = (lambda step: set_progress(str(step))) if set_progress is not None else None
+        return cached_figure(name, filters_from_store(store['filters']), progress)
+    except Exception as e:
+        logger.error(f"❌ Error en la figura '{name}': {str(e)}")
+        return empty_figure("Error al cargar datos")
+
+@app.callback(
+    Output('goals-comparison-chart', 'figure'),
+    Input('filtered-data', 'data'),
+    **background_options()
+)
+@instrumented('goals_chart')
+def update_goals_chart(store):
+    return figure_output('goals', store, lambda message: {})
+
+@app.callback(
+    Output('results-distribution', 'figure'),
+    Input('filtered-data', 'data'),
+    **background_options()
+)
+@instrumented('results_chart')
+def update_results_chart(store):
+    return figure_output('results', store, lambda message: {})
+
+@app.callback(
+    [Output('matches-table', 'data'),
+     Output('matches-table', 'page_count'),
+     Output('matches-table', 'page_current')],
+    [Input('filtered-data', 'data'),
+     Input('matches-table', 'page_current'),
+     Input('matches-table', 'page_size'),
+     Input('matches-table', 'sort_by'),
+     Input('matches-table', 'filter_query')]
+)
+@instrumented('table')
+def update_table(store, page_current, page_size, sort_by, filter_query):
+    try:
+        if not store:
+            return [], 0, 0
+        # Un cambio de filtros globales o de filtro por columna vuelve a la primera página
+        triggered = ctx.triggered_prop_ids
+        if not triggered or 'filtered-data.data' in triggered or 'matches-table.filter_query' in triggered:
+            page_current = 0
+        page_size = page_size or TABLE_PAGE_SIZE
+        records, total = load_table_page(
+            filters_from_store(store['filters']), page_current or 0, page_size, sort_by, filter_query
+        )
+        page_count = max(1, -(-total // page_size))
+        return records, page_count, page_current or 0
+    except Exception as e:
+        logger.error(f"❌ Error en tabla: {str(e)}")
+        return [], 0, 0
+
+@app.callback(
+    Output('directed-graph', 'figure'),
+    Input('filtered-data', 'data'),
+    **background_options(progress=True)
+)
+@instrumented('directed_graph')
+def update_directed_graph(*args):
+    # En segundo plano Dash pasa primero la función que publica el progreso
+    set_progress, store = args if len(args) == 2 else (None, args[0])
+    return figure_output('directed_graph', store, create_empty_figure, set_progress)
+
+@app.callback(
+    Output('ratings-chart', 'figure'),
+    Input('filtered-data', 'data')
+)
+@instrumented('ratings_chart')
+def update_ratings_chart(store):
+    try:
+        if not store:
+            return create_empty_figure("No hay datos disponibles")
+        ranking = load_ratings(filters_from_store(store['filters']))
+        if ranking.empty:
+            return create_empty_figure("No hay ratings calculados")
+        with span('figure_ratings'):
+            ranking = ranking.iloc[::-1]
+            return px.bar(
+                ranking,
+                x='elo',
+                y='team',
+                orientation='h',
+                color='pagerank',
+                hover_data=['elo_change', 'matches'],
+                range_x=[ranking['elo'].min() - 25, ranking['elo'].max() + 25],
+                title=f"Ranking Elo a {pd.Timestamp(ranking['rating_date'].max()).date()}"
+            )
+    except Exception as e:
+        logger.error(f"❌ Error en ranking: {str(e)}")
+        return create_empty_figure("Error al cargar datos")
+
+@app.callback(
+    Output('trend-chart', 'figure'),
+    [Input('filtered-data', 'data'),
+     Input('trend-metric', 'value'),
+     Input('trend-period', 'value')]
+)
+@instrumented('trend_chart')
+def update_trend_chart(store, metric, period):
+    try:
+        if not store:
+            return create_empty_figure("No hay datos disponibles")
+        filters = filters_from_store(store['filters'])
+        form = load_form(filters)
+        # Con filtro de equipos se dibujan esos; si no, los que más partidos jugaron en el rango
+        _, team_options = load_filter_options()
+        names = {option['value']: option['label'] for option in team_options}
+        series, x = trend_series(form, metric, period, [names[t] for t in filters[3] if t in names])
+        if series.empty:
+            return create_empty_figure("No hay datos disponibles")
+        with span('figure_trend'):
+            title = TREND_METRICS[metric]
+            if period == 'match':
+                title += f" (media de los últimos {TRENDS_CONFIG['window']} partidos)"
+            return px.line(
+                series,
+                x=x,
+                y=metric,
+                color='team',
+                render_mode='webgl',
+                title=f"Tendencia: {title}"
+            )
+    except Exception as e:
+        logger.error(f"❌ Error en tendencias: {str(e)}")
+        return create_empty_figure("Error al cargar datos")
 
 if __name__ == '__main__':
     app.run_server(host='0.0.0.0', port=5001, debug=True)
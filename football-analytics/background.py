@@ -0,0 +1,150 @@
+"""Trabajo fuera del hilo de la petición.
+
+Callbacks en segundo plano: con diskcache instalado, las figuras pesadas
+se calculan en un proceso aparte (DiskcacheManager de Dash) y el worker
+síncrono de gunicorn queda libre mientras el navegador consulta el
+progreso. El resultado se guarda en disco por entradas y versión de
+datos, así que una misma combinación de filtros no se recalcula aunque
+la pida otro worker. Sin diskcache los callbacks vuelven a ejecutarse
+dentro de la petición.
+
+Precalentado: cada worker vigila la versión de datos y, tras cada
+importación, uno de ellos recorre las combinaciones de filtros más
+habituales para dejar datos y figuras en la caché compartida. El
+progreso se consulta en /health/db y en /metrics; si llega otra versión,
+se cancela o se agota WARMUP_MAX_SECONDS, el trabajo se detiene entre
+dos pasos.
+"""
+import os
+import time
+import logging
+import threading
+from forksafe import after_fork
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_CONFIG = {
+    'enabled': os.getenv('BACKGROUND_CALLBACKS', '1') == '1',
+    'cache_dir': os.getenv('BACKGROUND_CACHE_DIR', 'background-cache'),
+    'result_ttl': int(os.getenv('BACKGROUND_RESULT_TTL_SECONDS', '600')),
+    'warmup_enabled': os.getenv('WARMUP_ENABLED', '1') == '1',
+    'warmup_interval': float(os.getenv('WARMUP_CHECK_SECONDS', '10')),
+    'warmup_max_seconds': float(os.getenv('WARMUP_MAX_SECONDS', '300'))
+}
+
+
+def create_background_manager(cache_by=()):
+    """DiskcacheManager de Dash, o None si está desactivado o falta diskcache"""
+    if not BACKGROUND_CONFIG['enabled']:
+        return None
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+    except ImportError as e:
+        logger.warning(f"⚠️ Callbacks en segundo plano no disponibles ({e}): se ejecutan en la petición")
+        return None
+    cache = diskcache.Cache(BACKGROUND_CONFIG['cache_dir'])
+    return DiskcacheManager(cache, cache_by=list(cache_by) or None, expire=BACKGROUND_CONFIG['result_ttl'])
+
+
+# Estado del precalentado del proceso actual
+_IDLE_STATE = {
+    'state': 'idle', 'version': None, 'done': 0, 'total': 0, 'errors': 0,
+    'started_at': None, 'seconds': None
+}
+_warmup_state = dict(_IDLE_STATE)
+_warmup_lock = threading.Lock()
+_warmup_cancel = threading.Event()
+_warmup_thread = {'thread': None, 'pid': None}
+
+
+def warmup_status():
+    with _warmup_lock:
+        return dict(_warmup_state)
+
+
+def cancel_warmup():
+    """Detiene el precalentado en curso antes del siguiente paso"""
+    _warmup_cancel.set()
+
+
+def _set_state(**values):
+    with _warmup_lock:
+        _warmup_state.update(values)
+
+
+def run_warmup(version, plan, tasks, get_version, cancelled=None):
+    """Ejecuta cada tarea para cada tupla de filtros del plan; devuelve True si termina"""
+    steps = [(task, filters) for filters in plan for task in tasks]
+    start = time.monotonic()
+    _set_state(state='running', version=version, done=0, total=len(steps), errors=0,
+               started_at=time.time(), seconds=None)
+    for done, (task, filters) in enumerate(steps):
+        elapsed = time.monotonic() - start
+        if (_warmup_cancel.is_set() or get_version() != version
+                or elapsed > BACKGROUND_CONFIG['warmup_max_seconds']
+                or (cancelled is not None and cancelled(version))):
+            _set_state(state='cancelled', seconds=elapsed)
+            logger.warning(f"⚠️ Precalentado cancelado en el paso {done} de {len(steps)} (versión {version})")
+            return False
+        try:
+            task(filters)
+        except Exception as e:
+            with _warmup_lock:
+                _warmup_state['errors'] += 1
+            logger.warning(f"⚠️ Error al precalentar {filters}: {str(e)[:200]}")
+        _set_state(done=done + 1)
+    elapsed = time.monotonic() - start
+    _set_state(state='done', seconds=elapsed)
+    logger.info(f"✅ Precalentadas {len(plan)} combinaciones de filtros en {elapsed:.1f}s (versión {version})")
+    return True
+
+
+def _watch(get_version, get_plan, tasks, claim, cancelled):
+    last_version = None
+    while True:
+        try:
+            version = get_version()
+            if version is not None and version != last_version:
+                _warmup_cancel.clear()
+                if claim is None or claim(version):
+                    run_warmup(version, get_plan(), tasks, get_version, cancelled)
+                else:
+                    # Otro worker ya precalienta esta versión en la caché compartida
+                    _set_state(state='skipped', version=version, done=0, total=0)
+                # Si la versión cambió a mitad, la siguiente vuelta vuelve a empezar con la nueva
+                last_version = version
+        except Exception as e:
+            logger.error(f"❌ Error en el precalentado: {str(e)[:200]}")
+        time.sleep(BACKGROUND_CONFIG['warmup_interval'])
+
+
+def start_warmup(get_version, get_plan, tasks, claim=None, cancelled=None):
+    """Arranca (una vez por proceso) el hilo que precalienta tras cada importación.
+
+    Se llama de forma perezosa desde la primera petición, así cada worker de
+    gunicorn arranca su propio hilo después del fork. `claim(version)`
+    devuelve True solo en el worker que debe precalentar esa versión y
+    `cancelled(version)`, si se da, permite cancelarlo desde otro proceso.
+    """
+    if not BACKGROUND_CONFIG['warmup_enabled']:
+        return
+    with _warmup_lock:
+        thread = _warmup_thread['thread']
+        if thread is not None and _warmup_thread['pid'] == os.getpid() and thread.is_alive():
+            return
+        thread = threading.Thread(target=_watch, args=(get_version, get_plan, tasks, claim, cancelled),
+                                  name='warmup', daemon=True)
+        _warmup_thread.update(thread=thread, pid=os.getpid())
+        thread.start()
+
+
+@after_fork
+def _reset_after_fork():
+    """El hilo de precalentado no pasa al hijo: su lock, su estado y la cancelación empiezan de cero"""
+    global _warmup_lock, _warmup_cancel
+    _warmup_lock = threading.Lock()
+    _warmup_cancel = threading.Event()
+    _warmup_state.clear()
+    _warmup_state.update(_IDLE_STATE)
+    _warmup_thread.update(thread=None, pid=None)
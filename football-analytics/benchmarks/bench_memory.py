@@ -0,0 +1,70 @@
+"""Compara la memoria del DataFrame de partidos con el esquema anterior
+(textos como object, enteros de 64 bits, columnas derivadas guardadas)
+y con el esquema compacto de processing.py.
+
+Uso:
+    python benchmarks/bench_memory.py --sizes 100000 1000000
+"""
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processing import classify_results, process_match_data  # noqa: E402
+
+
+def synthetic_raw_matches(n_matches, n_teams=200, n_competitions=10, seed=42):
+    """Filas con las mismas columnas que devuelve la consulta de partidos"""
+    rng = np.random.default_rng(seed)
+    teams = np.array([f"Equipo {i}" for i in range(n_teams)], dtype=object)
+    competitions = np.array([f"Competición {i}" for i in range(n_competitions)], dtype=object)
+    home = rng.integers(0, n_teams, n_matches)
+    away = (home + rng.integers(1, n_teams, n_matches)) % n_teams
+    return pd.DataFrame({
+        'home_team': teams[home],
+        'away_team': teams[away],
+        'home_score': rng.poisson(1.5, n_matches),
+        'away_score': rng.poisson(1.1, n_matches),
+        'possession_home': rng.uniform(30, 70, n_matches).round(1),
+        'shots_on_target_home': rng.poisson(5, n_matches),
+        'shots_on_target_away': rng.poisson(4, n_matches),
+        'match_date': pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, n_matches), unit='D'),
+        'competition': competitions[rng.integers(0, n_competitions, n_matches)]
+    })
+
+
+def legacy_process(df):
+    """Esquema anterior: todo como object/int64 y derivadas materializadas"""
+    df = df.astype({'home_team': object, 'away_team': object, 'competition': object})
+    df['match_date'] = pd.to_datetime(df['match_date'])
+    df['result'] = classify_results(df['home_score'], df['away_score']).astype(object)
+    df['total_goals'] = df['home_score'] + df['away_score']
+    df['possession_away'] = 100 - df['possession_home']
+    return df
+
+
+def memory_mb(df):
+    return df.memory_usage(index=True, deep=True).sum() / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--teams', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'partidos':>10} | {'anterior':>10} | {'compacto':>10} | {'MB/100k ant.':>12} | {'MB/100k comp.':>13} | {'ahorro':>7}")
+    for size in args.sizes:
+        raw = synthetic_raw_matches(size, args.teams)
+        before = memory_mb(legacy_process(raw.copy()))
+        after = memory_mb(process_match_data(raw.copy()))
+        per_100k = 100_000 / size
+        print(f"{size:>10} | {before:>8.1f}MB | {after:>8.1f}MB | {before * per_100k:>12.2f} | "
+              f"{after * per_100k:>13.2f} | {before / after:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compara la clasificación de resultados y la construcción de aristas
+fila a fila (implementación anterior) con la versión vectorizada.
+
+Uso:
+    python benchmarks/bench_vectorized.py --sizes 10000 100000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processing import classify_results  # noqa: E402
+from graphs import build_edge_weights  # noqa: E402
+
+
+def synthetic_matches(n_matches, n_teams=200, seed=42):
+    rng = np.random.default_rng(seed)
+    teams = np.array([f"Equipo {i}" for i in range(n_teams)], dtype=object)
+    home = rng.integers(0, n_teams, n_matches)
+    away = (home + rng.integers(1, n_teams, n_matches)) % n_teams
+    return pd.DataFrame({
+        'home_team': teams[home],
+        'away_team': teams[away],
+        'home_score': rng.poisson(1.5, n_matches),
+        'away_score': rng.poisson(1.1, n_matches)
+    })
+
+
+def legacy_results(df):
+    return df.apply(
+        lambda x: 'Local' if x['home_score'] > x['away_score'] else
+                 'Visitante' if x['home_score'] < x['away_score'] else 'Empate',
+        axis=1
+    )
+
+
+def legacy_wins_graph(df):
+    G = nx.DiGraph()
+    for _, row in df.iterrows():
+        if row['home_score'] > row['away_score']:
+            G.add_edge(row['home_team'], row['away_team'], weight=1)
+        elif row['home_score'] < row['away_score']:
+            G.add_edge(row['away_team'], row['home_team'], weight=1)
+    return G
+
+
+def vectorized_wins_graph(df):
+    edges = build_edge_weights(df, 'wins')
+    G = nx.DiGraph()
+    G.add_weighted_edges_from(zip(edges['source'].tolist(), edges['target'].tolist(), edges['weight'].tolist()))
+    return G
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--legacy-max', type=int, default=1_000_000,
+                        help="No ejecutar la versión fila a fila por encima de este tamaño")
+    args = parser.parse_args()
+
+    print(f"{'partidos':>10} | {'etapa':<10} | {'fila a fila':>12} | {'vectorizado':>12} | {'mejora':>8}")
+    for size in args.sizes:
+        df = synthetic_matches(size, args.teams)
+        for stage, legacy, fast in (
+            ('resultado', legacy_results, lambda d: classify_results(d['home_score'], d['away_score'])),
+            ('aristas', legacy_wins_graph, vectorized_wins_graph)
+        ):
+            fast_s = timed(fast, df)
+            if size <= args.legacy_max:
+                legacy_s = timed(legacy, df)
+                print(f"{size:>10} | {stage:<10} | {legacy_s:>11.3f}s | {fast_s:>11.4f}s | {legacy_s / fast_s:>7.0f}x")
+            else:
+                print(f"{size:>10} | {stage:<10} | {'-':>12} | {fast_s:>11.4f}s | {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Genera datos sintéticos reproducibles en el esquema estrella.
+
+Rellena dim_competitions, dim_teams, dim_dates, dim_match_stats y
+facts_matches con el tamaño pedido. Sirve tanto para MySQL (con las
+migraciones ya aplicadas) como para una base SQLite de usar y tirar.
+
+Uso:
+    python benchmarks/generate_data.py --url sqlite:///bench.db --matches 100000 --teams 500
+    DB_URL=mysql+mysqlconnector://... python benchmarks/generate_data.py --matches 1000000 --reset
+    DB_URL=mysql+mysqlconnector://... python benchmarks/generate_data.py --matches 10000 --if-empty
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_loader import LOAD_ORDER  # noqa: E402
+
+# Esquema mínimo equivalente al de migrations.py para crear una base desde cero (SQLite)
+STAR_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS dim_competitions (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS dim_teams (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS dim_dates (
+        id DATE PRIMARY KEY, day INT, month INT, year INT, day_of_week INT, is_weekend BOOLEAN)""",
+    """CREATE TABLE IF NOT EXISTS dim_match_stats (
+        id INTEGER PRIMARY KEY, possession_home FLOAT,
+        shots_on_target_home INT, shots_on_target_away INT)""",
+    """CREATE TABLE IF NOT EXISTS facts_matches (
+        id INTEGER PRIMARY KEY, home_team_id INT, away_team_id INT, home_score INT, away_score INT,
+        stats_id INT, date_id DATE, competition_id INT)""",
+    "CREATE INDEX IF NOT EXISTS idx_fm_date_cover ON facts_matches "
+    "(date_id, competition_id, home_team_id, away_team_id, home_score, away_score, stats_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fm_competition_date ON facts_matches (competition_id, date_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fm_home_team_date ON facts_matches (home_team_id, date_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fm_away_team_date ON facts_matches (away_team_id, date_id)",
+    "CREATE TABLE IF NOT EXISTS meta_data_version (id INT PRIMARY KEY, version BIGINT NOT NULL DEFAULT 0)",
+    """CREATE TABLE IF NOT EXISTS agg_team_day (
+        competition_id INT NOT NULL, team_id INT NOT NULL, date_key INT NOT NULL, is_home TINYINT NOT NULL,
+        matches INT NOT NULL, wins INT NOT NULL, draws INT NOT NULL, losses INT NOT NULL,
+        goals_for INT NOT NULL, goals_against INT NOT NULL, possession_home_sum DOUBLE,
+        possession_count INT NOT NULL, PRIMARY KEY (date_key, competition_id, team_id, is_home))""",
+    """CREATE TABLE IF NOT EXISTS agg_head_to_head (
+        competition_id INT NOT NULL, home_team_id INT NOT NULL, away_team_id INT NOT NULL,
+        month_key INT NOT NULL, matches INT NOT NULL, home_wins INT NOT NULL, away_wins INT NOT NULL,
+        draws INT NOT NULL, home_goals INT NOT NULL, away_goals INT NOT NULL,
+        PRIMARY KEY (month_key, competition_id, home_team_id, away_team_id))""",
+    """CREATE TABLE IF NOT EXISTS team_ratings (
+        date_id DATE NOT NULL, team_id INT NOT NULL, elo DOUBLE NOT NULL, pagerank DOUBLE NOT NULL,
+        matches INT NOT NULL, PRIMARY KEY (date_id, team_id))"""
+]
+
+GENERATOR_CONFIG = {
+    'seed': 42,
+    'start_date': '2000-01-01',
+    # Ritmo aproximado de partidos por día de calendario
+    'matches_per_day': 40,
+    'chunk_size': 20_000
+}
+
+
+def generate_star_schema(n_matches, n_teams=200, n_competitions=10, seed=None, start_date=None):
+    """Devuelve {tabla: DataFrame} con ids consecutivos desde 1 (fechas como clave de dim_dates)"""
+    if n_teams < 2 * n_competitions:
+        raise ValueError("Se necesitan al menos dos equipos por competición")
+    rng = np.random.default_rng(GENERATOR_CONFIG['seed'] if seed is None else seed)
+    start_date = pd.Timestamp(start_date or GENERATOR_CONFIG['start_date'])
+    n_days = max(1, -(-n_matches // GENERATOR_CONFIG['matches_per_day']))
+
+    dates = pd.date_range(start_date, periods=n_days, freq='D')
+    dim_dates = pd.DataFrame({
+        'id': dates.date,
+        'year': dates.year,
+        'month': dates.month,
+        'day': dates.day,
+        'day_of_week': dates.dayofweek + 1,
+        'is_weekend': dates.dayofweek >= 5
+    })
+    dim_teams = pd.DataFrame({
+        'id': np.arange(1, n_teams + 1),
+        'name': [f"Equipo {i:05d}" for i in range(1, n_teams + 1)]
+    })
+    dim_competitions = pd.DataFrame({
+        'id': np.arange(1, n_competitions + 1),
+        'name': [f"Competición {i:03d}" for i in range(1, n_competitions + 1)]
+    })
+
+    # Cada equipo juega siempre en la misma competición (el equipo t en la t % C),
+    # y el rival se elige entre los equipos de esa competición
+    home = rng.integers(0, n_teams, n_matches)
+    competition = home % n_competitions
+    league_size = (n_teams - competition + n_competitions - 1) // n_competitions
+    position = (home // n_competitions + rng.integers(1, league_size)) % league_size
+    away = competition + position * n_competitions
+    ids = np.arange(1, n_matches + 1)
+    possession = rng.normal(50, 8, n_matches).clip(20, 80).round(1)
+
+    dim_match_stats = pd.DataFrame({
+        'id': ids,
+        'possession_home': possession,
+        'shots_on_target_home': rng.poisson(4.5, n_matches),
+        'shots_on_target_away': rng.poisson(3.8, n_matches)
+    })
+    facts_matches = pd.DataFrame({
+        'id': ids,
+        'home_team_id': home + 1,
+        'away_team_id': away + 1,
+        # Ventaja de campo: algo más de goles para el local
+        'home_score': rng.poisson(1.5, n_matches),
+        'away_score': rng.poisson(1.15, n_matches),
+        'stats_id': ids,
+        'date_id': dates.date[np.sort(rng.integers(0, n_days, n_matches))],
+        'competition_id': competition + 1
+    })
+    return {
+        'dim_competitions': dim_competitions,
+        'dim_teams': dim_teams,
+        'dim_dates': dim_dates,
+        'dim_match_stats': dim_match_stats,
+        'facts_matches': facts_matches
+    }
+
+
+def create_schema(engine):
+    with engine.begin() as conn:
+        for statement in STAR_SCHEMA:
+            conn.execute(text(statement))
+
+
+def reset_tables(engine):
+    """Vacía los hechos, las dimensiones, los resúmenes y los ratings (los hechos primero por las claves foráneas)"""
+    with engine.begin() as conn:
+        for table in ['agg_team_day', 'agg_head_to_head', 'team_ratings'] + LOAD_ORDER[::-1]:
+            conn.execute(text(f"DELETE FROM {table}"))
+
+
+def has_matches(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM facts_matches LIMIT 1")).first() is not None
+
+
+def write_star_schema(engine, tables, chunk_size=None):
+    """Inserta las tablas en orden de dependencias; devuelve segundos por tabla"""
+    chunk_size = chunk_size or GENERATOR_CONFIG['chunk_size']
+    timings = {}
+    for table in LOAD_ORDER:
+        if table not in tables:
+            continue
+        start = time.perf_counter()
+        tables[table].to_sql(table, engine, if_exists='append', index=False, chunksize=chunk_size)
+        timings[table] = time.perf_counter() - start
+        rows = len(tables[table])
+        print(f"✅ {table}: {rows} filas en {timings[table]:.2f}s")
+    with engine.begin() as conn:
+        # Nueva versión de datos para invalidar cachés e instantáneas
+        conn.execute(text("DELETE FROM meta_data_version WHERE id = 1"))
+        conn.execute(text("INSERT INTO meta_data_version (id, version) VALUES (1, :version)"),
+                     {'version': int(time.time())})
+    return timings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=os.getenv('DB_URL'),
+                        help="URL de SQLAlchemy (por defecto DB_URL)")
+    parser.add_argument('--matches', type=int, default=100_000)
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--competitions', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=GENERATOR_CONFIG['seed'])
+    parser.add_argument('--reset', action='store_true', help="Vaciar las tablas antes de insertar")
+    parser.add_argument('--create-schema', action='store_true',
+                        help="Crear las tablas si no existen (siempre en SQLite)")
+    parser.add_argument('--if-empty', action='store_true',
+                        help="No hacer nada si facts_matches ya tiene partidos (siembra de docker compose)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.url:
+        raise SystemExit("❌ Indica --url o la variable DB_URL")
+    engine = create_engine(args.url)
+    if args.create_schema or engine.dialect.name == 'sqlite':
+        create_schema(engine)
+    if args.if_empty and has_matches(engine):
+        print("✅ facts_matches ya tiene partidos; no se generan datos")
+        engine.dispose()
+        return
+    if args.reset:
+        reset_tables(engine)
+    start = time.perf_counter()
+    tables = generate_star_schema(args.matches, args.teams, args.competitions, args.seed)
+    print(f"✅ Datos generados en memoria en {time.perf_counter() - start:.2f}s")
+    write_star_schema(engine, tables)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
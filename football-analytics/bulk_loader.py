@@ -0,0 +1,217 @@
+import os
+import csv
+import time
+import tempfile
+from datetime import datetime
+
+# Configuración de la carga masiva
+BULK_CONFIG = {
+    'batch_size': int(os.getenv('IMPORT_BATCH_SIZE', '1000')),
+    # 'executemany' (INSERT multi-fila) o 'load_data' (LOAD DATA LOCAL INFILE)
+    'method': os.getenv('IMPORT_BULK_METHOD', 'executemany')
+}
+
+# Orden de carga: las dimensiones antes que la tabla de hechos
+TABLE_COLUMNS = {
+    'dim_competitions': ['id', 'name', 'code', 'area_name'],
+    'dim_teams': ['id', 'name', 'short_name', 'tla', 'crest_url'],
+    'dim_dates': ['id', 'day', 'month', 'year', 'day_of_week', 'is_weekend'],
+    'dim_match_stats': ['id', 'possession_home', 'shots_home', 'shots_on_target_home',
+                        'shots_away', 'shots_on_target_away', 'corners_home', 'corners_away',
+                        'fouls_home', 'fouls_away'],
+    'facts_matches': ['id', 'home_team_id', 'away_team_id', 'competition_id', 'date_id',
+                      'stats_id', 'home_score', 'away_score', 'status', 'stage']
+}
+LOAD_ORDER = ['dim_competitions', 'dim_teams', 'dim_dates', 'dim_match_stats', 'facts_matches']
+
+
+def _batches(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def _update_clause(columns):
+    # Un valor NULL nuevo (p. ej. estadísticas que la API no trae) no pisa el existente
+    return ", ".join(f"{col}=COALESCE(VALUES({col}), {col})" for col in columns if col != 'id')
+
+
+# Con facts_matches particionada por temporada la PK es (id, date_id): un partido
+# aplazado a otra fecha no choca con su fila anterior, así que se borra antes
+def _delete_moved_matches(cursor, batch):
+    conditions = " OR ".join(["(id = %s AND date_id <> %s)"] * len(batch))
+    cursor.execute(
+        f"DELETE FROM facts_matches WHERE {conditions}",
+        [value for row in batch for value in (row['id'], row['date_id'])]
+    )
+
+
+def _report(table, rows, seconds):
+    rate = rows / seconds if seconds > 0 else float(rows)
+    print(f"✅ {table}: {rows} filas en {seconds:.2f}s ({rate:.0f} filas/s)")
+    return {'table': table, 'rows': rows, 'seconds': seconds, 'rows_per_second': rate}
+
+
+def _csv_value(value):
+    # Con ESCAPED BY '' MySQL lee la palabra NULL sin comillas como NULL
+    if value is None:
+        return 'NULL'
+    # csv escribiría True/False, que LOAD DATA carga como 0 en una columna TINYINT
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def bulk_upsert(conn, table, rows, batch_size=None, commit=True):
+    """Inserta filas con INSERT multi-fila ... ON DUPLICATE KEY UPDATE.
+
+    Cada lote va en su propia transacción para que un error no deshaga
+    los lotes ya confirmados. Con `commit=False` no se confirma ni se
+    deshace nada: las filas quedan en la transacción del llamador.
+    """
+    columns = TABLE_COLUMNS[table]
+    batch_size = batch_size or BULK_CONFIG['batch_size']
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    updates = _update_clause(columns)
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        for batch in _batches(rows, batch_size):
+            sql = (
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                + ", ".join([placeholders] * len(batch))
+                + f" ON DUPLICATE KEY UPDATE {updates}"
+            )
+            params = [row[col] for row in batch for col in columns]
+            try:
+                if table == 'facts_matches':
+                    _delete_moved_matches(cursor, batch)
+                cursor.execute(sql, params)
+                if commit:
+                    conn.commit()
+            except Exception:
+                if commit:
+                    conn.rollback()
+                raise
+    finally:
+        cursor.close()
+    return _report(table, len(rows), time.perf_counter() - start)
+
+
+def load_data_infile(conn, table, rows, batch_size=None, commit=True):
+    """Carga filas con LOAD DATA LOCAL INFILE desde un CSV temporal por lote.
+
+    El CSV se vuelca en una tabla temporal sin claves y de ahí se
+    pasa a la tabla real con INSERT ... SELECT ... ON DUPLICATE KEY UPDATE,
+    así una dimensión ya referenciada se actualiza sin borrarse. Requiere
+    `allow_local_infile=True` en la conexión y `local_infile=1` en MySQL.
+    `commit` como en bulk_upsert.
+    """
+    columns = TABLE_COLUMNS[table]
+    column_list = ", ".join(columns)
+    batch_size = batch_size or BULK_CONFIG['batch_size']
+    staging = f"tmp_{table}"
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        # Solo las columnas, sin claves ni particiones (MySQL no admite tablas temporales particionadas)
+        cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} SELECT {column_list} FROM {table} LIMIT 0")
+        for batch in _batches(rows, batch_size):
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as tmp:
+                writer = csv.writer(tmp, lineterminator='\n')
+                for row in batch:
+                    writer.writerow([_csv_value(row[col]) for col in columns])
+                path = tmp.name
+            try:
+                # DELETE y no TRUNCATE, que confirmaría implícitamente la transacción del llamador
+                cursor.execute(f"DELETE FROM {staging}")
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} "
+                    "CHARACTER SET utf8mb4 "
+                    "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                    "LINES TERMINATED BY '\\n' "
+                    f"({column_list})",
+                    (path,)
+                )
+                if table == 'facts_matches':
+                    cursor.execute(
+                        f"DELETE fm FROM facts_matches fm JOIN {staging} s "
+                        "ON fm.id = s.id AND fm.date_id <> s.date_id"
+                    )
+                cursor.execute(
+                    f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+                    f"ON DUPLICATE KEY UPDATE {_update_clause(columns)}"
+                )
+                if commit:
+                    conn.commit()
+            except Exception:
+                if commit:
+                    conn.rollback()
+                raise
+            finally:
+                os.remove(path)
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+    finally:
+        cursor.close()
+    return _report(table, len(rows), time.perf_counter() - start)
+
+
+def bulk_load(conn, table, rows, batch_size=None, method=None, commit=True):
+    """Carga filas en `table` con el método configurado"""
+    if not rows:
+        return _report(table, 0, 0.0)
+    method = method or BULK_CONFIG['method']
+    if method == 'load_data':
+        return load_data_infile(conn, table, rows, batch_size, commit)
+    return bulk_upsert(conn, table, rows, batch_size, commit)
+
+
+def normalize_matches(matches, competition_id):
+    """Convierte los partidos de la API en filas de dimensiones y hechos"""
+    tables = {name: {} for name in LOAD_ORDER if name != 'dim_competitions'}
+    for match in matches:
+        match_date = datetime.strptime(match['utcDate'][:10], '%Y-%m-%d').date()
+        for side in ('homeTeam', 'awayTeam'):
+            team = match[side]
+            if team.get('id') is None:
+                continue
+            tables['dim_teams'][team['id']] = {
+                'id': team['id'],
+                'name': team.get('name') or team.get('shortName') or str(team['id']),
+                'short_name': team.get('shortName'),
+                'tla': team.get('tla'),
+                'crest_url': team.get('crest')
+            }
+        tables['dim_dates'][match_date] = {
+            'id': match_date,
+            'day': match_date.day,
+            'month': match_date.month,
+            'year': match_date.year,
+            'day_of_week': match_date.isoweekday(),
+            'is_weekend': match_date.isoweekday() >= 6
+        }
+        # La API gratuita no trae estadísticas: fila vacía con el id del partido
+        stats = dict.fromkeys(TABLE_COLUMNS['dim_match_stats'])
+        stats['id'] = match['id']
+        tables['dim_match_stats'][match['id']] = stats
+        full_time = match.get('score', {}).get('fullTime', {})
+        tables['facts_matches'][match['id']] = {
+            'id': match['id'],
+            'home_team_id': match['homeTeam'].get('id'),
+            'away_team_id': match['awayTeam'].get('id'),
+            'competition_id': competition_id,
+            'date_id': match_date,
+            'stats_id': match['id'],
+            'home_score': full_time.get('home'),
+            'away_score': full_time.get('away'),
+            'status': match.get('status'),
+            'stage': match.get('stage')
+        }
+    # Los partidos sin equipos definidos (fases por sortear) no se cargan
+    tables['facts_matches'] = {
+        key: row for key, row in tables['facts_matches'].items()
+        if row['home_team_id'] is not None and row['away_team_id'] is not None
+    }
+    tables['dim_match_stats'] = {
+        key: row for key, row in tables['dim_match_stats'].items() if key in tables['facts_matches']
+    }
+    return {name: list(rows.values()) for name, rows in tables.items()}
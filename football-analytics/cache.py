@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from sqlalchemy import text
+from db import get_engine
+from forksafe import after_fork
+
+logger = logging.getLogger(__name__)
+
+# Configuración de la caché: 'disk' la comparten todos los workers (diskcache en
+# CACHE_DIR) con una caché local pequeña delante; 'memory' es solo por proceso
+CACHE_CONFIG = {
+    'backend': os.getenv('CACHE_BACKEND', 'disk'),
+    'directory': os.getenv('CACHE_DIR', 'shared-cache'),
+    'local_max_entries': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '8')),
+    'local_max_bytes': int(os.getenv('CACHE_LOCAL_MAX_MB', '64')) * 1024 * 1024,
+    'ttl': int(os.getenv('CACHE_TTL_SECONDS', '600')),
+    'max_entries': int(os.getenv('CACHE_MAX_ENTRIES', '32')),
+    'max_bytes': int(os.getenv('CACHE_MAX_MB', '256')) * 1024 * 1024,
+    'version_check_interval': float(os.getenv('CACHE_VERSION_CHECK_SECONDS', '5')),
+    # Figuras ya construidas (por filtros y versión de datos)
+    'figure_max_entries': int(os.getenv('FIGURE_CACHE_MAX_ENTRIES', '64')),
+    'figure_max_bytes': int(os.getenv('FIGURE_CACHE_MAX_MB', '64')) * 1024 * 1024
+}
+
+
+def estimate_size(value):
+    """Tamaño aproximado en bytes de un valor cacheado"""
+    if hasattr(value, 'memory_usage'):
+        try:
+            return int(value.memory_usage(index=True, deep=True).sum())
+        except TypeError:
+            pass
+    if hasattr(value, 'to_plotly_json'):
+        # Figuras de plotly: lo que ocupan serializadas en la respuesta
+        return len(value.to_json())
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Caché LRU con caducidad, límite de memoria e invalidación por versión de datos"""
+
+    def __init__(self, ttl, max_entries, max_bytes):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, nbytes, entry_version = entry
+            if time.monotonic() > expires_at or entry_version != version:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, version=None):
+        nbytes = estimate_size(value)
+        if nbytes > self.max_bytes:
+            logger.warning(f"⚠️ Valor demasiado grande para la caché ({nbytes} bytes): {key}")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, nbytes, version)
+            self._bytes += nbytes
+            # Expulsar las entradas menos usadas hasta respetar los límites
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def add(self, key, value, version=None):
+        """Guarda solo si la clave no existe (o caducó); devuelve True si la guardó"""
+        if self.get(key, version) is not None:
+            return False
+        self.set(key, value, version)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class DiskCache:
+    """Caché compartida entre procesos sobre diskcache (SQLite + ficheros en un directorio).
+
+    Misma interfaz que TTLCache. Las claves se guardan por su repr (tuplas
+    de filtros), los valores con pickle junto a su versión de datos, y
+    diskcache expulsa por LRU al superar `max_bytes`; al superar
+    `max_entries` se descartan las caducadas y después las más antiguas.
+    Es seguro tras un fork: cada proceso abre su propia conexión al usarla.
+    """
+
+    def __init__(self, directory, ttl, max_entries, max_bytes):
+        import diskcache
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = diskcache.Cache(directory, size_limit=max_bytes, eviction_policy='least-recently-used')
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        entry = self._cache.get(repr(key))
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, version=None):
+        with self._cache.transact():
+            # Reescribir la clave la pasa al final del orden de inserción que usa _enforce_max_entries
+            self._cache.delete(repr(key))
+            self._cache.set(repr(key), (version, value), expire=self.ttl)
+        self._enforce_max_entries()
+
+    def add(self, key, value, version=None):
+        """Guarda solo si la clave no existe, de forma atómica entre procesos"""
+        added = self._cache.add(repr(key), (version, value), expire=self.ttl)
+        if added:
+            self._enforce_max_entries()
+        return added
+
+    def _enforce_max_entries(self):
+        # len() de diskcache es un contador: barato en cada escritura
+        if len(self._cache) <= self.max_entries:
+            return
+        self._cache.expire()
+        while len(self._cache) > self.max_entries:
+            try:
+                # Primero en orden de inserción: la entrada escrita hace más tiempo
+                oldest, _ = self._cache.peekitem(last=False)
+            except KeyError:
+                break
+            self._cache.delete(oldest)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        # Sin las caducadas que diskcache aún no ha borrado
+        self._cache.expire()
+        return {
+            'entries': len(self._cache),
+            'bytes': self._cache.volume(),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class TieredCache:
+    """Caché local pequeña (sin deserializar) delante de la caché compartida"""
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, version=None):
+        value = self.local.get(key, version)
+        if value is None:
+            value = self.shared.get(key, version)
+            if value is not None:
+                self.local.set(key, value, version)
+        return value
+
+    def set(self, key, value, version=None):
+        self.local.set(key, value, version)
+        self.shared.set(key, value, version)
+
+    def add(self, key, value, version=None):
+        return self.shared.add(key, value, version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        shared = self.shared.stats()
+        local = self.local.stats()
+        # Aciertos en cualquiera de los dos niveles; fallo solo si tampoco estaba en la compartida
+        return dict(shared, hits=local['hits'] + shared['hits'], local_entries=local['entries'],
+                    local_bytes=local['bytes'])
+
+
+def create_cache(name, max_entries, max_bytes):
+    """Caché `name` con el backend configurado (la memoria sirve de sustituto local en pruebas)"""
+    if CACHE_CONFIG['backend'] != 'disk':
+        return TTLCache(ttl=CACHE_CONFIG['ttl'], max_entries=max_entries, max_bytes=max_bytes)
+    try:
+        shared = DiskCache(os.path.join(CACHE_CONFIG['directory'], name), CACHE_CONFIG['ttl'], max_entries, max_bytes)
+    except ImportError as e:
+        logger.warning(f"⚠️ Caché compartida no disponible ({e}): se usa una caché en memoria por worker")
+        return TTLCache(ttl=CACHE_CONFIG['ttl'], max_entries=max_entries, max_bytes=max_bytes)
+    local = TTLCache(
+        ttl=CACHE_CONFIG['ttl'],
+        max_entries=min(max_entries, CACHE_CONFIG['local_max_entries']),
+        max_bytes=min(max_bytes, CACHE_CONFIG['local_max_bytes'])
+    )
+    return TieredCache(local, shared)
+
+
+match_cache = create_cache('queries', CACHE_CONFIG['max_entries'], CACHE_CONFIG['max_bytes'])
+figure_cache = create_cache('figures', CACHE_CONFIG['figure_max_entries'], CACHE_CONFIG['figure_max_bytes'])
+
+_version_state = {'version': None, 'checked_at': None, 'refreshing': False}
+_version_lock = threading.Lock()
+
+
+def get_data_version():
+    """Token de versión de datos que incrementa import_data.py tras cada importación.
+
+    La consulta se limita a una cada `version_check_interval` segundos, de modo
+    que los dashboards sirven desde memoria y ven una importación nueva en
+    pocos segundos. La lectura se hace fuera del lock (conectar puede
+    reintentar durante varios segundos): mientras un hilo la refresca, el
+    resto sigue con la versión anterior.
+    """
+    now = time.monotonic()
+    with _version_lock:
+        checked_at = _version_state['checked_at']
+        if checked_at is not None and now - checked_at < CACHE_CONFIG['version_check_interval']:
+            return _version_state['version']
+        if _version_state['refreshing'] and checked_at is not None:
+            return _version_state['version']
+        _version_state['refreshing'] = True
+    try:
+        with get_engine().connect() as conn:
+            version = conn.execute(
+                text("SELECT version FROM meta_data_version WHERE id = 1")
+            ).scalar()
+    except Exception as e:
+        # Sin tabla de versión la caché depende solo del TTL
+        logger.warning(f"⚠️ No se pudo leer la versión de datos: {str(e)[:200]}")
+        with _version_lock:
+            version = _version_state['version']
+    with _version_lock:
+        _version_state['version'] = version
+        _version_state['checked_at'] = now
+        _version_state['refreshing'] = False
+    return version
+
+
+@after_fork
+def _reset_after_fork():
+    """Locks de la versión de datos y de la capa local de las cachés"""
+    global _version_lock
+    _version_lock = threading.Lock()
+    # Un refresco en curso en otro hilo del padre no terminará en el hijo
+    _version_state['refreshing'] = False
+    for cache in (match_cache, figure_cache):
+        cache = getattr(cache, 'local', cache)
+        cache._lock = threading.Lock()
+
@@ -0,0 +1,140 @@
+import os
+import time
+import logging
+import threading
+from sqlalchemy import create_engine, event, text
+from dotenv import load_dotenv
+from forksafe import after_fork
+
+# Cargar variables de entorno
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# CONFIGURACIÓN DE BASE DE DATOS
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'db'),
+    'port': os.getenv('DB_PORT', '3306'),
+    'user': os.getenv('DB_USER', 'futbol_user'),
+    'password': os.getenv('DB_PASSWORD', 'futbol_pass'),
+    'database': os.getenv('DB_NAME', 'futbol_db'),
+    'auth_plugin': 'mysql_native_password'
+}
+
+# Configuración del pool de conexiones (uno por worker de gunicorn)
+POOL_CONFIG = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+    'max_retries': int(os.getenv('DB_CONNECT_RETRIES', '5')),
+    'retry_delay': int(os.getenv('DB_CONNECT_RETRY_DELAY', '5'))
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+_pool_counters = {'connections_created': 0, 'checkouts': 0}
+
+
+def _database_url():
+    # DB_URL permite apuntar a otra base (p. ej. sqlite:///bench.db para los benchmarks)
+    if os.getenv('DB_URL'):
+        return os.getenv('DB_URL')
+    return (
+        f"mysql+mysqlconnector://{DB_CONFIG['user']}:{DB_CONFIG['password']}"
+        f"@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+    )
+
+
+def _register_pool_events(engine):
+    """Cuenta conexiones físicas creadas y préstamos del pool"""
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, conn_record):
+        _pool_counters['connections_created'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        _pool_counters['checkouts'] += 1
+
+
+def get_db_connection():
+    """Crea el engine y verifica la primera conexión con reintentos"""
+    max_retries = POOL_CONFIG['max_retries']
+    retry_delay = POOL_CONFIG['retry_delay']
+
+    url = _database_url()
+    sqlite = url.startswith('sqlite')
+    engine = create_engine(
+        url,
+        pool_size=POOL_CONFIG['pool_size'],
+        max_overflow=POOL_CONFIG['max_overflow'],
+        pool_timeout=POOL_CONFIG['pool_timeout'],
+        pool_recycle=POOL_CONFIG['pool_recycle'],
+        pool_pre_ping=True,
+        connect_args={} if sqlite else {
+            'connect_timeout': POOL_CONFIG['connect_timeout'],
+            'auth_plugin': DB_CONFIG['auth_plugin']
+        }
+    )
+    _register_pool_events(engine)
+
+    for attempt in range(max_retries):
+        try:
+            # create_engine es perezoso: la conexión real se abre aquí
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            logger.info(f"✅ Conexión exitosa a {engine.dialect.name}")
+            return engine
+        except Exception as e:
+            logger.error(f"⚠️ Intento {attempt + 1} de {max_retries}: Error de conexión - {str(e)}")
+            if attempt < max_retries - 1:
+                time.sleep(retry_delay)
+
+    engine.dispose()
+    raise ConnectionError("❌ No se pudo conectar a la base de datos después de varios intentos")
+
+
+def get_engine():
+    """Devuelve el engine compartido del proceso, creándolo la primera vez"""
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = get_db_connection()
+    return _engine
+
+
+def dispose_engine():
+    """Cierra todas las conexiones del pool y olvida el engine"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+@after_fork
+def _reset_after_fork():
+    """El hijo abre sus propias conexiones: los sockets heredados son del padre"""
+    global _engine_lock
+    _engine_lock = threading.Lock()
+    if _engine is not None:
+        # close=False: no cerrar los sockets que sigue usando el proceso padre
+        _engine.dispose(close=False)
+
+
+def pool_stats():
+    """Estadísticas del pool de conexiones del proceso actual"""
+    stats = {'pid': os.getpid(), 'initialized': _engine is not None}
+    stats.update(_pool_counters)
+    if _engine is not None:
+        pool = _engine.pool
+        stats.update({
+            'pool_size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        })
+    return stats
@@ -0,0 +1,32 @@
+"""Reinicio del estado de cada módulo en los procesos hijos.
+
+Los workers de gunicorn (con preload_app) y los callbacks en segundo plano
+de Dash nacen de un fork. En el hijo solo sobrevive el hilo que hizo el
+fork: un lock que otro hilo del padre tenía tomado en ese momento no se
+liberaría nunca, y las conexiones heredadas comparten socket con el padre.
+Cada módulo registra con `after_fork` la función que rehace ese estado.
+"""
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+_handlers = []
+
+
+def after_fork(func):
+    """Decorador: ejecuta `func` en el proceso hijo justo después de cada fork"""
+    _handlers.append(func)
+    return func
+
+
+def _run_handlers():
+    for func in _handlers:
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"❌ Error al reiniciar {func.__module__}.{func.__name__} tras el fork: {str(e)}")
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_run_handlers)
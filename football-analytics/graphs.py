@@ -0,0 +1,342 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import networkx as nx
+import plotly.graph_objects as go
+from metrics import span
+from cache import CACHE_CONFIG, create_cache
+from forksafe import after_fork
+
+logger = logging.getLogger(__name__)
+
+GRAPH_TYPES = ('wins', 'goals', 'home-away')
+
+# Configuración del cálculo de posiciones del grafo
+LAYOUT_CONFIG = {
+    'cache_size': int(os.getenv('LAYOUT_CACHE_SIZE', '64')),
+    'seed': int(os.getenv('LAYOUT_SEED', '42')),
+    'iterations': int(os.getenv('LAYOUT_ITERATIONS', '50')),
+    'warm_iterations': int(os.getenv('LAYOUT_WARM_ITERATIONS', '15')),
+    # Solapamiento mínimo de nodos para reutilizar un layout anterior
+    'warm_min_overlap': float(os.getenv('LAYOUT_WARM_MIN_OVERLAP', '0.8')),
+    # Layouts recientes (conjunto de nodos) que se anuncian en la caché compartida para el arranque en caliente
+    'shared_recent': int(os.getenv('LAYOUT_SHARED_RECENT', '16')),
+    'shared_max_bytes': int(os.getenv('LAYOUT_SHARED_CACHE_MB', '32')) * 1024 * 1024
+}
+
+# Configuración del renderizado de aristas
+RENDER_CONFIG = {
+    # 'auto' usa WebGL a partir de `webgl_min_edges` aristas; también 'svg' o 'webgl'
+    'mode': os.getenv('GRAPH_RENDER_MODE', 'auto'),
+    'webgl_min_edges': int(os.getenv('GRAPH_WEBGL_MIN_EDGES', '1000')),
+    'width_buckets': int(os.getenv('GRAPH_EDGE_WIDTH_BUCKETS', '5'))
+}
+
+# Pasos que se notifican a `progress(paso)` al construir el grafo: datos, aristas, layout, figura
+GRAPH_PROGRESS_STEPS = 4
+
+_layout_cache = OrderedDict()
+_layout_lock = threading.Lock()
+# Con la caché compartida, un layout calculado por un worker (o por un callback en
+# segundo plano, que corre en otro proceso) lo reutilizan los demás
+_shared_layouts = (create_cache('layouts', LAYOUT_CONFIG['cache_size'], LAYOUT_CONFIG['shared_max_bytes'])
+                   if CACHE_CONFIG['backend'] == 'disk' else None)
+_RECENT_LAYOUTS_KEY = ('layouts', 'recent')
+
+
+def create_empty_figure(message):
+    """Crea una figura vacía con un mensaje"""
+    return go.Figure(data=[], layout=go.Layout(title=message))
+
+
+def _aggregate_edges(source, target, weight):
+    """Suma los pesos de las aristas repetidas (equipos que se enfrentan varias veces)"""
+    edges = pd.DataFrame({'source': source, 'target': target, 'weight': weight})
+    return edges.groupby(['source', 'target'], sort=False, observed=True)['weight'].sum().reset_index()
+
+
+def build_edge_weights(df, graph_type='wins', threshold=3):
+    """Calcula las aristas (ganador -> perdedor, peso) sin bucles por fila"""
+    home = df['home_team'].to_numpy()
+    away = df['away_team'].to_numpy()
+    goal_diff = df['home_score'].to_numpy(dtype=np.int64) - df['away_score'].to_numpy(dtype=np.int64)
+    decided = goal_diff != 0
+
+    if graph_type in ('wins', 'goals'):
+        home_won = goal_diff[decided] > 0
+        winner = np.where(home_won, home[decided], away[decided])
+        loser = np.where(home_won, away[decided], home[decided])
+        if graph_type == 'wins':
+            weight = np.ones(len(winner), dtype=np.int64)
+        else:
+            weight = np.abs(goal_diff[decided])
+        return _aggregate_edges(winner, loser, weight)
+
+    if graph_type == 'home-away':
+        # Enfrentamientos (local, visitante) con al menos `threshold` victorias
+        pairs = pd.DataFrame({'home': home, 'away': away, 'home_won': goal_diff > 0})[decided]
+        counts = pairs.groupby(['home', 'away', 'home_won'], sort=False, observed=True).size().reset_index(name='count')
+        counts = counts[counts['count'] >= threshold]
+        home_won = counts['home_won'].to_numpy()
+        winner = np.where(home_won, counts['home'].to_numpy(), counts['away'].to_numpy())
+        loser = np.where(home_won, counts['away'].to_numpy(), counts['home'].to_numpy())
+        return _aggregate_edges(winner, loser, counts['count'].to_numpy())
+
+    return _aggregate_edges([], [], [])
+
+
+def graph_fingerprint(G):
+    """Huella del conjunto de nodos y de los pesos de las aristas"""
+    digest = hashlib.sha1()
+    for node in sorted(str(node) for node in G.nodes()):
+        digest.update(f"{node}\x02".encode('utf-8'))
+    for u, v, w in sorted((str(u), str(v), d.get('weight', 1)) for u, v, d in G.edges(data=True)):
+        digest.update(f"{u}\x00{v}\x00{w}\x01".encode('utf-8'))
+    nodes = frozenset(G.nodes())
+    return nodes, digest.hexdigest()
+
+
+def _recent_index():
+    """Caché compartida sin la capa local: el índice de recientes lo actualizan otros procesos"""
+    return getattr(_shared_layouts, 'shared', _shared_layouts)
+
+
+def _closest_layout(nodes):
+    """Layout con mayor solapamiento de nodos (para arranque en caliente).
+
+    Busca en la caché del proceso y en los layouts recientes de la caché
+    compartida, donde quedan los calculados en los callbacks en segundo plano.
+    """
+    best_pos, best_overlap = None, 0.0
+    with _layout_lock:
+        local = [(cached_nodes, pos) for (cached_nodes, _), pos in reversed(_layout_cache.items())]
+    for cached_nodes, pos in local:
+        overlap = len(nodes & cached_nodes) / len(nodes | cached_nodes)
+        if overlap > best_overlap:
+            best_pos, best_overlap = pos, overlap
+    if _shared_layouts is None:
+        return best_pos, best_overlap
+    for cached_nodes, fingerprint in reversed(_recent_index().get(_RECENT_LAYOUTS_KEY) or []):
+        overlap = len(nodes & cached_nodes) / len(nodes | cached_nodes)
+        if overlap > best_overlap:
+            pos = _shared_layouts.get(('layout', fingerprint))
+            if pos is not None:
+                best_pos, best_overlap = pos, overlap
+    return best_pos, best_overlap
+
+
+def _share_layout(key, pos):
+    """Guarda el layout en la caché compartida y lo anuncia entre los recientes"""
+    nodes, fingerprint = key
+    _shared_layouts.set(('layout', fingerprint), pos)
+    index = _recent_index()
+    # Leer-modificar-escribir sin lock entre procesos: perder una entrada solo cuesta un arranque en frío
+    recent = [entry for entry in index.get(_RECENT_LAYOUTS_KEY) or [] if entry[1] != fingerprint]
+    recent.append((nodes, fingerprint))
+    index.set(_RECENT_LAYOUTS_KEY, recent[-LAYOUT_CONFIG['shared_recent']:])
+
+
+def compute_layout(G):
+    """Posiciones de los nodos con caché LRU y arranque en caliente.
+
+    Con la misma huella se devuelve el layout cacheado (del proceso o de la
+    caché compartida). Si el grafo cambia poco se parte de las posiciones
+    anteriores con menos iteraciones; la semilla fija hace que todos los
+    workers calculen el mismo resultado.
+    """
+    key = graph_fingerprint(G)
+    with _layout_lock:
+        pos = _layout_cache.get(key)
+        if pos is not None:
+            _layout_cache.move_to_end(key)
+            return pos
+    pos = _shared_layouts.get(('layout', key[1])) if _shared_layouts is not None else None
+    if pos is not None:
+        _remember_layout(key, pos)
+        return pos
+    previous, overlap = _closest_layout(key[0])
+
+    if previous is not None and overlap >= LAYOUT_CONFIG['warm_min_overlap']:
+        initial = {node: previous[node] for node in G.nodes() if node in previous}
+        # Si solo aparecen nodos nuevos, los existentes se quedan quietos
+        fixed = list(initial) if len(initial) < len(G) else None
+        pos = nx.spring_layout(
+            G, k=0.5, pos=initial, fixed=fixed,
+            iterations=LAYOUT_CONFIG['warm_iterations'], seed=LAYOUT_CONFIG['seed']
+        )
+    else:
+        pos = nx.spring_layout(G, k=0.5, iterations=LAYOUT_CONFIG['iterations'], seed=LAYOUT_CONFIG['seed'])
+    pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+
+    _remember_layout(key, pos)
+    if _shared_layouts is not None:
+        _share_layout(key, pos)
+    return pos
+
+
+def _remember_layout(key, pos):
+    with _layout_lock:
+        _layout_cache[key] = pos
+        while len(_layout_cache) > LAYOUT_CONFIG['cache_size']:
+            _layout_cache.popitem(last=False)
+
+
+def layout_cache_stats():
+    with _layout_lock:
+        return {'entries': len(_layout_cache), 'max_entries': LAYOUT_CONFIG['cache_size']}
+
+
+def _segments(start, end):
+    """Intercala los extremos con NaN para dibujar muchas aristas en una sola traza"""
+    coords = np.full(len(start) * 3, np.nan)
+    coords[0::3] = start
+    coords[1::3] = end
+    return coords
+
+
+def build_edge_traces(G, pos, render_mode=None):
+    """Agrupa las aristas en pocas trazas según su grosor.
+
+    Cada grupo de grosor es una sola traza con separadores NaN, y una traza
+    de marcadores invisibles en el punto medio conserva la etiqueta de cada
+    arista; el tamaño de la figura deja de depender del número de trazas.
+    """
+    edges = list(G.edges(data='weight', default=1))
+    if not edges:
+        return []
+    render_mode = render_mode or RENDER_CONFIG['mode']
+    if render_mode == 'auto':
+        render_mode = 'webgl' if len(edges) >= RENDER_CONFIG['webgl_min_edges'] else 'svg'
+    scatter = go.Scattergl if render_mode == 'webgl' else go.Scatter
+
+    sources, targets, weights = zip(*edges)
+    start = np.array([pos[node] for node in sources])
+    end = np.array([pos[node] for node in targets])
+    weights = np.asarray(weights, dtype=float)
+    max_weight = weights.max() if weights.max() > 0 else 1
+
+    # Mismo grosor que antes (1 + 2 * peso / máximo), discretizado en cubetas
+    buckets = max(RENDER_CONFIG['width_buckets'], 2)
+    line_width = 1 + 2 * weights / max_weight
+    bucket = np.rint((line_width - 1) / 2 * (buckets - 1)).astype(int)
+
+    traces = []
+    for b in np.unique(bucket):
+        mask = bucket == b
+        traces.append(scatter(
+            x=_segments(start[mask, 0], end[mask, 0]),
+            y=_segments(start[mask, 1], end[mask, 1]),
+            line=dict(width=1 + 2 * b / (buckets - 1), color='#888'),
+            hoverinfo='skip',
+            mode='lines'
+        ))
+
+    middle = (start + end) / 2
+    traces.append(scatter(
+        x=middle[:, 0], y=middle[:, 1],
+        mode='markers',
+        marker=dict(size=8, color='#888', opacity=0),
+        hoverinfo='text',
+        text=[f"{u} → {v}: {w:g}" for u, v, w in zip(sources, targets, weights)]
+    ))
+    return traces
+
+
+# Función mejorada para crear grafos dirigidos
+def create_directed_graph(df, graph_type='wins', threshold=3, render_mode=None, progress=None):
+    """Crea un grafo dirigido con manejo robusto de errores"""
+    try:
+        if df.empty or 'home_team' not in df.columns or 'away_team' not in df.columns:
+            return create_empty_figure("Datos insuficientes")
+
+        # Validar columnas requeridas
+        required_cols = ['home_score', 'away_score'] if graph_type in GRAPH_TYPES else []
+        if any(col not in df.columns for col in required_cols):
+            return create_empty_figure("Datos requeridos no disponibles")
+
+        with span('graph_edges'):
+            edges = build_edge_weights(df, graph_type, threshold)
+        return create_graph_figure(edges, graph_type, render_mode, progress)
+
+    except Exception as e:
+        logger.error(f"Error al crear grafo: {str(e)[:200]}")
+        return create_empty_figure("Error generando gráfico")
+
+
+def head_to_head_edges(head_to_head):
+    """Aristas de victorias a partir de filas (local, visitante, victorias locales/visitantes)"""
+    home_wins = head_to_head[head_to_head['home_wins'] > 0]
+    away_wins = head_to_head[head_to_head['away_wins'] > 0]
+    return _aggregate_edges(
+        np.concatenate([home_wins['home_team'].to_numpy(), away_wins['away_team'].to_numpy()]),
+        np.concatenate([home_wins['away_team'].to_numpy(), away_wins['home_team'].to_numpy()]),
+        np.concatenate([home_wins['home_wins'].to_numpy(), away_wins['away_wins'].to_numpy()])
+    )
+
+
+def create_graph_figure(edges, graph_type='wins', render_mode=None, progress=None):
+    """Dibuja el grafo dirigido a partir de aristas (source, target, weight) ya agregadas.
+
+    Los errores se propagan: quien la llama decide qué mostrar y no se
+    guarda en la caché de figuras una figura de error.
+    """
+    if progress is not None:
+        progress(2)
+    # Añadir relaciones en bloque; los equipos sin aristas no se añaden
+    with span('graph_build'):
+        G = nx.DiGraph()
+        G.add_weighted_edges_from(zip(
+            edges['source'].tolist(),
+            edges['target'].tolist(),
+            edges['weight'].tolist()
+        ))
+
+    if len(G.nodes) == 0:
+        return create_empty_figure("No hay relaciones significativas")
+
+    # Generar visualización
+    with span('graph_layout'):
+        pos = compute_layout(G)
+    if progress is not None:
+        progress(3)
+
+    with span('graph_figure'):
+        edge_traces = build_edge_traces(G, pos, render_mode)
+
+        node_trace = go.Scatter(
+            x=[pos[node][0] for node in G.nodes()],
+            y=[pos[node][1] for node in G.nodes()],
+            mode='markers+text',
+            text=list(G.nodes()),
+            textposition="top center",
+            marker=dict(
+                showscale=True,
+                colorscale='Rainbow',
+                size=20,
+                color=[G.in_degree(node, weight='weight') for node in G.nodes()],
+                colorbar=dict(title='Influencia Recibida')
+            )
+        )
+
+        fig = go.Figure(data=edge_traces + [node_trace],
+                     layout=go.Layout(
+                        title=f'Relaciones entre Equipos - {graph_type}',
+                        showlegend=False,
+                        hovermode='closest',
+                        margin=dict(b=20,l=5,r=5,t=40),
+                        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False)))
+
+    return fig
+
+
+@after_fork
+def _reset_after_fork():
+    """El hilo de precalentado puede tener el lock tomado cuando se lanza un callback en segundo plano"""
+    global _layout_lock
+    _layout_lock = threading.Lock()
+
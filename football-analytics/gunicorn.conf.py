@@ -0,0 +1,44 @@
+"""Configuración de gunicorn para el dashboard.
+
+Con preload_app la aplicación (pandas, plotly, networkx, Dash y la
+instantánea memory-mapped) se importa una sola vez en el maestro y los
+workers la heredan copy-on-write. Importar app.py no abre conexiones a la
+base de datos ni hilos: el engine, la versión de datos y el precalentado
+se crean en cada worker con su primera petición, y las cachés de
+consultas, figuras y layouts se comparten en disco (cache.py). Las
+métricas de todos los workers se reúnen en METRICS_DIR (metrics.py), que
+se vacía al arrancar el maestro.
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:server
+"""
+import os
+import gc
+import glob
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Se fija antes de importar la aplicación (también con preload)
+os.environ.setdefault('METRICS_DIR', 'metrics-data')
+
+
+def on_starting(server):
+    # Los ficheros de una ejecución anterior harían que los contadores no empezaran en cero
+    metrics_dir = os.environ['METRICS_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    # Los objetos ya importados pasan a la generación permanente: el recolector
+    # no vuelve a tocar sus cabeceras y las páginas siguen compartidas tras el fork
+    gc.freeze()
+    server.log.info(f"✅ Maestro listo ({'preload' if preload_app else 'sin preload'}), {workers} workers")
+
+
+def post_fork(server, worker):
+    server.log.info(f"✅ Worker {worker.pid} arrancado")
@@ -1,14 +1,22 @@
 import os
 import time
+import argparse
+from datetime import date, timedelta
 import mysql.connector
-from mysql.connector import errorcode
-import requests
+from api_client import ApiClient
+from bulk_loader import bulk_load, BULK_CONFIG
+from rollups import refresh_rollups
+from ratings import update_ratings
+from import_pipeline import (start_run, unfinished_runs, resume_run, finish_run, run_pages,
+                             competition_summaries, run_pipeline)
+from migrations import migrate
+from snapshot import SNAPSHOT_CONFIG, export_from_database
 from dotenv import load_dotenv
 load_dotenv()
 
 # Configuración de la API
-API_KEY = '1f21c76952a447f9abf40ace1a8879b4'
-BASE_URL = 'http://api.football-data.org/v4/'
+API_KEY = os.getenv('API_KEY', '1f21c76952a447f9abf40ace1a8879b4')
+BASE_URL = os.getenv('API_BASE_URL', 'http://api.football-data.org/v4/')
 # Configuración de la base de datos
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'db'),
@@ -18,127 +26,202 @@ DB_CONFIG = {
     'port': os.getenv('DB_PORT', 3306),
     'auth_plugin': 'mysql_native_password'
 }
-def get_headers():
-    return {'X-Auth-Token': API_KEY}
+# Competiciones cuyos partidos se importan (códigos de football-data.org)
+IMPORT_COMPETITIONS = [code.strip() for code in os.getenv('IMPORT_COMPETITIONS', 'PL,PD,BL1,SA,FL1').split(',') if code.strip()]
+# Temporadas a descargar en la carga del histórico (vacío = temporada actual)
+IMPORT_SEASONS = [season.strip() for season in os.getenv('IMPORT_SEASONS', '').split(',') if season.strip()] or [None]
+# Ventana de la importación incremental alrededor de la marca de agua
+IMPORT_LOOKBACK_DAYS = int(os.getenv('IMPORT_LOOKBACK_DAYS', '3'))
+IMPORT_AHEAD_DAYS = int(os.getenv('IMPORT_AHEAD_DAYS', '14'))
 def connect_db(max_retries=5, retry_delay=5):
     """Conexión a la base de datos con reintentos"""
     for attempt in range(max_retries):
         try:
-            conn = mysql.connector.connect(**DB_CONFIG)
+            # LOAD DATA LOCAL INFILE solo se habilita si se usa ese método de carga
+            conn = mysql.connector.connect(**DB_CONFIG, allow_local_infile=BULK_CONFIG['method'] == 'load_data')
             print("✅ Conexión exitosa a MySQL")
             return conn
         except mysql.connector.Error as err:
             print(f"⚠️ Intento {attempt + 1} de {max_retries}: Error de conexión - {err}")
             if attempt < max_retries - 1:
                 time.sleep(retry_delay)
-   raise Exception("❌ No se pudo conectar a la base de datos")
+    raise Exception("❌ No se pudo conectar a la base de datos")
 def setup_database(conn):
-        """Crear tablas si no existen con sintaxis corregida"""
-    tables = {
-        'dim_competitions': """
-            CREATE TABLE IF NOT EXISTS dim_competitions (
-                id INT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                code VARCHAR(10),
-                area_name VARCHAR(100)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-            """,
-        'dim_teams': """
-            CREATE TABLE IF NOT EXISTS dim_teams (
-                id INT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                short_name VARCHAR(50),
-                tla VARCHAR(10),
-                crest_url VARCHAR(255)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """,
-                'dim_dates': """
-            CREATE TABLE IF NOT EXISTS dim_dates (
-                id DATE PRIMARY KEY,
-                day INT,
-                month INT,
-                year INT,
-                day_of_week INT
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """,
-        'dim_match_stats': """
-            CREATE TABLE IF NOT EXISTS dim_match_stats (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                possession_home INT,
-                shots_home INT,
-                shots_on_target_home INT,
-                shots_away INT,
-                shots_on_target_away INT,
-                corners_home INT,
-                corners_away INT,
-                fouls_home INT,
-                fouls_away INT
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """,
-                'facts_matches': """
-            CREATE TABLE IF NOT EXISTS facts_matches (
-                id INT PRIMARY KEY,
-                home_team_id INT,
-                away_team_id INT,
-                competition_id INT,
-                date_id DATE,
-                stats_id INT,
-                home_score INT,
-                away_score INT,
-                status VARCHAR(20),
-                stage VARCHAR(50),
-                FOREIGN KEY (home_team_id) REFERENCES dim_teams(id),
-                FOREIGN KEY (away_team_id) REFERENCES dim_teams(id),
-                FOREIGN KEY (competition_id) REFERENCES dim_competitions(id),
-                FOREIGN KEY (date_id) REFERENCES dim_dates(id),
-                FOREIGN KEY (stats_id) REFERENCES dim_match_stats(id)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-            }
-    
-    cursor = conn.cursor()
+    """Aplica las migraciones pendientes del esquema (ver migrations.py)"""
     try:
-        for table_name, table_sql in tables.items():
-            cursor.execute(table_sql)
-               print(f"✅ Tabla {table_name} creada/verificada")
-        conn.commit()
+        migrate(conn)
     except mysql.connector.Error as err:
         print(f"❌ Error creando tablas: {err}")
-        conn.rollback()
-         raise  # Relanzamos la excepción para detener el proceso
+        raise  # Relanzamos la excepción para detener el proceso
+def bump_data_version(conn):
+    """Incrementa la versión de datos para invalidar las cachés del dashboard"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE meta_data_version SET version = version + 1 WHERE id = 1")
+        conn.commit()
+        print("🔄 Versión de datos actualizada")
     finally:
         cursor.close()
-def import_data(conn):
-    """Importar datos desde la API"""
-    # Aquí iría tu lógica de importación original
-    # Ejemplo simplificado:
+def next_data_version(conn):
+    """Versión de datos que publicará bump_data_version"""
     cursor = conn.cursor()
     try:
-        # 1. Importar competiciones
-        response = requests.get(f"{BASE_URL}competitions", headers=get_headers())
-        competitions = response.json().get('competitions', [])
-        for comp in competitions:
-            cursor.execute(
-                """INSERT INTO dim_competitions 
-                (id, name, code, area_name) 
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE 
-                name=VALUES(name), code=VALUES(code), area_name=VALUES(area_name)""",
-                (comp['id'], comp['name'], comp['code'], comp['area']['name'])
-            )
+        cursor.execute("SELECT version + 1 FROM meta_data_version WHERE id = 1")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+def get_watermark(conn, competition_id):
+    """Marca de agua de la última importación de una competición"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT last_updated, last_finished_date FROM import_state WHERE competition_id = %s",
+            (competition_id,)
+        )
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else (None, None)
+    finally:
+        cursor.close()
+def save_watermark(conn, competition_id, last_updated, last_finished_date):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """INSERT INTO import_state (competition_id, last_updated, last_finished_date)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+            last_updated=VALUES(last_updated), last_finished_date=VALUES(last_finished_date)""",
+            (competition_id, last_updated, last_finished_date)
+        )
         conn.commit()
+    finally:
+        cursor.close()
+def match_params(last_finished_date, full=False):
+    """Rango dateFrom/dateTo para pedir solo partidos nuevos o que pueden haber cambiado"""
+    if full or last_finished_date is None:
+        return {}
+    date_from = last_finished_date - timedelta(days=IMPORT_LOOKBACK_DAYS)
+    date_to = date.today() + timedelta(days=IMPORT_AHEAD_DAYS)
+    return {'dateFrom': date_from.isoformat(), 'dateTo': date_to.isoformat()}
+def plan_pages(conn, codes, full=False):
+    """Páginas de una corrida: una por competición y temporada, o la ventana de fechas incremental"""
+    pages = []
+    for code in IMPORT_COMPETITIONS:
+        if code not in codes:
+            print(f"⚠️ Competición {code} no disponible en la API")
+            continue
+        competition_id = codes[code]
+        last_updated, last_finished_date = (None, None) if full else get_watermark(conn, competition_id)
+        params = match_params(last_finished_date, full)
+        # Las temporadas solo se recorren al cargar el histórico; después basta la ventana de fechas
+        seasons = IMPORT_SEASONS if not params else [None]
+        for season in seasons:
+            pages.append({
+                'page_key': f"{code}:{season or 'actual'}",
+                'competition_id': competition_id,
+                'path': f"competitions/{code}/matches",
+                'params': dict(params, season=season) if season else params,
+                'since_updated': last_updated
+            })
+    return pages
+def _latest(current, new):
+    return new if current is None or (new is not None and new > current) else current
+def finalize_run(conn, run_id, full=False):
+    """Resúmenes y marcas de agua de las competiciones completas; devuelve el primer día cambiado de cada una"""
+    first_changed = []
+    for summary in competition_summaries(conn, run_id):
+        competition_id = summary['competition_id']
+        if not summary['done']:
+            # Sin todas sus páginas la marca de agua no avanza
+            print(f"⚠️ Competición {competition_id}: páginas pendientes, la marca de agua no avanza")
+            continue
+        if full:
+            refresh_rollups(conn, competition_id)
+        elif summary['changed']:
+            refresh_rollups(conn, competition_id, int(summary['min_date'].strftime('%Y%m%d')),
+                            int(summary['max_date'].strftime('%Y%m%d')))
+            first_changed.append(summary['min_date'])
+        last_updated, last_finished_date = get_watermark(conn, competition_id)
+        save_watermark(conn, competition_id, _latest(last_updated, summary['last_updated']),
+                       _latest(last_finished_date, summary['last_finished_date']))
+    return first_changed
+def execute_run(conn, client, run_id, full=False):
+    """Carga las páginas pendientes de la corrida y, con lo confirmado, actualiza resúmenes, marcas de agua y ratings"""
+    start = time.perf_counter()
+    totals = run_pipeline(conn, client, run_id, run_pages(conn, run_id))
+    elapsed = time.perf_counter() - start
+    print(f"✅ Corrida {run_id}: {totals['rows']} partidos en {totals['batches']} lotes, {elapsed:.2f}s "
+          f"({totals['rows'] / max(elapsed, 1e-9):.0f} partidos/s)")
+    first_changed = finalize_run(conn, run_id, full)
+    # Ratings: se reproducen los partidos desde el primer día que ha cambiado
+    if full or first_changed:
+        update_ratings(conn, None if full else min(first_changed))
+    pending = finish_run(conn, run_id)
+    if pending:
+        print(f"⚠️ Corrida {run_id}: {pending} páginas pendientes, se reanudará en la próxima importación")
+def import_data(conn, full=False):
+    """Importar datos desde la API por etapas (ver import_pipeline.py).
+
+    En modo incremental solo se piden los partidos posteriores a la marca
+    de agua de cada competición y solo se escriben los que cambiaron;
+    `full=True` vuelve a descargar y reescribir todo el histórico. Antes de
+    empezar se reanudan, desde su último lote confirmado, las corridas que
+    quedaron a medias.
+    """
+    client = ApiClient(API_KEY, BASE_URL)
+    try:
+        # 1. Reanudar corridas interrumpidas o con páginas fallidas
+        for run_id, mode, attempts in unfinished_runs(conn):
+            if resume_run(conn, run_id):
+                print(f"🔄 Reanudando la corrida {run_id} ({mode}, intento {attempts + 1})")
+                execute_run(conn, client, run_id, mode == 'full')
+            else:
+                print(f"⚠️ Corrida {run_id} abandonada tras {attempts} intentos")
+
+        # 2. Importar competiciones
+        competitions = client.get_json('competitions').data.get('competitions', [])
+        bulk_load(conn, 'dim_competitions', [
+            {'id': comp['id'], 'name': comp['name'], 'code': comp['code'], 'area_name': comp['area']['name']}
+            for comp in competitions
+        ])
         print(f"✅ Importadas {len(competitions)} competiciones")
+
+        # 3. Planificar las páginas de partidos y cargarlas: descarga, normalización,
+        # deduplicación y escritura por lotes con punto de control
+        codes = {comp['code']: comp['id'] for comp in competitions if comp.get('code')}
+        pages = plan_pages(conn, codes, full)
+        run_id = start_run(conn, 'full' if full else 'incremental', pages)
+        execute_run(conn, client, run_id, full)
+        print(f"📊 API: {client.stats['requests']} peticiones, "
+              f"{client.stats['not_modified']} sin cambios, {client.stats['retries']} reintentos")
     except Exception as e:
         print(f"❌ Error en importación: {e}")
         conn.rollback()
-    finally:
-        cursor.close()
+def export_dashboard_snapshot(version=None):
+    """Regenera la instantánea columnar del dashboard marcada con `version`"""
+    if not SNAPSHOT_CONFIG['enabled']:
+        return
+    try:
+        manifest = export_from_database(version=version)
+        print(f"✅ Instantánea del dashboard: {manifest['rows']} partidos (versión {manifest['version']})")
+    except Exception as e:
+        # Sin instantánea el dashboard sigue leyendo de MySQL
+        print(f"⚠️ No se pudo exportar la instantánea: {e}")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Importador de datos de football-data.org")
+    parser.add_argument('--full', action='store_true',
+                        help="Ignorar las marcas de agua y reimportar todo el histórico")
+    return parser.parse_args()
 def main():
-    print("⚽ Iniciando importador de datos de fútbol")
+    args = parse_args()
+    print(f"⚽ Iniciando importador de datos de fútbol ({'completo' if args.full else 'incremental'})")
     try:
         conn = connect_db()
         setup_database(conn)
-        import_data(conn)
+        import_data(conn, full=args.full)
+        # La instantánea se escribe con la versión siguiente antes de publicarla: un worker
+        # que vea la versión nueva ya encuentra su instantánea en disco
+        export_dashboard_snapshot(next_data_version(conn))
+        bump_data_version(conn)
         print("✅ Proceso completado exitosamente")
         
     except Exception as e:
@@ -147,5 +230,6 @@ def main():
         if 'conn' in locals() and conn.is_connected():
             conn.close()
             print("🔌 Conexión a la base de datos cerrada")
-            if __name__ == '__main__':
+
+if __name__ == '__main__':
     main()
@@ -0,0 +1,399 @@
+"""Importación por etapas con colas acotadas y puntos de control.
+
+Las etapas son generadores encadenados; la descarga y la normalización
+corren cada una en su hilo y entregan su salida por una cola acotada:
+
+    fetch_pages -> normalize_pages -> dedupe_batches -> write_batches
+
+- fetch_pages descarga las páginas (una competición y temporada, o la
+  ventana de fechas de la importación incremental) con el pool acotado del
+  cliente (API_MAX_WORKERS), todas por el mismo token bucket.
+- normalize_pages descarta los partidos que no cambiaron y parte el resto
+  en lotes de filas de dimensiones y hechos.
+- dedupe_batches quita las filas de dimensiones que ya están en la base
+  (equipos sin cambios y fechas conocidas).
+- write_batches carga cada lote y anota su punto de control en import_pages.
+
+Cada cola guarda como mucho IMPORT_QUEUE_SIZE páginas o lotes (más las
+API_MAX_WORKERS descargas en curso), así que la memoria depende del tamaño
+de una página y no del histórico. Las filas de un lote y su punto de
+control se confirman en una sola transacción: si la importación se
+interrumpe, la siguiente ejecución reanuda la misma corrida justo después
+del último lote confirmado.
+"""
+import os
+import json
+import queue
+import hashlib
+import threading
+from datetime import datetime
+from bulk_loader import LOAD_ORDER, BULK_CONFIG, bulk_load, normalize_matches
+
+PIPELINE_CONFIG = {
+    'queue_size': int(os.getenv('IMPORT_QUEUE_SIZE', '2')),
+    'batch_size': BULK_CONFIG['batch_size'],
+    # Reanudaciones de una corrida antes de darla por abandonada
+    'max_attempts': int(os.getenv('IMPORT_MAX_ATTEMPTS', '3'))
+}
+
+CHECKPOINT_TABLES = {
+    'import_runs': """
+        CREATE TABLE IF NOT EXISTS import_runs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            mode VARCHAR(20) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            attempts INT NOT NULL DEFAULT 1,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'import_pages': """
+        CREATE TABLE IF NOT EXISTS import_pages (
+            run_id INT NOT NULL,
+            page_key VARCHAR(100) NOT NULL,
+            competition_id INT NOT NULL,
+            path VARCHAR(255) NOT NULL,
+            params VARCHAR(500) NOT NULL,
+            since_updated DATETIME NULL,
+            content_hash CHAR(40),
+            batches_done INT NOT NULL DEFAULT 0,
+            changed INT NOT NULL DEFAULT 0,
+            min_date DATE,
+            max_date DATE,
+            last_updated DATETIME,
+            last_finished_date DATE,
+            done BOOLEAN NOT NULL DEFAULT FALSE,
+            error VARCHAR(255),
+            PRIMARY KEY (run_id, page_key)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """
+}
+
+PAGE_COLUMNS = ['page_key', 'competition_id', 'path', 'params', 'since_updated', 'content_hash',
+                'batches_done', 'done']
+
+
+def parse_api_datetime(value):
+    """Convierte '2024-08-16T19:00:00Z' en datetime sin zona (UTC)"""
+    return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S') if value else None
+
+
+def select_changed(matches, last_updated):
+    """Descarta los partidos que no cambiaron desde la última importación"""
+    if last_updated is None:
+        return matches
+    return [m for m in matches if (parse_api_datetime(m.get('lastUpdated')) or datetime.max) > last_updated]
+
+
+def advance_watermark(matches, last_updated, last_finished_date):
+    """Nueva marca de agua: último lastUpdated y última fecha con partido terminado"""
+    for match in matches:
+        updated = parse_api_datetime(match.get('lastUpdated'))
+        if updated and (last_updated is None or updated > last_updated):
+            last_updated = updated
+        if match.get('status') == 'FINISHED':
+            played = parse_api_datetime(match['utcDate']).date()
+            if last_finished_date is None or played > last_finished_date:
+                last_finished_date = played
+    return last_updated, last_finished_date
+
+
+# Corridas y puntos de control (conexión DB-API del importador, parámetros %s)
+def start_run(conn, mode, pages):
+    """Registra una corrida nueva con sus páginas; devuelve su id"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO import_runs (mode, status) VALUES (%s, 'running')", (mode,))
+        run_id = cursor.lastrowid
+        for page in pages:
+            cursor.execute(
+                "INSERT INTO import_pages (run_id, page_key, competition_id, path, params, since_updated) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                (run_id, page['page_key'], page['competition_id'], page['path'],
+                 json.dumps(page['params'], sort_keys=True), page['since_updated'])
+            )
+        conn.commit()
+        return run_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def unfinished_runs(conn):
+    """Corridas interrumpidas o con páginas fallidas, de la más antigua a la más reciente"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, mode, attempts FROM import_runs WHERE status IN ('running', 'failed') ORDER BY id")
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def resume_run(conn, run_id):
+    """Anota un nuevo intento; devuelve False (y abandona la corrida) si se agotaron los intentos"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE import_runs SET attempts = attempts + 1, status = 'running' WHERE id = %s", (run_id,))
+        cursor.execute("SELECT attempts FROM import_runs WHERE id = %s", (run_id,))
+        attempts = cursor.fetchone()[0]
+        if attempts > PIPELINE_CONFIG['max_attempts']:
+            cursor.execute("UPDATE import_runs SET status = 'abandoned', finished_at = NOW() WHERE id = %s", (run_id,))
+        conn.commit()
+        return attempts <= PIPELINE_CONFIG['max_attempts']
+    finally:
+        cursor.close()
+
+
+def finish_run(conn, run_id):
+    """Cierra la corrida: 'done' si todas sus páginas terminaron, si no 'failed' para reanudarla"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM import_pages WHERE run_id = %s AND NOT done", (run_id,))
+        pending = cursor.fetchone()[0]
+        cursor.execute(
+            "UPDATE import_runs SET status = %s, finished_at = NOW() WHERE id = %s",
+            ('failed' if pending else 'done', run_id)
+        )
+        conn.commit()
+        return pending
+    finally:
+        cursor.close()
+
+
+def run_pages(conn, run_id):
+    """Páginas pendientes de una corrida con su punto de control"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT {', '.join(PAGE_COLUMNS)} FROM import_pages WHERE run_id = %s AND NOT done ORDER BY page_key",
+            (run_id,)
+        )
+        pages = [dict(zip(PAGE_COLUMNS, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    for page in pages:
+        page['params'] = json.loads(page['params'])
+    return pages
+
+
+def competition_summaries(conn, run_id):
+    """Por competición: si terminó, rango de fechas cambiado y nueva marca de agua de la corrida"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT competition_id, MIN(done + 0), SUM(changed), MIN(min_date), MAX(max_date), "
+            "MAX(last_updated), MAX(last_finished_date) "
+            "FROM import_pages WHERE run_id = %s GROUP BY competition_id",
+            (run_id,)
+        )
+        return [
+            {'competition_id': row[0], 'done': bool(row[1]), 'changed': int(row[2] or 0),
+             'min_date': row[3], 'max_date': row[4], 'last_updated': row[5], 'last_finished_date': row[6]}
+            for row in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+
+
+def _save_checkpoint(conn, run_id, item):
+    """Anota el punto de control en la transacción abierta (la confirma el llamador)"""
+    cursor = conn.cursor()
+    try:
+        if item['kind'] == 'batch':
+            # El primer lote reinicia los acumulados (la página pudo cambiar desde el intento anterior)
+            first = item['number'] == 1
+            cursor.execute(
+                "UPDATE import_pages SET content_hash = %s, batches_done = %s, error = NULL, "
+                "changed = CASE WHEN %s THEN %s ELSE changed + %s END, "
+                "min_date = CASE WHEN %s OR min_date IS NULL OR %s < min_date THEN %s ELSE min_date END, "
+                "max_date = CASE WHEN %s OR max_date IS NULL OR %s > max_date THEN %s ELSE max_date END "
+                "WHERE run_id = %s AND page_key = %s",
+                (item['content_hash'], item['number'], first, item['rows'], item['rows'],
+                 first, item['min_date'], item['min_date'], first, item['max_date'], item['max_date'],
+                 run_id, item['page']['page_key'])
+            )
+        elif item['kind'] == 'page':
+            if item['batches'] == 0:
+                cursor.execute(
+                    "UPDATE import_pages SET changed = 0, min_date = NULL, max_date = NULL "
+                    "WHERE run_id = %s AND page_key = %s",
+                    (run_id, item['page']['page_key'])
+                )
+            cursor.execute(
+                "UPDATE import_pages SET content_hash = %s, batches_done = %s, last_updated = %s, "
+                "last_finished_date = %s, done = TRUE, error = NULL WHERE run_id = %s AND page_key = %s",
+                (item['content_hash'], item['batches'], item['last_updated'], item['last_finished_date'],
+                 run_id, item['page']['page_key'])
+            )
+        else:
+            cursor.execute(
+                "UPDATE import_pages SET error = %s WHERE run_id = %s AND page_key = %s",
+                (str(item['error'])[:255], run_id, item['page']['page_key'])
+            )
+    finally:
+        cursor.close()
+
+
+# Etapas
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+def run_in_thread(items, stop, maxsize=None, name='stage'):
+    """Consume el iterable `items` en un hilo y entrega sus elementos por una cola acotada.
+
+    `stop` es común a todas las etapas: al activarlo, los hilos productores
+    y los consumidores en espera terminan en menos de medio segundo.
+    """
+    buffer = queue.Queue(maxsize or PIPELINE_CONFIG['queue_size'])
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            put(_DONE)
+
+    threading.Thread(target=produce, name=f"import-{name}", daemon=True).start()
+    while True:
+        try:
+            item = buffer.get(timeout=0.5)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _StageError):
+            raise item.error
+        yield item
+
+
+def fetch_pages(client, pages):
+    """Descarga las páginas en paralelo y en orden; los errores de una página no detienen las demás"""
+    yield from client.iter_fetch((page, page['path'], page['params']) for page in pages)
+
+
+def normalize_pages(fetched, batch_size=None):
+    """Parte los partidos cambiados de cada página en lotes normalizados.
+
+    Si la página no cambió desde el intento anterior (misma huella), se
+    saltan los lotes ya anotados. Al final de cada página se emite su
+    resumen para la marca de agua.
+    """
+    batch_size = batch_size or PIPELINE_CONFIG['batch_size']
+    for page, response in fetched:
+        if isinstance(response, Exception):
+            yield {'kind': 'error', 'page': page, 'error': response}
+            continue
+        # Con 304 el cliente devuelve el último cuerpo guardado: se procesa igual,
+        # así una página interrumpida tras guardar su ETag no se pierde
+        matches = response.data.get('matches', [])
+        content_hash = hashlib.sha1(json.dumps(matches, sort_keys=True).encode('utf-8')).hexdigest()
+        changed = select_changed(matches, page['since_updated'])
+        batches = -(-len(changed) // batch_size)
+        start = page['batches_done'] if content_hash == page['content_hash'] else 0
+        for number in range(start + 1, batches + 1):
+            chunk = changed[(number - 1) * batch_size:number * batch_size]
+            days = [match['utcDate'][:10] for match in chunk]
+            yield {
+                'kind': 'batch', 'page': page, 'number': number, 'content_hash': content_hash,
+                'tables': normalize_matches(chunk, page['competition_id']),
+                'rows': len(chunk), 'min_date': min(days), 'max_date': max(days)
+            }
+        last_updated, last_finished_date = advance_watermark(matches, None, None)
+        yield {
+            'kind': 'page', 'page': page, 'content_hash': content_hash, 'batches': batches,
+            'matches': len(matches), 'changed': len(changed), 'not_modified': response.not_modified,
+            'last_updated': last_updated, 'last_finished_date': last_finished_date
+        }
+
+
+def _team_signature(row):
+    return tuple(row[col] for col in ('name', 'short_name', 'tla', 'crest_url'))
+
+
+def load_known_dimensions(conn):
+    """Equipos (con sus datos) y fechas ya cargados; crecen con las dimensiones, no con los partidos"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, name, short_name, tla, crest_url FROM dim_teams")
+        teams = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        cursor.execute("SELECT id FROM dim_dates")
+        dates = {row[0] for row in cursor.fetchall()}
+        return teams, dates
+    finally:
+        cursor.close()
+
+
+def dedupe_batches(items, known_teams, known_dates):
+    """Quita de cada lote los equipos sin cambios y las fechas que ya existen"""
+    for item in items:
+        if item['kind'] == 'batch':
+            tables = item['tables']
+            teams = [row for row in tables['dim_teams'] if known_teams.get(row['id']) != _team_signature(row)]
+            dates = [row for row in tables['dim_dates'] if row['id'] not in known_dates]
+            for row in teams:
+                known_teams[row['id']] = _team_signature(row)
+            known_dates.update(row['id'] for row in dates)
+            tables['dim_teams'], tables['dim_dates'] = teams, dates
+        yield item
+
+
+def write_batches(conn, run_id, items, report=print):
+    """Carga cada lote (dimensiones antes que hechos) y su punto de control en una transacción"""
+    totals = {'batches': 0, 'rows': 0, 'pages': 0, 'errors': 0}
+    for item in items:
+        page = item['page']
+        try:
+            if item['kind'] == 'batch':
+                for table in LOAD_ORDER:
+                    if item['tables'].get(table):
+                        bulk_load(conn, table, item['tables'][table], commit=False)
+            _save_checkpoint(conn, run_id, item)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if item['kind'] == 'batch':
+            totals['batches'] += 1
+            totals['rows'] += item['rows']
+        elif item['kind'] == 'page':
+            totals['pages'] += 1
+            status = "sin cambios" if item['not_modified'] else f"{item['changed']} cambiados"
+            report(f"✅ {page['page_key']}: {item['matches']} partidos, {status}")
+        else:
+            totals['errors'] += 1
+            report(f"❌ {page['page_key']}: error al descargar partidos - {item['error']}")
+    return totals
+
+
+def run_pipeline(conn, client, run_id, pages, report=print):
+    """Ejecuta las etapas sobre las páginas pendientes de una corrida"""
+    known_teams, known_dates = load_known_dimensions(conn)
+    stop = threading.Event()
+    fetched = run_in_thread(fetch_pages(client, pages), stop, name='fetch')
+    batches = run_in_thread(normalize_pages(fetched), stop, name='normalize')
+    try:
+        return write_batches(conn, run_id, dedupe_batches(batches, known_teams, known_dates), report)
+    finally:
+        # Si la escritura falla, las etapas anteriores se detienen en su siguiente entrega
+        stop.set()
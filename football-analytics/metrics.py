@@ -0,0 +1,418 @@
+"""Instrumentación del dashboard en formato de exposición de Prometheus.
+
+`span(nombre)` mide una etapa (consulta SQL, procesado, layout del grafo,
+construcción de figuras) e `instrumented(nombre)` envuelve un callback de
+Dash. Con el perfilado activado (PROFILE_CALLBACKS=1) los callbacks que
+superan PROFILE_THRESHOLD_SECONDS dejan un volcado de cProfile en
+PROFILE_DIR, que se puede abrir con `python -m pstats` o snakeviz. El
+perfilado por petición (cabecera `X-Profile: 1` o cookie `profile=1`)
+solo se atiende con PROFILE_REQUESTS=1.
+
+Con varios workers de gunicorn, METRICS_DIR apunta a un directorio
+compartido: cada proceso vuelca allí su estado cada METRICS_FLUSH_SECONDS
+y /metrics, lo atienda el worker que lo atienda, suma los histogramas y
+contadores de todos los ficheros (también los de workers ya terminados,
+así no retroceden) y expone los gauges de los workers vivos con la
+etiqueta `pid`. Los callbacks en segundo plano de Dash corren en un
+proceso por trabajo que termina con os._exit: `instrumented` vuelca al
+acabar fuera de una petición, y cada lectura suma los ficheros de los
+procesos terminados en aggregate.json y los borra, así el directorio no
+crece con cada trabajo. Sin METRICS_DIR las métricas son las del proceso
+actual.
+"""
+import os
+import json
+import glob
+import time
+import uuid
+import logging
+import cProfile
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from datetime import datetime
+from flask import request, has_request_context
+try:
+    import fcntl
+except ImportError:
+    # Sin flock (Windows) no se compactan los ficheros de procesos terminados
+    fcntl = None
+from forksafe import after_fork
+
+logger = logging.getLogger(__name__)
+
+METRICS_CONFIG = {
+    'buckets': [float(b) for b in os.getenv(
+        'METRICS_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(',')],
+    'profile_enabled': os.getenv('PROFILE_CALLBACKS', '0') == '1',
+    'profile_requests': os.getenv('PROFILE_REQUESTS', '0') == '1',
+    'profile_threshold': float(os.getenv('PROFILE_THRESHOLD_SECONDS', '1.0')),
+    'profile_dir': os.getenv('PROFILE_DIR', 'profiles'),
+    'multiprocess_dir': os.getenv('METRICS_DIR', ''),
+    'flush_interval': float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas, seguro entre hilos"""
+
+    def __init__(self, name, documentation, label_names=(), buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = sorted(buckets or METRICS_CONFIG['buckets']) + [float('inf')]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+        _ensure_flusher()
+
+    def series(self):
+        """Copia de las series: {etiquetas: {'counts', 'sum', 'count'}}"""
+        with self._lock:
+            return {key: dict(series, counts=list(series['counts'])) for key, series in self._series.items()}
+
+    def render(self, series=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            series = self.series()
+        for key, values in sorted(series.items()):
+            labels = list(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, values['counts']):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {values['sum']!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {values['count']}")
+        return lines
+
+
+SPAN_SECONDS = Histogram(
+    'dashboard_span_seconds', 'Duración de las etapas internas del dashboard', ['span'])
+CALLBACK_SECONDS = Histogram(
+    'dashboard_callback_seconds', 'Duración de los callbacks de Dash', ['callback'])
+REQUEST_SECONDS = Histogram(
+    'dashboard_request_seconds', 'Duración de las peticiones HTTP (incluye serializar figuras)', ['endpoint'])
+HISTOGRAMS = [SPAN_SECONDS, CALLBACK_SECONDS, REQUEST_SECONDS]
+
+# Funciones que devuelven [(nombre, ayuda, tipo, [(etiquetas, valor)])] al exportar
+_collectors = []
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+    return collector
+
+
+@contextmanager
+def span(name):
+    """Mide la duración de un bloque en dashboard_span_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - start, span=name)
+
+
+def _profile_requested():
+    if METRICS_CONFIG['profile_enabled']:
+        return True
+    # Solo con PROFILE_REQUESTS: si no, cualquier cliente podría llenar el disco de volcados
+    if not METRICS_CONFIG['profile_requests'] or not has_request_context():
+        return False
+    return request.headers.get('X-Profile') == '1' or request.cookies.get('profile') == '1'
+
+
+def _dump_profile(profile, name, seconds):
+    os.makedirs(METRICS_CONFIG['profile_dir'], exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(METRICS_CONFIG['profile_dir'], f"{name}-{stamp}-{os.getpid()}.prof")
+    profile.dump_stats(path)
+    logger.warning(f"⚠️ Callback lento '{name}': {seconds:.2f}s, perfil guardado en {path}")
+
+
+def instrumented(name):
+    """Decorador para callbacks: mide la duración y perfila los lentos si se pide"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile() if _profile_requested() else None
+            start = time.perf_counter()
+            if profile is not None:
+                profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                seconds = time.perf_counter() - start
+                CALLBACK_SECONDS.observe(seconds, callback=name)
+                if not has_request_context():
+                    # Trabajo en segundo plano: el proceso puede salir antes del próximo volcado
+                    flush_metrics()
+                if profile is not None and seconds >= METRICS_CONFIG['profile_threshold']:
+                    try:
+                        _dump_profile(profile, name, seconds)
+                    except OSError as e:
+                        logger.error(f"❌ No se pudo guardar el perfil de '{name}': {str(e)}")
+        return wrapper
+    return decorator
+
+
+def _collect_families():
+    """Familias de los colectores registrados: [(nombre, ayuda, tipo, [(etiquetas, valor)])]"""
+    families = []
+    for collector in _collectors:
+        try:
+            families.extend(collector())
+        except Exception as e:
+            logger.error(f"❌ Error al recoger métricas: {str(e)}")
+    return families
+
+
+def _render_families(families):
+    lines = []
+    for name, documentation, kind, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return lines
+
+
+# Volcado al directorio compartido: un fichero por proceso (pid y un token
+# propio, para no pisar el de un worker anterior que reutilizara el pid)
+_flusher = {'pid': None, 'token': None}
+_flusher_lock = threading.Lock()
+
+
+def _process_file():
+    return os.path.join(METRICS_CONFIG['multiprocess_dir'], f"{os.getpid()}-{_flusher['token']}.json")
+
+
+def flush_metrics():
+    """Escribe el estado de este proceso en METRICS_DIR (escritura atómica)"""
+    if not METRICS_CONFIG['multiprocess_dir'] or _flusher['token'] is None:
+        return
+    state = {
+        'pid': os.getpid(),
+        'histograms': {
+            histogram.name: [[list(key), values] for key, values in histogram.series().items()]
+            for histogram in HISTOGRAMS
+        },
+        'families': _collect_families()
+    }
+    path = _process_file()
+    try:
+        os.makedirs(METRICS_CONFIG['multiprocess_dir'], exist_ok=True)
+        _write_state(path, state)
+    except OSError as e:
+        logger.error(f"❌ No se pudieron volcar las métricas en {path}: {str(e)}")
+
+
+def _flush_loop(pid):
+    while _flusher['pid'] == pid:
+        time.sleep(METRICS_CONFIG['flush_interval'])
+        flush_metrics()
+
+
+def _ensure_flusher():
+    """Arranca (una vez por proceso) el hilo que vuelca las métricas periódicamente"""
+    if not METRICS_CONFIG['multiprocess_dir'] or _flusher['pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['pid'] == os.getpid():
+            return
+        _flusher['pid'] = os.getpid()
+        _flusher['token'] = uuid.uuid4().hex[:8]
+        threading.Thread(target=_flush_loop, args=(os.getpid(),), name='metrics-flush', daemon=True).start()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+AGGREGATE_FILE = 'aggregate.json'
+
+
+def _new_totals():
+    return {histogram.name: {} for histogram in HISTOGRAMS}, {}
+
+
+def _fold(totals, state, alive):
+    """Suma un volcado en los totales; los gauges solo cuentan si el proceso sigue vivo"""
+    histograms, families = totals
+    pid = state.get('pid')
+    for name, entries in state.get('histograms', {}).items():
+        merged = histograms.get(name)
+        if merged is None:
+            continue
+        for key, values in entries:
+            key = tuple(key)
+            total = merged.get(key)
+            if total is None:
+                merged[key] = {'counts': list(values['counts']), 'sum': values['sum'], 'count': values['count']}
+                continue
+            total['counts'] = [a + b for a, b in zip(total['counts'], values['counts'])]
+            total['sum'] += values['sum']
+            total['count'] += values['count']
+    for name, documentation, kind, samples in state.get('families', []):
+        family = families.setdefault(name, (documentation, kind, {}))[2]
+        for labels, value in samples:
+            if kind == 'counter':
+                # Los contadores se suman, también los de procesos terminados
+                key = tuple(sorted(labels.items()))
+                family[key] = family.get(key, 0) + value
+            elif alive:
+                # Los gauges son estado del proceso: solo los vivos, con su pid
+                family[tuple(sorted(labels.items())) + (('pid', str(pid)),)] = value
+
+
+def _dump_totals(totals):
+    """Totales en el formato de un volcado de proceso (sin gauges), para aggregate.json"""
+    histograms, families = totals
+    return {
+        'pid': None,
+        'histograms': {name: [[list(key), values] for key, values in series.items()]
+                       for name, series in histograms.items()},
+        'families': [[name, documentation, kind, [[dict(key), value] for key, value in samples.items()]]
+                     for name, (documentation, kind, samples) in families.items() if kind == 'counter']
+    }
+
+
+def _read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Fichero de métricas ilegible {path}: {str(e)}")
+        return None
+
+
+def _write_state(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _merge_directory(directory):
+    """Totales del directorio; suma en aggregate.json los volcados de procesos terminados y los borra"""
+    aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+    aggregate = _read_state(aggregate_path) or {}
+    # Ficheros ya sumados en el agregado cuyo borrado pudo fallar: no se suman otra vez
+    folded = {name for name in aggregate.get('folded', []) if os.path.exists(os.path.join(directory, name))}
+    stored = _new_totals()
+    _fold(stored, aggregate, alive=False)
+
+    live, dead = [], []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        name = os.path.basename(path)
+        if name == AGGREGATE_FILE:
+            continue
+        state = _read_state(path)
+        if state is None:
+            continue
+        pid = state.get('pid')
+        alive = pid is not None and _process_alive(pid)
+        if not alive and fcntl is not None:
+            if name not in folded:
+                _fold(stored, state, alive=False)
+            dead.append(path)
+        else:
+            live.append((state, alive))
+
+    if dead:
+        state = _dump_totals(stored)
+        state['folded'] = sorted(folded | {os.path.basename(path) for path in dead})
+        _write_state(aggregate_path, state)
+        for path in dead:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"⚠️ No se pudo borrar {path}: {str(e)}")
+
+    totals = _new_totals()
+    _fold(totals, _dump_totals(stored), alive=False)
+    for state, alive in live:
+        _fold(totals, state, alive)
+    return totals
+
+
+def _merge_processes():
+    """Histogramas y familias de todos los procesos que volcaron en METRICS_DIR"""
+    _ensure_flusher()
+    flush_metrics()
+    directory = METRICS_CONFIG['multiprocess_dir']
+    os.makedirs(directory, exist_ok=True)
+    if fcntl is None:
+        histograms, families = _merge_directory(directory)
+    else:
+        # Un solo lector a la vez: otro no debe ver un fichero ya sumado en el agregado y aún sin borrar
+        with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            histograms, families = _merge_directory(directory)
+    return histograms, [
+        (name, documentation, kind, [(dict(key), value) for key, value in sorted(samples.items())])
+        for name, (documentation, kind, samples) in families.items()
+    ]
+
+
+def render_metrics():
+    """Texto en formato de exposición de Prometheus con todas las métricas"""
+    lines = []
+    if METRICS_CONFIG['multiprocess_dir']:
+        histograms, families = _merge_processes()
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.render(histograms[histogram.name]))
+    else:
+        families = _collect_families()
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.render())
+    lines.extend(_render_families(families))
+    return '\n'.join(lines) + '\n'
+
+
+@after_fork
+def _reset_after_fork():
+    """Locks de los histogramas y del volcado al directorio compartido"""
+    global _flusher_lock
+    for histogram in HISTOGRAMS:
+        histogram._lock = threading.Lock()
+        if METRICS_CONFIG['multiprocess_dir']:
+            # Lo heredado ya está en el fichero del padre: no contarlo dos veces
+            histogram._series = {}
+    _flusher_lock = threading.Lock()
+
@@ -0,0 +1,392 @@
+"""Migraciones versionadas del esquema de MySQL.
+
+El esquema de referencia usa la fecha real como clave de `dim_dates`
+(`dim_dates.id DATE` y `facts_matches.date_id DATE`), de modo que el
+dashboard filtra y ordena por `fm.date_id` con índices. Las bases creadas
+con el antiguo init.sql (clave entera más una columna `date`) se
+convierten en la migración 2. Cada migración aplicada se anota en
+`schema_migrations`; el importador aplica las pendientes al arrancar.
+
+Uso:
+    python migrations.py              # aplica las migraciones pendientes
+    python migrations.py --status     # muestra las aplicadas y las pendientes
+    python migrations.py --wait 120   # espera a que MySQL acepte conexiones (arranque en Docker)
+    python migrations.py --partition --drop-foreign-keys
+                                      # además, particiona facts_matches por temporada
+"""
+import os
+import argparse
+from datetime import date
+from rollups import ROLLUP_TABLES
+from ratings import RATINGS_TABLE
+from import_pipeline import CHECKPOINT_TABLES
+
+# Segundos que se espera a MySQL antes de rendirse (el contenedor web arranca junto a la base)
+DB_WAIT_SECONDS = int(os.getenv('DB_WAIT_SECONDS', '60'))
+DB_WAIT_INTERVAL = 2
+
+# Primer mes de cada temporada para el particionado opcional (julio en las ligas europeas)
+SEASON_START_MONTH = int(os.getenv('SEASON_START_MONTH', '7'))
+
+MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+BASELINE_TABLES = {
+    'dim_competitions': """
+        CREATE TABLE IF NOT EXISTS dim_competitions (
+            id INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            code VARCHAR(10),
+            area_name VARCHAR(100)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'dim_teams': """
+        CREATE TABLE IF NOT EXISTS dim_teams (
+            id INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            short_name VARCHAR(50),
+            tla VARCHAR(10),
+            crest_url VARCHAR(255)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'dim_dates': """
+        CREATE TABLE IF NOT EXISTS dim_dates (
+            id DATE PRIMARY KEY,
+            day INT,
+            month INT,
+            year INT,
+            day_of_week INT,
+            is_weekend BOOLEAN
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'dim_match_stats': """
+        CREATE TABLE IF NOT EXISTS dim_match_stats (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            possession_home FLOAT,
+            shots_home INT,
+            shots_on_target_home INT,
+            shots_away INT,
+            shots_on_target_away INT,
+            corners_home INT,
+            corners_away INT,
+            fouls_home INT,
+            fouls_away INT
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'facts_matches': """
+        CREATE TABLE IF NOT EXISTS facts_matches (
+            id INT PRIMARY KEY,
+            home_team_id INT,
+            away_team_id INT,
+            competition_id INT,
+            date_id DATE,
+            stats_id INT,
+            home_score INT,
+            away_score INT,
+            status VARCHAR(20),
+            stage VARCHAR(50),
+            FOREIGN KEY (home_team_id) REFERENCES dim_teams(id),
+            FOREIGN KEY (away_team_id) REFERENCES dim_teams(id),
+            FOREIGN KEY (competition_id) REFERENCES dim_competitions(id),
+            FOREIGN KEY (date_id) REFERENCES dim_dates(id),
+            FOREIGN KEY (stats_id) REFERENCES dim_match_stats(id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'import_state': """
+        CREATE TABLE IF NOT EXISTS import_state (
+            competition_id INT PRIMARY KEY,
+            last_updated DATETIME,
+            last_finished_date DATE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'meta_data_version': """
+        CREATE TABLE IF NOT EXISTS meta_data_version (
+            id INT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """
+}
+
+# Columnas que faltan en las bases creadas con el antiguo init.sql
+MISSING_COLUMNS = {
+    'dim_competitions': [('code', 'VARCHAR(10)'), ('area_name', 'VARCHAR(100)')],
+    'dim_teams': [('short_name', 'VARCHAR(50)'), ('tla', 'VARCHAR(10)'), ('crest_url', 'VARCHAR(255)')],
+    'dim_match_stats': [('shots_home', 'INT'), ('shots_away', 'INT'), ('corners_home', 'INT'),
+                        ('corners_away', 'INT'), ('fouls_home', 'INT'), ('fouls_away', 'INT')],
+    'facts_matches': [('status', 'VARCHAR(20)'), ('stage', 'VARCHAR(50)')]
+}
+
+# Índices para los patrones de acceso del dashboard
+DASHBOARD_INDEXES = {
+    # Rango de fechas (con o sin competición): cubre todas las columnas que lee la consulta de partidos
+    'idx_fm_date_cover': "(date_id, competition_id, home_team_id, away_team_id, home_score, away_score, stats_id)",
+    # Competiciones seleccionadas + rango de fechas
+    'idx_fm_competition_date': "(competition_id, date_id)",
+    # Equipo + rango de fechas (local OR visitante se resuelve con index merge)
+    'idx_fm_home_team_date': "(home_team_id, date_id)",
+    'idx_fm_away_team_date': "(away_team_id, date_id)"
+}
+
+
+# Consultas al catálogo (información del esquema actual)
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _foreign_keys(cursor, table, referenced_table=None):
+    query = (
+        "SELECT DISTINCT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL"
+    )
+    params = [table]
+    if referenced_table:
+        query += " AND REFERENCED_TABLE_NAME = %s"
+        params.append(referenced_table)
+    cursor.execute(query, params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _partitions(cursor, table):
+    cursor.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+# Migraciones
+def _baseline(cursor):
+    """Tablas del esquema estrella, estado del importador, versión de datos y resúmenes"""
+    for table_sql in list(BASELINE_TABLES.values()) + list(ROLLUP_TABLES.values()):
+        cursor.execute(table_sql)
+    cursor.execute("INSERT IGNORE INTO meta_data_version (id, version) VALUES (1, 0)")
+
+
+def _date_key(cursor):
+    """Convierte dim_dates con clave entera (antiguo init.sql) a clave DATE"""
+    if not _column_exists(cursor, 'dim_dates', 'date'):
+        if not _column_exists(cursor, 'dim_dates', 'is_weekend'):
+            cursor.execute("ALTER TABLE dim_dates ADD COLUMN is_weekend BOOLEAN")
+            cursor.execute("UPDATE dim_dates SET is_weekend = WEEKDAY(id) >= 5")
+        return
+    for constraint in _foreign_keys(cursor, 'facts_matches', 'dim_dates'):
+        cursor.execute(f"ALTER TABLE facts_matches DROP FOREIGN KEY {constraint}")
+    cursor.execute("DROP TABLE IF EXISTS dim_dates_new")
+    cursor.execute(BASELINE_TABLES['dim_dates'].replace('dim_dates', 'dim_dates_new', 1))
+    cursor.execute(
+        "INSERT IGNORE INTO dim_dates_new (id, day, month, year, day_of_week, is_weekend) "
+        "SELECT date, DAY(date), MONTH(date), YEAR(date), WEEKDAY(date) + 1, WEEKDAY(date) >= 5 FROM dim_dates"
+    )
+    cursor.execute("ALTER TABLE facts_matches ADD COLUMN match_day DATE NULL")
+    cursor.execute("UPDATE facts_matches fm JOIN dim_dates d ON fm.date_id = d.id SET fm.match_day = d.date")
+    cursor.execute("ALTER TABLE facts_matches DROP COLUMN date_id")
+    cursor.execute("ALTER TABLE facts_matches CHANGE match_day date_id DATE NULL AFTER competition_id")
+    cursor.execute("RENAME TABLE dim_dates TO dim_dates_legacy, dim_dates_new TO dim_dates")
+    cursor.execute("DROP TABLE dim_dates_legacy")
+    cursor.execute(
+        "ALTER TABLE facts_matches ADD CONSTRAINT fk_facts_matches_date "
+        "FOREIGN KEY (date_id) REFERENCES dim_dates(id)"
+    )
+
+
+def _missing_columns(cursor):
+    """Añade las columnas del importador que no existían en el antiguo init.sql"""
+    for table, columns in MISSING_COLUMNS.items():
+        for column, definition in columns:
+            if not _column_exists(cursor, table, column):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    cursor.execute("ALTER TABLE dim_match_stats MODIFY possession_home FLOAT")
+
+
+def _dashboard_indexes(cursor):
+    """Índices compuestos de facts_matches (MySQL descarta los índices implícitos de las FK que quedan cubiertos)"""
+    for index, columns in DASHBOARD_INDEXES.items():
+        if not _index_exists(cursor, 'facts_matches', index):
+            cursor.execute(f"CREATE INDEX {index} ON facts_matches {columns}")
+
+
+def _team_ratings(cursor):
+    """Ratings Elo y PageRank por equipo y día (ratings.py)"""
+    cursor.execute(RATINGS_TABLE)
+
+
+def _import_checkpoints(cursor):
+    """Corridas del importador y puntos de control por página (import_pipeline.py)"""
+    for table_sql in CHECKPOINT_TABLES.values():
+        cursor.execute(table_sql)
+
+
+# (versión, nombre, función) en orden de aplicación; no reordenar ni renumerar
+MIGRATIONS = [
+    (1, 'baseline', _baseline),
+    (2, 'dim_dates_date_key', _date_key),
+    (3, 'importer_columns', _missing_columns),
+    (4, 'dashboard_indexes', _dashboard_indexes),
+    (5, 'team_ratings', _team_ratings),
+    (6, 'import_checkpoints', _import_checkpoints)
+]
+
+
+def applied_migrations(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(MIGRATIONS_TABLE)
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def migrate(conn, target=None):
+    """Aplica en orden las migraciones pendientes hasta `target` (todas por defecto).
+
+    MySQL confirma implícitamente cada DDL, así que una migración no se
+    deshace si falla a medias: la versión se anota solo cuando termina y
+    conviene revisar el esquema antes de volver a lanzarla.
+    """
+    applied = applied_migrations(conn)
+    pending = [m for m in MIGRATIONS if m[0] not in applied and (target is None or m[0] <= target)]
+    cursor = conn.cursor()
+    try:
+        for version, name, upgrade in pending:
+            upgrade(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            print(f"✅ Migración {version:04d} aplicada: {name}")
+    except Exception as err:
+        print(f"❌ Error en la migración: {err}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    if not pending:
+        print("✅ Esquema al día")
+    return [version for version, _, _ in pending]
+
+
+def season_start(year):
+    return date(year, SEASON_START_MONTH, 1)
+
+
+def _season_partition(year):
+    return f"PARTITION s{year} VALUES LESS THAN ('{season_start(year + 1).isoformat()}')"
+
+
+def partition_facts_by_season(conn, seasons_ahead=1, drop_foreign_keys=False):
+    """Particiona facts_matches por rango de temporada (opcional).
+
+    MySQL exige que la columna de partición forme parte de la clave
+    primaria y no admite claves foráneas en tablas particionadas, así que
+    la PK pasa a ser (id, date_id) y hay que eliminar las FK de facts_matches
+    (la integridad pasa a garantizarla el importador, que carga las
+    dimensiones antes que los hechos). Como es un cambio de garantías, solo
+    se hace con `drop_foreign_keys=True`; sin él, se aborta sin tocar nada.
+    Si la tabla ya está particionada, divide la partición `pfuture` para
+    añadir las temporadas que falten.
+    """
+    cursor = conn.cursor()
+    try:
+        today = date.today()
+        current = today.year if today >= season_start(today.year) else today.year - 1
+        last = current + seasons_ahead
+        existing = _partitions(cursor, 'facts_matches')
+        if existing:
+            known = {int(name[1:]) for name in existing if name.startswith('s')}
+            new = [year for year in range(max(known) + 1, last + 1)] if known else []
+            if new:
+                cursor.execute(
+                    "ALTER TABLE facts_matches REORGANIZE PARTITION pfuture INTO ("
+                    + ", ".join(_season_partition(year) for year in new)
+                    + ", PARTITION pfuture VALUES LESS THAN (MAXVALUE))"
+                )
+            print(f"✅ facts_matches particionada; temporadas nuevas: {new or 'ninguna'}")
+            return new
+
+        foreign_keys = _foreign_keys(cursor, 'facts_matches')
+        if foreign_keys and not drop_foreign_keys:
+            print(f"❌ facts_matches tiene claves foráneas ({', '.join(foreign_keys)}) y MySQL no las admite "
+                  "en tablas particionadas; repite con --drop-foreign-keys para eliminarlas")
+            raise RuntimeError("El particionado necesita eliminar las claves foráneas de facts_matches")
+        cursor.execute("SELECT MIN(date_id) FROM facts_matches")
+        first_date = cursor.fetchone()[0] or today
+        first = first_date.year if first_date >= season_start(first_date.year) else first_date.year - 1
+        for constraint in foreign_keys:
+            print(f"⚠️ Eliminando la clave foránea {constraint} de facts_matches: "
+                  "la integridad referencial queda a cargo del importador")
+            cursor.execute(f"ALTER TABLE facts_matches DROP FOREIGN KEY {constraint}")
+        cursor.execute("DELETE FROM facts_matches WHERE date_id IS NULL")
+        cursor.execute(
+            "ALTER TABLE facts_matches MODIFY date_id DATE NOT NULL, "
+            "DROP PRIMARY KEY, ADD PRIMARY KEY (id, date_id)"
+        )
+        seasons = list(range(first, last + 1))
+        cursor.execute(
+            "ALTER TABLE facts_matches PARTITION BY RANGE COLUMNS (date_id) ("
+            + ", ".join(_season_partition(year) for year in seasons)
+            + ", PARTITION pfuture VALUES LESS THAN (MAXVALUE))"
+        )
+        conn.commit()
+        print(f"✅ facts_matches particionada por temporada: {seasons[0]}-{seasons[-1]}")
+        return seasons
+    finally:
+        cursor.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de la base de datos")
+    parser.add_argument('--status', action='store_true', help="Mostrar las migraciones aplicadas y pendientes")
+    parser.add_argument('--target', type=int, help="Aplicar solo hasta esta versión")
+    parser.add_argument('--partition', action='store_true',
+                        help="Particionar facts_matches por temporada (o añadir las temporadas nuevas)")
+    parser.add_argument('--drop-foreign-keys', action='store_true',
+                        help="Permitir que --partition elimine las claves foráneas de facts_matches")
+    parser.add_argument('--wait', type=int, default=DB_WAIT_SECONDS,
+                        help="Segundos de espera a que la base de datos acepte conexiones")
+    return parser.parse_args()
+
+
+def main():
+    # Misma conexión que el importador (mysql-connector, parámetros %s)
+    from import_data import connect_db
+
+    args = parse_args()
+    # Al arrancar con docker compose MySQL puede tardar en aceptar conexiones
+    conn = connect_db(max_retries=max(1, args.wait // DB_WAIT_INTERVAL), retry_delay=DB_WAIT_INTERVAL)
+    try:
+        if args.status:
+            applied = applied_migrations(conn)
+            for version, name, _ in MIGRATIONS:
+                print(f"{'✅' if version in applied else '⏳'} {version:04d} {name}")
+            return
+        migrate(conn, args.target)
+        if args.partition:
+            partition_facts_by_season(conn, drop_foreign_keys=args.drop_foreign_keys)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
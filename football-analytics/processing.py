@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Etiquetas de resultado desde el punto de vista del equipo local
+RESULT_LABELS = ('Local', 'Visitante', 'Empate')
+RESULT_DTYPE = pd.CategoricalDtype(list(RESULT_LABELS))
+
+# Tipos compactos por columna; si hay nulos se usa float32 en lugar del entero
+COMPACT_DTYPES = {
+    'home_score': 'int8',
+    'away_score': 'int8',
+    'shots_on_target_home': 'int16',
+    'shots_on_target_away': 'int16',
+    'possession_home': 'float32'
+}
+
+# Columnas derivadas: no se guardan, se calculan al pedirlas
+DERIVED_COLUMNS = {
+    'total_goals': lambda df: df['home_score'].astype('int16') + df['away_score'],
+    'possession_away': lambda df: 100 - df['possession_home']
+}
+
+
+def classify_results(home_score, away_score):
+    """Clasifica cada partido como victoria local, visitante o empate (vectorizado)"""
+    home_score = np.asarray(home_score)
+    away_score = np.asarray(away_score)
+    return np.select(
+        [home_score > away_score, home_score < away_score],
+        [RESULT_LABELS[0], RESULT_LABELS[1]],
+        default=RESULT_LABELS[2]
+    )
+
+
+def _shared_categories(*columns):
+    """Diccionario común (ordenado) para varias columnas de texto"""
+    names = pd.Index([])
+    for column in columns:
+        names = names.union(pd.Index(column.dropna().unique().astype(str)))
+    return pd.CategoricalDtype(names)
+
+
+def compact_match_data(df):
+    """Convierte el DataFrame de partidos a tipos compactos.
+
+    Local y visitante comparten un mismo diccionario de equipos, así que
+    los códigos son comparables entre columnas; los marcadores pasan a
+    int8, las estadísticas a int16 y el resultado a categoría.
+    """
+    if df.empty:
+        return df
+    teams = _shared_categories(df['home_team'], df['away_team'])
+    df['home_team'] = df['home_team'].astype(teams)
+    df['away_team'] = df['away_team'].astype(teams)
+    if 'competition' in df.columns:
+        df['competition'] = df['competition'].astype('category')
+    for name, dtype in COMPACT_DTYPES.items():
+        if name in df.columns:
+            column = df[name]
+            df[name] = column.astype(dtype if column.notna().all() else 'float32')
+    if 'result' in df.columns:
+        df['result'] = df['result'].astype(RESULT_DTYPE)
+    return df
+
+
+def derived_column(df, name):
+    """Calcula una columna derivada (p. ej. 'total_goals') sin añadirla al DataFrame"""
+    return DERIVED_COLUMNS[name](df)
+
+
+def with_derived(df, *names):
+    """Copia ligera del DataFrame con las columnas derivadas indicadas"""
+    return df.assign(**{name: DERIVED_COLUMNS[name] for name in names})
+
+
+def process_match_data(df):
+    """Añade el resultado y deja el DataFrame en el esquema compacto del dashboard"""
+    if df.empty:
+        return df
+    df['match_date'] = pd.to_datetime(df['match_date'])
+    df['result'] = pd.Categorical(classify_results(df['home_score'], df['away_score']), dtype=RESULT_DTYPE)
+    return compact_match_data(df)
@@ -0,0 +1,252 @@
+import re
+import json
+import hashlib
+from datetime import date
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+# Fecha del partido: la clave DATE de dim_dates, que se puede filtrar y ordenar con índices
+MATCH_DATE_EXPR = "fm.date_id"
+
+# Joins del esquema estrella compartidos por todas las consultas de partidos
+MATCH_FROM = """
+    FROM facts_matches fm
+    JOIN dim_teams ht ON fm.home_team_id = ht.id
+    JOIN dim_teams at ON fm.away_team_id = at.id
+    JOIN dim_match_stats ms ON fm.stats_id = ms.id
+    JOIN dim_competitions c ON fm.competition_id = c.id
+"""
+
+# Orden por defecto: más recientes primero (recorre idx_fm_date_cover hacia atrás)
+MATCH_ORDER = "fm.date_id DESC, fm.id DESC"
+
+# Consulta base del dashboard (esquema estrella)
+MATCH_SELECT = f"""
+    SELECT
+        ht.name as home_team,
+        at.name as away_team,
+        fm.home_score,
+        fm.away_score,
+        ms.possession_home,
+        ms.shots_on_target_home,
+        ms.shots_on_target_away,
+        {MATCH_DATE_EXPR} AS match_date,
+        c.name as competition
+    {MATCH_FROM}
+"""
+
+# Columnas de la tabla de detalle y su expresión SQL (lista blanca para ordenar y filtrar)
+TABLE_COLUMNS = {
+    'match_date': MATCH_DATE_EXPR,
+    'competition': "c.name",
+    'home_team': "ht.name",
+    'away_team': "at.name",
+    'home_score': "fm.home_score",
+    'away_score': "fm.away_score",
+    'result': (
+        "CASE WHEN fm.home_score > fm.away_score THEN 'Local' "
+        "WHEN fm.home_score < fm.away_score THEN 'Visitante' ELSE 'Empate' END"
+    ),
+    'total_goals': "(fm.home_score + fm.away_score)",
+    'possession_home': "ms.possession_home",
+    'possession_away': "(100 - ms.possession_home)",
+    'shots_on_target_home': "ms.shots_on_target_home",
+    'shots_on_target_away': "ms.shots_on_target_away"
+}
+
+# Operadores de filter_query de DataTable (palabra o símbolo) -> operador canónico
+FILTER_OPERATORS = {
+    'ge': 'ge', '>=': 'ge', 'le': 'le', '<=': 'le', 'lt': 'lt', '<': 'lt', 'gt': 'gt', '>': 'gt',
+    'ne': 'ne', '!=': 'ne', 'eq': 'eq', '=': 'eq', 'contains': 'contains', 'datestartswith': 'datestartswith'
+}
+FILTER_OPERATORS_SQL = {'ge': '>=', 'le': '<=', 'lt': '<', 'gt': '>', 'ne': '!=', 'eq': '='}
+# "{columna} operador valor": el operador es el token que sigue a la columna
+FILTER_PART_PATTERN = re.compile(r"^\s*\{(?P<name>[^}]*)\}\s*(?P<operator>[a-z]+|[<>!]=|[<>=])\s*(?P<value>.*?)\s*$")
+
+# Conjunto completo para la instantánea en disco: incluye los ids para poder
+# aplicar los filtros del dashboard en memoria
+SNAPSHOT_QUERY = text(f"""
+    SELECT
+        ht.name as home_team,
+        at.name as away_team,
+        fm.home_score,
+        fm.away_score,
+        ms.possession_home,
+        ms.shots_on_target_home,
+        ms.shots_on_target_away,
+        {MATCH_DATE_EXPR} AS match_date,
+        c.name as competition,
+        fm.home_team_id,
+        fm.away_team_id,
+        fm.competition_id
+    {MATCH_FROM}
+    WHERE fm.home_score IS NOT NULL
+    ORDER BY {MATCH_ORDER}
+""")
+
+
+def to_date_key(value):
+    """Convierte una fecha del DatePickerRange a la clave AAAAMMDD"""
+    timestamp = pd.to_datetime(value)
+    return timestamp.year * 10000 + timestamp.month * 100 + timestamp.day
+
+
+def key_to_date(key):
+    """Convierte la clave AAAAMMDD en la fecha con la que se compara fm.date_id"""
+    return date(key // 10000, key // 100 % 100, key % 100)
+
+
+def normalize_filters(start_date=None, end_date=None, competition_ids=None, team_ids=None):
+    """Normaliza los filtros para usarlos como parámetros y como clave de caché"""
+    return (
+        to_date_key(start_date) if start_date else None,
+        to_date_key(end_date) if end_date else None,
+        tuple(sorted(int(c) for c in competition_ids)) if competition_ids else (),
+        tuple(sorted(int(t) for t in team_ids)) if team_ids else ()
+    )
+
+
+def filters_from_store(filters):
+    """Reconstruye la tupla de filtros serializada en el dcc.Store"""
+    start_key, end_key, competition_ids, team_ids = filters
+    return start_key, end_key, tuple(competition_ids), tuple(team_ids)
+
+
+def filter_hash(filters):
+    """Hash estable de los filtros normalizados"""
+    return hashlib.sha1(json.dumps(filters).encode('utf-8')).hexdigest()
+
+
+def build_where(start_key=None, end_key=None, competition_ids=(), team_ids=()):
+    """Construye las condiciones WHERE y sus parámetros enlazados"""
+    conditions = ["fm.home_score IS NOT NULL"]
+    params = {}
+    expanding = []
+
+    # Comparaciones directas sobre la columna (sargables): usan los índices por fecha
+    if start_key is not None:
+        conditions.append("fm.date_id >= :start_date")
+        params['start_date'] = key_to_date(start_key)
+    if end_key is not None:
+        conditions.append("fm.date_id <= :end_date")
+        params['end_date'] = key_to_date(end_key)
+    if competition_ids:
+        conditions.append("fm.competition_id IN :competition_ids")
+        params['competition_ids'] = list(competition_ids)
+        expanding.append('competition_ids')
+    if team_ids:
+        conditions.append("(fm.home_team_id IN :home_team_ids OR fm.away_team_id IN :away_team_ids)")
+        params['home_team_ids'] = list(team_ids)
+        params['away_team_ids'] = list(team_ids)
+        expanding.extend(['home_team_ids', 'away_team_ids'])
+
+    return " AND ".join(conditions), params, expanding
+
+
+def build_match_query(start_key=None, end_key=None, competition_ids=(), team_ids=()):
+    """Consulta parametrizada de partidos filtrada en la base de datos"""
+    where, params, expanding = build_where(start_key, end_key, competition_ids, team_ids)
+    query = text(f"""
+        {MATCH_SELECT}
+        WHERE {where}
+        ORDER BY {MATCH_ORDER}
+    """)
+    if expanding:
+        query = query.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return query, params
+
+
+def split_filter_part(filter_part):
+    """Separa una condición de filter_query en (columna, operador, valor).
+
+    Los valores sin comillas solo se convierten a número con los operadores
+    relacionales; `contains` y `datestartswith` comparan el texto tal cual.
+    """
+    match = FILTER_PART_PATTERN.match(filter_part)
+    operator = FILTER_OPERATORS.get(match.group('operator')) if match else None
+    if operator is None:
+        return None, None, None
+    value = match.group('value')
+    v0 = value[0] if value else ''
+    if len(value) > 1 and v0 == value[-1] and v0 in ("'", '"', '`'):
+        value = value[1:-1].replace('\\' + v0, v0)
+    elif operator in FILTER_OPERATORS_SQL:
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    return match.group('name'), operator, value
+
+
+def build_table_filters(filter_query):
+    """Traduce el filter_query de la tabla a condiciones SQL parametrizadas"""
+    conditions = []
+    params = {}
+    if not filter_query:
+        return conditions, params
+    for i, part in enumerate(filter_query.split(' && ')):
+        column, operator, value = split_filter_part(part)
+        expr = TABLE_COLUMNS.get(column)
+        if expr is None or operator is None:
+            continue
+        name = f"tf_{i}"
+        if operator == 'contains':
+            conditions.append(f"{expr} LIKE :{name}")
+            params[name] = f"%{value}%"
+        elif operator == 'datestartswith':
+            conditions.append(f"{expr} LIKE :{name}")
+            params[name] = f"{value}%"
+        else:
+            conditions.append(f"{expr} {FILTER_OPERATORS_SQL[operator]} :{name}")
+            params[name] = value
+    return conditions, params
+
+
+
+def build_page_query(filters, page_current=0, page_size=10, sort_by=None, filter_query=None):
+    """Consulta de una página de la tabla y consulta de conteo total.
+
+    El orden, los filtros por columna y la paginación se resuelven en SQL,
+    de modo que al navegador solo viaja `page_size` filas.
+    """
+    where, params, expanding = build_where(*filters)
+    table_conditions, table_params = build_table_filters(filter_query)
+    if table_conditions:
+        where = " AND ".join([where] + table_conditions)
+        params.update(table_params)
+
+    order_by = []
+    for sort in sort_by or []:
+        expr = TABLE_COLUMNS.get(sort.get('column_id'))
+        if expr is not None:
+            order_by.append(f"{expr} {'ASC' if sort.get('direction') == 'asc' else 'DESC'}")
+    # Desempate estable por la clave primaria para que las páginas no se solapen
+    order_by.append(MATCH_ORDER)
+
+    columns = ",\n        ".join(f"{expr} AS {name}" for name, expr in TABLE_COLUMNS.items())
+    page_query = text(f"""
+        SELECT
+        {columns}
+        {MATCH_FROM}
+        WHERE {where}
+        ORDER BY {", ".join(order_by)}
+        LIMIT :page_limit OFFSET :page_offset
+    """)
+    count_query = text(f"""
+        SELECT COUNT(*)
+        {MATCH_FROM}
+        WHERE {where}
+    """)
+    if expanding:
+        expanding_params = [bindparam(name, expanding=True) for name in expanding]
+        page_query = page_query.bindparams(*expanding_params)
+        count_query = count_query.bindparams(*expanding_params)
+
+    page_params = dict(params, page_limit=int(page_size), page_offset=int(page_current) * int(page_size))
+    return (page_query, page_params), (count_query, params)
+
+
+FILTER_OPTIONS_QUERIES = {
+    'competitions': text("SELECT id, name FROM dim_competitions ORDER BY name"),
+    'teams': text("SELECT id, name FROM dim_teams ORDER BY name")
+}
@@ -0,0 +1,396 @@
+"""Ratings de equipos (Elo y PageRank) calculados sobre el flujo de partidos.
+
+Elo se actualiza partido a partido, en orden de fecha e id. PageRank se
+calcula sobre el grafo acumulado de victorias (perdedor -> ganador,
+ponderado por número de victorias) al cerrar cada día con partidos,
+partiendo del vector del día anterior, así que converge en pocas
+iteraciones. Tras cada día se guarda en `team_ratings` una fila por cada
+equipo cuyo rating cambió: los que jugaron ese día y los que no, pero
+cuyo PageRank se movió más de PAGERANK_STORE_TOLERANCE (relativo) desde su
+última fila. El ranking "a fecha" de cualquier día es la última fila de
+cada equipo anterior o igual a esa fecha, sin recalcular la historia, y
+la tabla crece con los partidos en lugar de con días × equipos.
+
+El importador llama a `update_ratings` con el primer día que ha cambiado:
+se parte del estado guardado hasta el día anterior y se reproducen solo
+los partidos posteriores.
+
+Uso:
+    python ratings.py            # recalcula desde el último día guardado
+    python ratings.py --rebuild  # recalcula toda la historia
+"""
+import os
+import time
+import argparse
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
+from sqlalchemy import text, bindparam
+from queries import build_where, key_to_date
+
+RATINGS_CONFIG = {
+    'initial': float(os.getenv('ELO_INITIAL', '1500')),
+    'k_factor': float(os.getenv('ELO_K_FACTOR', '20')),
+    'home_advantage': float(os.getenv('ELO_HOME_ADVANTAGE', '65')),
+    'damping': float(os.getenv('PAGERANK_DAMPING', '0.85')),
+    'tolerance': float(os.getenv('PAGERANK_TOLERANCE', '1e-6')),
+    'max_iterations': int(os.getenv('PAGERANK_MAX_ITERATIONS', '100')),
+    # Cambio relativo de PageRank a partir del cual se guarda fila de un equipo que no jugó
+    'pagerank_store_tolerance': float(os.getenv('PAGERANK_STORE_TOLERANCE', '0.01')),
+    # Partidos leídos por consulta al reproducir la historia y filas por INSERT
+    'chunk_size': int(os.getenv('RATINGS_CHUNK_SIZE', '20000')),
+    'batch_size': int(os.getenv('IMPORT_BATCH_SIZE', '1000')),
+    'top_n': int(os.getenv('RATINGS_TOP_N', '20'))
+}
+
+RATINGS_TABLE = """
+    CREATE TABLE IF NOT EXISTS team_ratings (
+        date_id DATE NOT NULL,
+        team_id INT NOT NULL,
+        elo DOUBLE NOT NULL,
+        pagerank DOUBLE NOT NULL,
+        matches INT NOT NULL,
+        PRIMARY KEY (date_id, team_id),
+        KEY idx_team_ratings_team (team_id, date_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Menor fecha que admite el tipo DATE de MySQL: "antes de cualquier partido"
+FIRST_DATE = date(1000, 1, 1)
+
+# Mantenimiento (conexión DB-API del importador, parámetros %s)
+_REPLAY_QUERY = """
+    SELECT date_id, home_team_id, away_team_id, home_score, away_score
+    FROM facts_matches
+    WHERE home_score IS NOT NULL AND away_score IS NOT NULL AND date_id > %s
+    ORDER BY date_id, id
+    LIMIT %s
+"""
+
+_REPLAY_DAY_QUERY = """
+    SELECT date_id, home_team_id, away_team_id, home_score, away_score
+    FROM facts_matches
+    WHERE home_score IS NOT NULL AND away_score IS NOT NULL AND date_id = %s
+    ORDER BY id
+"""
+
+# Última fila de cada equipo hasta una fecha (el estado desde el que se reanuda)
+_LATEST_RATINGS_QUERY = """
+    SELECT r.team_id, r.elo, r.pagerank, r.matches
+    FROM team_ratings r
+    JOIN (SELECT team_id, MAX(date_id) AS date_id FROM team_ratings WHERE date_id <= %s GROUP BY team_id) latest
+      ON latest.team_id = r.team_id AND latest.date_id = r.date_id
+"""
+
+# Grafo de victorias acumulado hasta una fecha, agregado en SQL
+_WIN_EDGES_QUERY = """
+    SELECT CASE WHEN home_score > away_score THEN away_team_id ELSE home_team_id END AS loser_id,
+           CASE WHEN home_score > away_score THEN home_team_id ELSE away_team_id END AS winner_id,
+           COUNT(*)
+    FROM facts_matches
+    WHERE home_score IS NOT NULL AND away_score IS NOT NULL AND home_score <> away_score AND date_id <= %s
+    GROUP BY loser_id, winner_id
+"""
+
+
+def goal_multiplier(goal_diff):
+    """Multiplicador del World Football Elo según la diferencia de goles"""
+    margin = abs(goal_diff)
+    if margin <= 1:
+        return 1.0
+    if margin == 2:
+        return 1.5
+    return (11 + margin) / 8
+
+
+class RatingEngine:
+    """Estado de los ratings tras el último día procesado"""
+
+    def __init__(self, config=None):
+        self.config = config or RATINGS_CONFIG
+        self.index = {}
+        self.team_ids = []
+        self.elo = []
+        self.matches = []
+        self.pagerank = np.zeros(0)
+        # Partidos y PageRank de la última fila guardada de cada equipo (por posición)
+        self._stored = {}
+        # Aristas perdedor -> ganador en arrays que crecen por duplicación
+        self._edge_slots = {}
+        self._sources = np.zeros(64, dtype=np.int64)
+        self._targets = np.zeros(64, dtype=np.int64)
+        self._weights = np.zeros(64)
+
+    def _team(self, team_id, elo=None, matches=0):
+        position = self.index.get(team_id)
+        if position is None:
+            position = self.index[team_id] = len(self.team_ids)
+            self.team_ids.append(team_id)
+            self.elo.append(self.config['initial'] if elo is None else elo)
+            self.matches.append(matches)
+        return position
+
+    def _add_win(self, loser, winner, count=1):
+        slot = self._edge_slots.get((loser, winner))
+        if slot is None:
+            slot = self._edge_slots[(loser, winner)] = len(self._edge_slots)
+            if slot == len(self._weights):
+                self._sources = np.concatenate([self._sources, np.zeros_like(self._sources)])
+                self._targets = np.concatenate([self._targets, np.zeros_like(self._targets)])
+                self._weights = np.concatenate([self._weights, np.zeros_like(self._weights)])
+            self._sources[slot] = loser
+            self._targets[slot] = winner
+        self._weights[slot] += count
+
+    def load_state(self, ratings, win_edges):
+        """Restaura el estado a partir de filas (team_id, elo, pagerank, matches) y (perdedor, ganador, victorias)"""
+        pagerank = {}
+        for team_id, elo, rank, matches in ratings:
+            position = self._team(team_id, float(elo), int(matches))
+            pagerank[position] = float(rank)
+            self._stored[position] = (int(matches), float(rank))
+        for loser_id, winner_id, wins in win_edges:
+            self._add_win(self._team(loser_id), self._team(winner_id), int(wins))
+        self.pagerank = np.zeros(len(self.team_ids))
+        for position, rank in pagerank.items():
+            self.pagerank[position] = rank
+
+    def play(self, home_id, away_id, home_score, away_score):
+        """Actualiza Elo y el grafo de victorias con un partido terminado"""
+        home, away = self._team(home_id), self._team(away_id)
+        diff = self.elo[home] + self.config['home_advantage'] - self.elo[away]
+        expected_home = 1 / (1 + 10 ** (-diff / 400))
+        goal_diff = home_score - away_score
+        result_home = 1.0 if goal_diff > 0 else 0.0 if goal_diff < 0 else 0.5
+        delta = self.config['k_factor'] * goal_multiplier(goal_diff) * (result_home - expected_home)
+        self.elo[home] += delta
+        self.elo[away] -= delta
+        self.matches[home] += 1
+        self.matches[away] += 1
+        if goal_diff > 0:
+            self._add_win(away, home)
+        elif goal_diff < 0:
+            self._add_win(home, away)
+
+    def update_pagerank(self):
+        """PageRank ponderado sobre los equipos con partidos, arrancando del vector anterior.
+
+        Mismo modelo que networkx.pagerank: los equipos sin derrotas
+        (nodos sin aristas salientes) reparten su peso como el salto
+        aleatorio, que solo va a equipos que ya han jugado.
+        """
+        n = len(self.team_ids)
+        n_edges = len(self._edge_slots)
+        sources, targets = self._sources[:n_edges], self._targets[:n_edges]
+        weights = self._weights[:n_edges]
+        active = np.asarray(self.matches) > 0
+        n_active = int(active.sum())
+        if n_active == 0:
+            self.pagerank = np.zeros(n)
+            return 0
+        teleport = active / n_active
+        out_weight = np.bincount(sources, weights=weights, minlength=n)
+        share = weights / out_weight[sources]
+        dangling = active & (out_weight == 0)
+
+        # Arranque en caliente: los equipos nuevos entran con el peso uniforme
+        x = np.zeros(n)
+        x[:len(self.pagerank)] = self.pagerank
+        x[active & (x == 0)] = 1 / n_active
+        x[~active] = 0
+        x /= x.sum()
+
+        alpha = self.config['damping']
+        for iteration in range(1, self.config['max_iterations'] + 1):
+            previous = x
+            x = alpha * (np.bincount(targets, weights=share * previous[sources], minlength=n)
+                         + previous[dangling].sum() * teleport) + (1 - alpha) * teleport
+            if np.abs(x - previous).sum() < n_active * self.config['tolerance']:
+                break
+        self.pagerank = x
+        return iteration
+
+    def rows(self, day):
+        """Filas de team_ratings al cierre de `day` para los equipos cuyo rating cambió.
+
+        Elo y partidos solo cambian al jugar; el PageRank de un equipo que no
+        jugó se guarda si se alejó de su última fila más de la tolerancia.
+        """
+        tolerance = self.config['pagerank_store_tolerance']
+        rows = []
+        for i, team_id in enumerate(self.team_ids):
+            if self.matches[i] == 0:
+                continue
+            rank = float(self.pagerank[i])
+            stored = self._stored.get(i)
+            if stored is not None and stored[0] == self.matches[i] and abs(rank - stored[1]) <= tolerance * stored[1]:
+                continue
+            self._stored[i] = (self.matches[i], rank)
+            rows.append((day, team_id, self.elo[i], rank, self.matches[i]))
+        return rows
+
+
+def _replay_days(cursor, after, chunk_size):
+    """Partidos terminados posteriores a `after`, agrupados por día y leídos por bloques"""
+    while True:
+        cursor.execute(_REPLAY_QUERY, (after, chunk_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        if len(rows) == chunk_size:
+            # El último día puede venir incompleto: se deja para el siguiente bloque
+            last_day = rows[-1][0]
+            complete = [row for row in rows if row[0] != last_day]
+            if not complete:
+                cursor.execute(_REPLAY_DAY_QUERY, (last_day,))
+                complete = cursor.fetchall()
+            rows = complete
+        for day, matches in groupby(rows, key=itemgetter(0)):
+            yield day, list(matches)
+        after = rows[-1][0]
+
+
+def _insert_ratings(cursor, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            "INSERT INTO team_ratings (date_id, team_id, elo, pagerank, matches) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(batch)),
+            [value for row in batch for value in row]
+        )
+
+
+def update_ratings(conn, since=None, config=None):
+    """Recalcula los ratings desde el día `since` (fecha) o toda la historia si es None.
+
+    Se reanuda con la última fila de cada equipo hasta el último día
+    guardado anterior a `since`; las filas posteriores se borran y se
+    vuelven a escribir en una sola transacción, así el dashboard sigue
+    leyendo el ranking anterior hasta el commit.
+    """
+    config = config or RATINGS_CONFIG
+    start = time.perf_counter()
+    engine = RatingEngine(config)
+    cursor = conn.cursor()
+    try:
+        resume = None
+        if since is not None:
+            cursor.execute("SELECT MAX(date_id) FROM team_ratings WHERE date_id < %s", (since,))
+            resume = cursor.fetchone()[0]
+        if resume is not None:
+            cursor.execute(_LATEST_RATINGS_QUERY, (resume,))
+            ratings = cursor.fetchall()
+            cursor.execute(_WIN_EDGES_QUERY, (resume,))
+            engine.load_state(ratings, cursor.fetchall())
+        resume = resume or FIRST_DATE
+        cursor.execute("DELETE FROM team_ratings WHERE date_id > %s", (resume,))
+
+        days, matches, pending = 0, 0, []
+        for day, day_matches in _replay_days(cursor, resume, config['chunk_size']):
+            for _, home_id, away_id, home_score, away_score in day_matches:
+                engine.play(home_id, away_id, home_score, away_score)
+            engine.update_pagerank()
+            pending.extend(engine.rows(day))
+            days += 1
+            matches += len(day_matches)
+            if len(pending) >= config['batch_size']:
+                _insert_ratings(cursor, pending, config['batch_size'])
+                pending = []
+        _insert_ratings(cursor, pending, config['batch_size'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    elapsed = time.perf_counter() - start
+    origin = resume.isoformat() if resume != FIRST_DATE else 'el inicio'
+    print(f"✅ Ratings: {matches} partidos en {days} días recalculados desde {origin} en {elapsed:.2f}s")
+    return days
+
+
+# Consultas del dashboard (SQLAlchemy)
+def build_ranking_query(filters, limit=None):
+    """Ranking por Elo al cierre del rango de fechas y variación desde su inicio.
+
+    El rating de cada equipo es su última fila hasta el final del rango y la
+    referencia, su última fila anterior al inicio. Con competiciones
+    seleccionadas solo entran los equipos que jugaron en ellas dentro del
+    rango; con equipos, solo esos equipos.
+    """
+    start_key, end_key, competition_ids, team_ids = filters
+    params = {'initial': RATINGS_CONFIG['initial'], 'limit': int(limit or RATINGS_CONFIG['top_n'])}
+    expanding = []
+
+    as_of = ""
+    if end_key is not None:
+        as_of = "WHERE date_id <= :end_date"
+        params['end_date'] = key_to_date(end_key)
+    if start_key is not None:
+        baseline_join = """
+        LEFT JOIN (SELECT team_id, MAX(date_id) AS date_id FROM team_ratings
+                   WHERE date_id < :start_date GROUP BY team_id) base ON base.team_id = r.team_id
+        LEFT JOIN team_ratings s ON s.team_id = base.team_id AND s.date_id = base.date_id"""
+        baseline = "COALESCE(s.elo, :initial)"
+        params['start_date'] = key_to_date(start_key)
+    else:
+        baseline_join, baseline = "", ":initial"
+
+    conditions = []
+    if team_ids:
+        conditions.append("r.team_id IN :team_ids")
+        params['team_ids'] = list(team_ids)
+        expanding.append('team_ids')
+    if competition_ids:
+        where, where_params, where_expanding = build_where(start_key, end_key, competition_ids, ())
+        conditions.append(
+            f"r.team_id IN (SELECT fm.home_team_id FROM facts_matches fm WHERE {where} "
+            f"UNION SELECT fm.away_team_id FROM facts_matches fm WHERE {where})"
+        )
+        params.update(where_params)
+        expanding.extend(where_expanding)
+
+    query = text(f"""
+        SELECT t.name AS team, r.date_id AS rating_date, r.elo, r.pagerank, r.matches,
+               r.elo - {baseline} AS elo_change
+        FROM team_ratings r
+        JOIN (SELECT team_id, MAX(date_id) AS date_id FROM team_ratings {as_of} GROUP BY team_id) cur
+          ON cur.team_id = r.team_id AND cur.date_id = r.date_id
+        JOIN dim_teams t ON r.team_id = t.id{baseline_join}
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY r.elo DESC
+        LIMIT :limit
+    """)
+    if expanding:
+        query = query.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return query, params
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recalcula los ratings Elo y PageRank de los equipos")
+    parser.add_argument('--rebuild', action='store_true', help="Recalcular toda la historia")
+    return parser.parse_args()
+
+
+def main():
+    # Misma conexión que el importador (mysql-connector, parámetros %s)
+    from import_data import connect_db
+
+    args = parse_args()
+    conn = connect_db()
+    try:
+        since = None
+        if not args.rebuild:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(date_id) FROM team_ratings")
+            last = cursor.fetchone()[0]
+            cursor.close()
+            since = last
+        update_ratings(conn, since)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
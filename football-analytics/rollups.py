@@ -0,0 +1,303 @@
+"""Tablas de resumen para los KPIs y el grafo de victorias.
+
+`agg_team_day` agrega los partidos por (competición, equipo, día, local/visitante)
+y `agg_head_to_head` por (competición, local, visitante, mes). El importador
+las recalcula para el rango de fechas que acaba de cargar y el dashboard
+responde a los filtros sumando filas agregadas en lugar de partidos.
+"""
+import calendar
+from datetime import timedelta
+from sqlalchemy import text, bindparam
+from queries import build_where, key_to_date
+
+# Clave AAAAMMDD / AAAAMM de los resúmenes, calculada desde las columnas de dim_dates
+ROLLUP_DATE_KEY = "(d.year * 10000 + d.month * 100 + d.day)"
+ROLLUP_MONTH_KEY = "(d.year * 100 + d.month)"
+
+ROLLUP_TABLES = {
+    'agg_team_day': """
+        CREATE TABLE IF NOT EXISTS agg_team_day (
+            competition_id INT NOT NULL,
+            team_id INT NOT NULL,
+            date_key INT NOT NULL,
+            is_home TINYINT NOT NULL,
+            matches INT NOT NULL,
+            wins INT NOT NULL,
+            draws INT NOT NULL,
+            losses INT NOT NULL,
+            goals_for INT NOT NULL,
+            goals_against INT NOT NULL,
+            possession_home_sum DOUBLE,
+            possession_count INT NOT NULL,
+            PRIMARY KEY (date_key, competition_id, team_id, is_home),
+            KEY idx_agg_team_day_team (team_id, date_key)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+    'agg_head_to_head': """
+        CREATE TABLE IF NOT EXISTS agg_head_to_head (
+            competition_id INT NOT NULL,
+            home_team_id INT NOT NULL,
+            away_team_id INT NOT NULL,
+            month_key INT NOT NULL,
+            matches INT NOT NULL,
+            home_wins INT NOT NULL,
+            away_wins INT NOT NULL,
+            draws INT NOT NULL,
+            home_goals INT NOT NULL,
+            away_goals INT NOT NULL,
+            PRIMARY KEY (month_key, competition_id, home_team_id, away_team_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """
+}
+
+# Mantenimiento (conexión DB-API del importador, parámetros %s)
+_TEAM_DAY_INSERT = """
+    INSERT INTO agg_team_day (competition_id, team_id, date_key, is_home, matches, wins, draws, losses,
+                              goals_for, goals_against, possession_home_sum, possession_count)
+    SELECT fm.competition_id, fm.{team}_team_id, {date_key}, {is_home}, COUNT(*),
+           SUM(CASE WHEN fm.{team}_score > fm.{rival}_score THEN 1 ELSE 0 END),
+           SUM(CASE WHEN fm.{team}_score = fm.{rival}_score THEN 1 ELSE 0 END),
+           SUM(CASE WHEN fm.{team}_score < fm.{rival}_score THEN 1 ELSE 0 END),
+           SUM(fm.{team}_score), SUM(fm.{rival}_score),
+           SUM(ms.possession_home), COUNT(ms.possession_home)
+    FROM facts_matches fm
+    JOIN dim_dates d ON fm.date_id = d.id
+    JOIN dim_match_stats ms ON fm.stats_id = ms.id
+    WHERE fm.home_score IS NOT NULL AND {scope}
+    GROUP BY fm.competition_id, fm.{team}_team_id, {date_key}
+"""
+
+_HEAD_TO_HEAD_INSERT = f"""
+    INSERT INTO agg_head_to_head (competition_id, home_team_id, away_team_id, month_key, matches,
+                                  home_wins, away_wins, draws, home_goals, away_goals)
+    SELECT fm.competition_id, fm.home_team_id, fm.away_team_id, {ROLLUP_MONTH_KEY}, COUNT(*),
+           SUM(CASE WHEN fm.home_score > fm.away_score THEN 1 ELSE 0 END),
+           SUM(CASE WHEN fm.home_score < fm.away_score THEN 1 ELSE 0 END),
+           SUM(CASE WHEN fm.home_score = fm.away_score THEN 1 ELSE 0 END),
+           SUM(fm.home_score), SUM(fm.away_score)
+    FROM facts_matches fm
+    JOIN dim_dates d ON fm.date_id = d.id
+    JOIN dim_match_stats ms ON fm.stats_id = ms.id
+    WHERE fm.home_score IS NOT NULL AND {{scope}}
+    GROUP BY fm.competition_id, fm.home_team_id, fm.away_team_id, {ROLLUP_MONTH_KEY}
+"""
+
+
+def refresh_rollups(conn, competition_id=None, start_key=None, end_key=None):
+    """Recalcula los resúmenes de una competición entre dos fechas AAAAMMDD.
+
+    Sin argumentos reconstruye todo. Los meses de `agg_head_to_head` se
+    recalculan completos para no dejar un mes a medias.
+    """
+    # Condiciones equivalentes sobre los hechos (fm) y sobre las tablas de resumen
+    day_scope, agg_day_scope, day_params, agg_day_params = ["1 = 1"], ["1 = 1"], [], []
+    month_scope, agg_month_scope, month_params, agg_month_params = ["1 = 1"], ["1 = 1"], [], []
+    if competition_id is not None:
+        day_scope.append("fm.competition_id = %s")
+        agg_day_scope.append("competition_id = %s")
+        month_scope.append("fm.competition_id = %s")
+        agg_month_scope.append("competition_id = %s")
+        for params in (day_params, agg_day_params, month_params, agg_month_params):
+            params.append(competition_id)
+    if start_key is not None and end_key is not None:
+        # Sobre los hechos se filtra por fm.date_id (índice); sobre los resúmenes por su clave
+        day_scope.append("fm.date_id BETWEEN %s AND %s")
+        day_params.extend([key_to_date(start_key), key_to_date(end_key)])
+        agg_day_scope.append("date_key BETWEEN %s AND %s")
+        agg_day_params.extend([start_key, end_key])
+        first_month, last_month = start_key // 100, end_key // 100
+        month_scope.append("fm.date_id BETWEEN %s AND %s")
+        month_params.extend([key_to_date(first_month * 100 + 1), key_to_date(_month_end_key(last_month))])
+        agg_month_scope.append("month_key BETWEEN %s AND %s")
+        agg_month_params.extend([first_month, last_month])
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM agg_team_day WHERE {' AND '.join(agg_day_scope)}", agg_day_params)
+        for team, rival, is_home in (('home', 'away', 1), ('away', 'home', 0)):
+            cursor.execute(
+                _TEAM_DAY_INSERT.format(team=team, rival=rival, is_home=is_home,
+                                        date_key=ROLLUP_DATE_KEY, scope=" AND ".join(day_scope)),
+                day_params
+            )
+        cursor.execute(f"DELETE FROM agg_head_to_head WHERE {' AND '.join(agg_month_scope)}", agg_month_params)
+        cursor.execute(_HEAD_TO_HEAD_INSERT.format(scope=" AND ".join(month_scope)), month_params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# Consultas del dashboard (SQLAlchemy)
+ROLLUPS_READY_QUERY = text("SELECT COUNT(*) FROM (SELECT 1 FROM agg_team_day LIMIT 1) t")
+
+
+def _bind(query, expanding):
+    if expanding:
+        query = query.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return query
+
+
+def build_kpi_queries(filters):
+    """Consultas de KPIs sobre `agg_team_day` y corrección de doble conteo.
+
+    Sin filtro de equipos basta sumar las filas locales (una por partido).
+    Con equipos se suman sus filas y se resta una vez cada partido entre dos
+    equipos seleccionados, que aparece dos veces; esa corrección solo toca
+    los partidos entre equipos seleccionados.
+    """
+    start_key, end_key, competition_ids, team_ids = filters
+    conditions, params, expanding = [], {}, []
+    if start_key is not None:
+        conditions.append("date_key >= :start_key")
+        params['start_key'] = start_key
+    if end_key is not None:
+        conditions.append("date_key <= :end_key")
+        params['end_key'] = end_key
+    if competition_ids:
+        conditions.append("competition_id IN :competition_ids")
+        params['competition_ids'] = list(competition_ids)
+        expanding.append('competition_ids')
+    if team_ids:
+        conditions.append("team_id IN :team_ids")
+        params['team_ids'] = list(team_ids)
+        expanding.append('team_ids')
+    else:
+        conditions.append("is_home = 1")
+
+    rollup_query = _bind(text(f"""
+        SELECT
+            COALESCE(SUM(matches), 0) AS matches,
+            COALESCE(SUM(CASE WHEN is_home = 1 THEN wins ELSE losses END), 0) AS home_wins,
+            SUM(possession_home_sum) AS possession_sum,
+            COALESCE(SUM(possession_count), 0) AS possession_count,
+            COALESCE(SUM(goals_for + goals_against), 0) AS goals
+        FROM agg_team_day
+        WHERE {" AND ".join(conditions)}
+    """), expanding)
+    queries = [(rollup_query, params, 1)]
+
+    if len(team_ids) > 1:
+        where, overlap_params, overlap_expanding = build_where(start_key, end_key, competition_ids, ())
+        overlap_params.update(home_team_ids=list(team_ids), away_team_ids=list(team_ids))
+        overlap_query = _bind(text(f"""
+            SELECT
+                COUNT(*) AS matches,
+                COALESCE(SUM(CASE WHEN fm.home_score > fm.away_score THEN 1 ELSE 0 END), 0) AS home_wins,
+                SUM(ms.possession_home) AS possession_sum,
+                COUNT(ms.possession_home) AS possession_count,
+                COALESCE(SUM(fm.home_score + fm.away_score), 0) AS goals
+            FROM facts_matches fm
+            JOIN dim_match_stats ms ON fm.stats_id = ms.id
+            WHERE {where}
+              AND fm.home_team_id IN :home_team_ids AND fm.away_team_id IN :away_team_ids
+        """), overlap_expanding + ['home_team_ids', 'away_team_ids'])
+        queries.append((overlap_query, overlap_params, -1))
+    return queries
+
+
+def combine_kpis(rows):
+    """Combina las filas (con signo) en los KPIs del dashboard"""
+    totals = {'matches': 0, 'home_wins': 0, 'possession_sum': 0.0, 'possession_count': 0, 'goals': 0}
+    for row, sign in rows:
+        for key in totals:
+            totals[key] += sign * (row[key] or 0)
+    matches = totals['matches']
+    return {
+        'total_matches': matches,
+        'home_win_rate': totals['home_wins'] / matches * 100 if matches else 0,
+        'avg_possession': (totals['possession_sum'] / totals['possession_count']
+                           if totals['possession_count'] else float('nan')),
+        'goals_per_match': totals['goals'] / matches if matches else 0
+    }
+
+
+def _month_end_key(month_key):
+    year, month = divmod(month_key, 100)
+    return month_key * 100 + calendar.monthrange(year, month)[1]
+
+
+def _shift_key(key, days):
+    """Clave AAAAMMDD desplazada `days` días (fechas válidas para comparar con fm.date_id)"""
+    shifted = key_to_date(key) + timedelta(days=days)
+    return shifted.year * 10000 + shifted.month * 100 + shifted.day
+
+
+def _month_bounds(start_key, end_key):
+    """Primer y último mes completamente cubiertos por el rango (AAAAMM)"""
+    first = None
+    if start_key is not None:
+        first = start_key // 100
+        if start_key % 100 != 1:
+            year, month = divmod(first, 100)
+            first = (year + month // 12) * 100 + month % 12 + 1
+    last = None
+    if end_key is not None:
+        last = end_key // 100
+        year, month = divmod(last, 100)
+        if end_key % 100 != calendar.monthrange(year, month)[1]:
+            last = (year - 1) * 100 + 12 if month == 1 else last - 1
+    return first, last
+
+
+def build_head_to_head_queries(filters):
+    """Consultas de enfrentamientos (local, visitante, victorias) para el grafo.
+
+    Los meses completos salen de `agg_head_to_head`; los días sueltos de los
+    extremos del rango se leen de facts_matches, así el resultado es exacto.
+    """
+    start_key, end_key, competition_ids, team_ids = filters
+    first_month, last_month = _month_bounds(start_key, end_key)
+    queries = []
+
+    if first_month is None or last_month is None or first_month <= last_month:
+        conditions, params, expanding = [], {}, []
+        if first_month is not None:
+            conditions.append("h.month_key >= :first_month")
+            params['first_month'] = first_month
+        if last_month is not None:
+            conditions.append("h.month_key <= :last_month")
+            params['last_month'] = last_month
+        if competition_ids:
+            conditions.append("h.competition_id IN :competition_ids")
+            params['competition_ids'] = list(competition_ids)
+            expanding.append('competition_ids')
+        if team_ids:
+            conditions.append("(h.home_team_id IN :home_team_ids OR h.away_team_id IN :away_team_ids)")
+            params.update(home_team_ids=list(team_ids), away_team_ids=list(team_ids))
+            expanding.extend(['home_team_ids', 'away_team_ids'])
+        queries.append((_bind(text(f"""
+            SELECT ht.name AS home_team, at.name AS away_team,
+                   SUM(h.home_wins) AS home_wins, SUM(h.away_wins) AS away_wins
+            FROM agg_head_to_head h
+            JOIN dim_teams ht ON h.home_team_id = ht.id
+            JOIN dim_teams at ON h.away_team_id = at.id
+            WHERE {" AND ".join(conditions) or "1 = 1"}
+            GROUP BY ht.name, at.name
+        """), expanding), params))
+        raw_ranges = []
+        if first_month is not None and start_key is not None and start_key < first_month * 100 + 1:
+            raw_ranges.append((start_key, _shift_key(first_month * 100 + 1, -1)))
+        if last_month is not None and end_key is not None:
+            next_month_start = _shift_key(_month_end_key(last_month), 1)
+            if end_key >= next_month_start:
+                raw_ranges.append((next_month_start, end_key))
+    else:
+        # El rango no cubre ningún mes completo
+        raw_ranges = [(start_key, end_key)]
+
+    for range_start, range_end in raw_ranges:
+        where, params, expanding = build_where(range_start, range_end, competition_ids, team_ids)
+        queries.append((_bind(text(f"""
+            SELECT ht.name AS home_team, at.name AS away_team,
+                   SUM(CASE WHEN fm.home_score > fm.away_score THEN 1 ELSE 0 END) AS home_wins,
+                   SUM(CASE WHEN fm.home_score < fm.away_score THEN 1 ELSE 0 END) AS away_wins
+            FROM facts_matches fm
+            JOIN dim_teams ht ON fm.home_team_id = ht.id
+            JOIN dim_teams at ON fm.away_team_id = at.id
+            WHERE {where}
+            GROUP BY ht.name, at.name
+        """), expanding), params))
+    return queries
@@ -0,0 +1,211 @@
+"""Instantánea columnar en disco del conjunto de partidos procesado.
+
+Cada columna se guarda como un array .npy (los textos como códigos enteros
+más su diccionario) junto a un manifest.json con la versión de datos. Los
+workers la abren con memory-mapping, de modo que arrancan sin ejecutar el
+join completo y comparten las páginas a través de la caché del sistema
+operativo. Si falta o su versión no coincide con meta_data_version, el
+dashboard vuelve a MySQL.
+
+Uso bajo demanda:
+    python snapshot.py
+"""
+import os
+import json
+import shutil
+import logging
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from queries import SNAPSHOT_QUERY
+from processing import process_match_data
+from forksafe import after_fork
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CONFIG = {
+    'dir': os.getenv('SNAPSHOT_DIR', 'snapshot'),
+    'enabled': os.getenv('SNAPSHOT_ENABLED', '1') == '1'
+}
+MANIFEST = 'manifest.json'
+
+# Columnas internas que solo sirven para filtrar en memoria
+FILTER_COLUMNS = ['home_team_id', 'away_team_id', 'competition_id', 'date_key']
+
+_state = {'df': None, 'version': None, 'checked_version': None, 'checked_mtime': None}
+_state_lock = threading.Lock()
+
+
+def export_snapshot(df, version, path=None):
+    """Escribe el DataFrame como columnas .npy y lo publica de forma atómica"""
+    path = path or SNAPSHOT_CONFIG['dir']
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        entry = {'file': f"{name}.npy"}
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.to_numpy(dtype='datetime64[ns]').view('int64')
+            entry['kind'] = 'datetime'
+        elif pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.to_numpy()
+            entry['kind'] = 'numeric'
+        else:
+            # Textos (object, str o categorías) como códigos más su diccionario
+            categorical = series.astype('category')
+            values = categorical.cat.codes.to_numpy()
+            entry['kind'] = 'category'
+            entry['categories'] = [str(c) for c in categorical.cat.categories]
+        np.save(os.path.join(tmp_path, entry['file']), values, allow_pickle=False)
+        columns[name] = entry
+
+    manifest = {
+        'version': version,
+        'rows': len(df),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'columns': columns
+    }
+    with open(os.path.join(tmp_path, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    # Sustituir la instantánea anterior sin dejar una a medias
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    logger.info(f"✅ Instantánea escrita: {len(df)} partidos, versión {version}")
+    return manifest
+
+
+def read_manifest(path=None):
+    path = path or SNAPSHOT_CONFIG['dir']
+    try:
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_mtime(path=None):
+    """Marca de modificación del manifest (cambia con cada exportación); None si no existe"""
+    try:
+        return os.stat(os.path.join(path or SNAPSHOT_CONFIG['dir'], MANIFEST)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_snapshot(expected_version=None, path=None, mmap=True):
+    """Abre la instantánea; None si falta o no corresponde a `expected_version`"""
+    path = path or SNAPSHOT_CONFIG['dir']
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    if expected_version is not None and manifest['version'] != expected_version:
+        logger.info(f"⚠️ Instantánea obsoleta (versión {manifest['version']}, datos {expected_version})")
+        return None
+
+    data = {}
+    for name, entry in manifest['columns'].items():
+        values = np.load(os.path.join(path, entry['file']), mmap_mode='r' if mmap else None, allow_pickle=False)
+        if entry['kind'] == 'datetime':
+            data[name] = values.view('datetime64[ns]')
+        elif entry['kind'] == 'category':
+            data[name] = pd.Categorical.from_codes(values, categories=entry['categories'])
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def preload_snapshot():
+    """Abre la instantánea al arrancar sin consultar MySQL; se valida en el primer uso"""
+    if not SNAPSHOT_CONFIG['enabled']:
+        return None
+    manifest = read_manifest()
+    if manifest is None:
+        return None
+    df = load_snapshot()
+    with _state_lock:
+        _state['df'] = df
+        _state['version'] = manifest['version']
+    logger.info(f"✅ Instantánea abierta: {manifest['rows']} partidos, versión {manifest['version']}")
+    return df
+
+
+def get_snapshot(version):
+    """Instantánea vigente para la versión de datos actual (cargada una vez por proceso)"""
+    if not SNAPSHOT_CONFIG['enabled']:
+        return None
+    with _state_lock:
+        if _state['df'] is not None and _state['version'] == version:
+            return _state['df']
+        # Solo se vuelve a abrir cuando cambia la versión de datos o se reescribe el
+        # manifest (p. ej. una exportación que termina después de ver la versión nueva)
+        mtime = manifest_mtime()
+        if _state['checked_version'] == version and _state['checked_mtime'] == mtime:
+            return None
+        _state['checked_version'] = version
+        _state['checked_mtime'] = mtime
+        df = load_snapshot(expected_version=version)
+        _state['df'] = df
+        _state['version'] = version if df is not None else None
+        return df
+
+
+def filter_snapshot(df, filters):
+    """Aplica en memoria los mismos filtros que build_match_query"""
+    start_key, end_key, competition_ids, team_ids = filters
+    mask = np.ones(len(df), dtype=bool)
+    date_key = df['date_key'].to_numpy()
+    if start_key is not None:
+        mask &= date_key >= start_key
+    if end_key is not None:
+        mask &= date_key <= end_key
+    if competition_ids:
+        mask &= np.isin(df['competition_id'].to_numpy(), competition_ids)
+    if team_ids:
+        mask &= (np.isin(df['home_team_id'].to_numpy(), team_ids)
+                 | np.isin(df['away_team_id'].to_numpy(), team_ids))
+    # Las categorías se conservan: mismo esquema compacto que la consulta a MySQL
+    return df.loc[mask].drop(columns=FILTER_COLUMNS).reset_index(drop=True)
+
+
+def build_snapshot_frame(df):
+    """Procesa el resultado de SNAPSHOT_QUERY y añade la clave AAAAMMDD para filtrar"""
+    df = process_match_data(df)
+    dates = pd.to_datetime(df['match_date'])
+    df['date_key'] = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int32')
+    return df
+
+
+def export_from_database(path=None, version=None):
+    """Lee el conjunto completo de MySQL, lo procesa y escribe la instantánea.
+
+    Sin `version` se marca con la versión de datos actual; el importador
+    pasa la siguiente y la publica después, así los workers nunca ven la
+    versión nueva sin su instantánea.
+    """
+    with get_engine().connect() as conn:
+        if version is None:
+            version = conn.execute(text("SELECT version FROM meta_data_version WHERE id = 1")).scalar()
+        df = pd.read_sql(SNAPSHOT_QUERY, conn)
+    return export_snapshot(build_snapshot_frame(df), version, path)
+
+
+@after_fork
+def _reset_after_fork():
+    """Lock del estado de la instantánea abierta en este proceso"""
+    global _state_lock
+    _state_lock = threading.Lock()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    export_from_database()
+
@@ -0,0 +1,183 @@
+"""Fixtures comunes: esquema estrella en SQLite con partidos deterministas.
+
+Las consultas del dashboard (SQLAlchemy) se ejecutan tal cual sobre SQLite;
+las del importador usan parámetros %s de mysql-connector, así que pasan
+por `DbApiConnection`, que los traduce a los de sqlite3 junto con el
+upsert de MySQL y devuelve las fechas como mysql-connector.
+"""
+import os
+import re
+import sys
+import atexit
+import random
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Antes de importar app: cachés en memoria y directorios de diskcache fuera del repositorio
+_CACHE_ROOT = tempfile.mkdtemp(prefix='football-analytics-tests-')
+atexit.register(shutil.rmtree, _CACHE_ROOT, True)
+os.environ['CACHE_BACKEND'] = 'memory'
+os.environ['CACHE_DIR'] = os.path.join(_CACHE_ROOT, 'shared-cache')
+os.environ['BACKGROUND_CACHE_DIR'] = os.path.join(_CACHE_ROOT, 'background-cache')
+
+SQLITE_SCHEMA = [
+    "CREATE TABLE dim_competitions (id INTEGER PRIMARY KEY, name TEXT NOT NULL, code TEXT, area_name TEXT)",
+    "CREATE TABLE dim_teams (id INTEGER PRIMARY KEY, name TEXT NOT NULL, short_name TEXT, tla TEXT, crest_url TEXT)",
+    "CREATE TABLE dim_dates (id DATE PRIMARY KEY, day INT, month INT, year INT, day_of_week INT, is_weekend BOOLEAN)",
+    "CREATE TABLE dim_match_stats (id INTEGER PRIMARY KEY, possession_home FLOAT, shots_home INT, "
+    "shots_on_target_home INT, shots_away INT, shots_on_target_away INT, corners_home INT, corners_away INT, "
+    "fouls_home INT, fouls_away INT)",
+    "CREATE TABLE facts_matches (id INTEGER PRIMARY KEY, home_team_id INT, away_team_id INT, competition_id INT, "
+    "date_id DATE, stats_id INT, home_score INT, away_score INT, status TEXT, stage TEXT)",
+    "CREATE TABLE agg_team_day (competition_id INT NOT NULL, team_id INT NOT NULL, date_key INT NOT NULL, "
+    "is_home TINYINT NOT NULL, matches INT NOT NULL, wins INT NOT NULL, draws INT NOT NULL, losses INT NOT NULL, "
+    "goals_for INT NOT NULL, goals_against INT NOT NULL, possession_home_sum DOUBLE, possession_count INT NOT NULL, "
+    "PRIMARY KEY (date_key, competition_id, team_id, is_home))",
+    "CREATE TABLE agg_head_to_head (competition_id INT NOT NULL, home_team_id INT NOT NULL, "
+    "away_team_id INT NOT NULL, month_key INT NOT NULL, matches INT NOT NULL, home_wins INT NOT NULL, "
+    "away_wins INT NOT NULL, draws INT NOT NULL, home_goals INT NOT NULL, away_goals INT NOT NULL, "
+    "PRIMARY KEY (month_key, competition_id, home_team_id, away_team_id))"
+]
+
+TEAMS = {team_id: f"Equipo {team_id}" for team_id in range(1, 7)}
+COMPETITIONS = {1: 'Liga A', 2: 'Liga B'}
+
+
+# Marcas de agua y puntos de control del importador (import_data.py e import_pipeline.py)
+IMPORT_SCHEMA = [
+    "CREATE TABLE import_state (competition_id INT PRIMARY KEY, last_updated DATETIME, last_finished_date DATE, "
+    "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE TABLE import_runs (id INTEGER PRIMARY KEY AUTOINCREMENT, mode TEXT NOT NULL, status TEXT NOT NULL, "
+    "attempts INT NOT NULL DEFAULT 1, started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, finished_at TIMESTAMP NULL)",
+    "CREATE TABLE import_pages (run_id INT NOT NULL, page_key TEXT NOT NULL, competition_id INT NOT NULL, "
+    "path TEXT NOT NULL, params TEXT NOT NULL, since_updated DATETIME NULL, content_hash CHAR(40), "
+    "batches_done INT NOT NULL DEFAULT 0, changed INT NOT NULL DEFAULT 0, min_date DATE, max_date DATE, "
+    "last_updated DATETIME, last_finished_date DATE, done BOOLEAN NOT NULL DEFAULT FALSE, error TEXT, "
+    "PRIMARY KEY (run_id, page_key))"
+]
+
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}$")
+
+
+def _sql_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _python_value(value):
+    """Fechas como date/datetime, igual que las devuelve mysql-connector"""
+    if isinstance(value, str):
+        if _DATE_PATTERN.match(value):
+            return date.fromisoformat(value)
+        if _DATETIME_PATTERN.match(value):
+            return datetime.fromisoformat(value)
+    return value
+
+
+def _sqlite_query(query):
+    """Parámetros %s y upsert de MySQL en la sintaxis de SQLite"""
+    query = query.replace('%s', '?').replace('NOW()', 'CURRENT_TIMESTAMP')
+    query = query.replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET')
+    return re.sub(r"VALUES\((\w+)\)", r"excluded.\1", query)
+
+
+class DbApiCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        self._cursor.execute(_sqlite_query(query), [_sql_value(v) for v in params])
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def fetchall(self):
+        return [tuple(_python_value(v) for v in row) for row in self._cursor.fetchall()]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else tuple(_python_value(v) for v in row)
+
+    def close(self):
+        self._cursor.close()
+
+
+class DbApiConnection:
+    """Conexión DB-API con los parámetros %s del importador sobre sqlite3"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return DbApiCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+
+def generate_matches(count=400, seed=7):
+    """Partidos entre enero y abril de 2024 (cruzan varios límites de mes)"""
+    rng = random.Random(seed)
+    rows = []
+    for match_id in range(1, count + 1):
+        home, away = rng.sample(sorted(TEAMS), 2)
+        rows.append({
+            'id': match_id,
+            'home_team_id': home,
+            'away_team_id': away,
+            'competition_id': rng.choice(sorted(COMPETITIONS)),
+            'date_id': date(2024, 1, 15) + timedelta(days=rng.randrange(100)),
+            'home_score': rng.randrange(4),
+            'away_score': rng.randrange(4),
+            'possession_home': None if rng.random() < 0.2 else round(rng.uniform(30, 70), 1)
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def star_db(tmp_path):
+    """(engine, partidos) con el esquema estrella cargado y los resúmenes calculados"""
+    from rollups import refresh_rollups
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'star.db'}")
+    matches = generate_matches()
+    with engine.begin() as conn:
+        for ddl in SQLITE_SCHEMA + IMPORT_SCHEMA:
+            conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql(
+            "INSERT INTO dim_competitions (id, name) VALUES (?, ?)", list(COMPETITIONS.items())
+        )
+        conn.exec_driver_sql("INSERT INTO dim_teams (id, name) VALUES (?, ?)", list(TEAMS.items()))
+        days = sorted(set(matches['date_id']))
+        conn.exec_driver_sql(
+            "INSERT INTO dim_dates (id, day, month, year, day_of_week, is_weekend) VALUES (?, ?, ?, ?, ?, ?)",
+            [(d.isoformat(), d.day, d.month, d.year, d.isoweekday(), d.isoweekday() >= 6) for d in days]
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO dim_match_stats (id, possession_home) VALUES (?, ?)",
+            [(row.id, row.possession_home) for row in matches.itertuples()]
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO facts_matches (id, home_team_id, away_team_id, competition_id, date_id, stats_id, "
+            "home_score, away_score, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'FINISHED')",
+            [(row.id, row.home_team_id, row.away_team_id, row.competition_id, row.date_id.isoformat(), row.id,
+              row.home_score, row.away_score) for row in matches.itertuples()]
+        )
+    raw = engine.raw_connection()
+    try:
+        refresh_rollups(DbApiConnection(raw))
+    finally:
+        raw.close()
+    return engine, matches
@@ -0,0 +1,148 @@
+"""Cliente de la API contra un servidor HTTP local: reintentos, ETag/304 y token bucket."""
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import requests
+from api_client import ApiClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Responde con el guion del servidor: {path: [(estado, cabeceras, cuerpo), ...]}"""
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        with self.server.lock:
+            self.server.requests.append((path, dict(self.headers), time.monotonic()))
+            script = self.server.script.get(path, [(404, {}, None)])
+            status, headers, body = script.pop(0) if len(script) > 1 else script[0]
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    httpd.script = {}
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_client(server, tmp_path, **config):
+    config = dict({
+        'rate_per_minute': 60000, 'burst': 100, 'max_retries': 3, 'backoff_seconds': 0.01,
+        'timeout': 5, 'cache_dir': str(tmp_path / 'api_cache')
+    }, **config)
+    return ApiClient('clave', base_url=f"http://127.0.0.1:{server.server_port}/", config=config)
+
+
+def test_retries_after_429(server, tmp_path):
+    server.script['/matches'] = [
+        (429, {}, {'message': 'Too Many Requests'}),
+        (503, {'Retry-After': '0'}, None),
+        (200, {}, {'matches': [1, 2]})
+    ]
+    client = make_client(server, tmp_path)
+
+    response = client.get_json('matches', {'season': 2024})
+
+    assert response.data == {'matches': [1, 2]}
+    assert not response.not_modified
+    assert len(server.requests) == 3
+    assert client.stats == {'requests': 3, 'not_modified': 0, 'retries': 2}
+    assert server.requests[0][1]['X-Auth-Token'] == 'clave'
+
+
+def test_gives_up_after_max_retries(server, tmp_path):
+    server.script['/matches'] = [(429, {}, {'message': 'Too Many Requests'})]
+    client = make_client(server, tmp_path, max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        client.get_json('matches')
+    assert len(server.requests) == 3
+
+
+def test_etag_304_reuses_cached_body(server, tmp_path):
+    server.script['/competitions/PL/matches'] = [
+        (200, {'ETag': '"v1"', 'Last-Modified': 'Tue, 01 Oct 2024 10:00:00 GMT'}, {'matches': ['a']}),
+        (304, {'ETag': '"v1"'}, None),
+        (200, {}, {'matches': ['b']})
+    ]
+    client = make_client(server, tmp_path)
+
+    first = client.get_json('competitions/PL/matches', {'season': 2024})
+    second = client.get_json('competitions/PL/matches', {'season': 2024})
+
+    assert first.data == {'matches': ['a']} and not first.not_modified
+    assert second.data == {'matches': ['a']} and second.not_modified
+    headers = server.requests[1][1]
+    assert headers['If-None-Match'] == '"v1"'
+    assert headers['If-Modified-Since'] == 'Tue, 01 Oct 2024 10:00:00 GMT'
+    assert client.stats['not_modified'] == 1
+    # Otros parámetros son otra URL: sin validadores
+    assert client.get_json('competitions/PL/matches', {'season': 2023}).data == {'matches': ['b']}
+    assert 'If-None-Match' not in server.requests[2][1]
+
+
+def test_304_without_cached_body_refetches_unconditionally(server, tmp_path):
+    server.script['/competitions/PL/matches'] = [
+        (304, {'ETag': '"v1"'}, None),
+        (200, {'ETag': '"v2"'}, {'matches': ['c']})
+    ]
+    client = make_client(server, tmp_path)
+    # Entrada con validadores pero sin cuerpo (p. ej. de una versión anterior del cliente)
+    url = requests.Request('GET', client.base_url + 'competitions/PL/matches').prepare().url
+    (tmp_path / 'api_cache').mkdir()
+    with open(client._cache_path(url), 'w', encoding='utf-8') as f:
+        json.dump({'etag': '"v1"', 'last_modified': None}, f)
+
+    response = client.get_json('competitions/PL/matches')
+
+    assert response.data == {'matches': ['c']} and not response.not_modified
+    assert server.requests[0][1]['If-None-Match'] == '"v1"'
+    assert 'If-None-Match' not in server.requests[1][1]
+    assert client.stats == {'requests': 2, 'not_modified': 0, 'retries': 1}
+    # La respuesta completa vuelve a dejar una entrada válida
+    assert client._load_cached(url)['data'] == {'matches': ['c']}
+
+
+def test_unsolicited_304_raises(server, tmp_path):
+    server.script['/matches'] = [(304, {}, None)]
+    client = make_client(server, tmp_path)
+
+    with pytest.raises(requests.HTTPError, match='sin cuerpo guardado'):
+        client.get_json('matches')
+    # Sin validadores que quitar no se repite la petición
+    assert len(server.requests) == 1
+
+
+def test_token_bucket_paces_parallel_requests(server, tmp_path):
+    server.script['/page'] = [(200, {}, {'ok': True})]
+    # 10 peticiones por segundo, sin ráfaga, con 4 hilos
+    client = make_client(server, tmp_path, rate_per_minute=600, burst=1, max_workers=4, cache_dir='')
+
+    start = time.monotonic()
+    results = list(client.iter_fetch((i, 'page', {'n': i}) for i in range(6)))
+    elapsed = time.monotonic() - start
+
+    assert [key for key, _ in results] == list(range(6))
+    assert all(response.data == {'ok': True} for _, response in results)
+    assert elapsed >= 0.45
+    arrivals = sorted(stamp for _, _, stamp in server.requests)
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    assert min(gaps) >= 0.07
@@ -0,0 +1,23 @@
+"""Filas del CSV de LOAD DATA LOCAL INFILE."""
+import csv
+import io
+from datetime import date
+from bulk_loader import TABLE_COLUMNS, _csv_value, normalize_matches
+
+
+def test_csv_values_for_load_data():
+    match = {
+        'id': 1, 'utcDate': '2024-08-17T14:00:00Z', 'status': 'FINISHED', 'stage': 'REGULAR_SEASON',
+        'homeTeam': {'id': 10, 'name': 'Local'}, 'awayTeam': {'id': 11, 'name': 'Visitante'},
+        'score': {'fullTime': {'home': 2, 'away': 1}}
+    }
+    tables = normalize_matches([match], competition_id=2021)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([_csv_value(tables['dim_dates'][0][col]) for col in TABLE_COLUMNS['dim_dates']])
+    writer.writerow([_csv_value(tables['dim_match_stats'][0][col]) for col in TABLE_COLUMNS['dim_match_stats']])
+    dates_line, stats_line = buffer.getvalue().splitlines()
+    # Sábado: is_weekend como 1, no como "True"
+    assert dates_line == f"{date(2024, 8, 17)},17,8,2024,6,1"
+    assert stats_line == "1," + ",".join(['NULL'] * 9)
+    assert _csv_value(False) == 0
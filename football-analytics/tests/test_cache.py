@@ -0,0 +1,94 @@
+"""La versión de datos se lee sin bloquear al resto de hilos y la caché en disco respeta sus límites."""
+import time
+import threading
+import pytest
+import cache
+
+
+class SlowEngine:
+    def __init__(self, delay, version):
+        self.delay = delay
+        self.version = version
+        self.calls = 0
+
+    def connect(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return SlowConnection(self.version)
+
+
+class SlowConnection:
+    def __init__(self, version):
+        self.version = version
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        return self
+
+    def scalar(self):
+        return self.version
+
+
+@pytest.fixture
+def version_state(monkeypatch):
+    state = {'version': 3, 'checked_at': time.monotonic() - 60, 'refreshing': False}
+    monkeypatch.setattr(cache, '_version_state', state)
+    monkeypatch.setitem(cache.CACHE_CONFIG, 'version_check_interval', 5)
+    return state
+
+
+def test_slow_read_does_not_block_other_threads(version_state, monkeypatch):
+    engine = SlowEngine(delay=0.5, version=4)
+    monkeypatch.setattr(cache, 'get_engine', lambda: engine)
+
+    results = {}
+    refresher = threading.Thread(target=lambda: results.update(refresher=cache.get_data_version()))
+    refresher.start()
+    while not version_state['refreshing']:
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    assert cache.get_data_version() == 3
+    assert time.monotonic() - start < 0.1
+
+    refresher.join()
+    assert results['refresher'] == 4
+    assert cache.get_data_version() == 4
+    assert engine.calls == 1
+
+
+def test_failed_read_keeps_previous_version(version_state, monkeypatch):
+    def broken_engine():
+        raise RuntimeError('sin conexión')
+
+    monkeypatch.setattr(cache, 'get_engine', broken_engine)
+    assert cache.get_data_version() == 3
+    assert not version_state['refreshing']
+
+
+def test_disk_cache_keeps_max_entries(tmp_path):
+    shared = cache.DiskCache(str(tmp_path / 'shared'), ttl=600, max_entries=3, max_bytes=1024 * 1024)
+    for key in 'abcd':
+        shared.set(key, key.upper(), version=1)
+    # Reescribir una clave la pasa a la más reciente
+    shared.set('b', 'B2', version=1)
+    shared.set('e', 'E', version=1)
+
+    assert shared.stats()['entries'] == 3
+    assert [shared.get(key, 1) for key in 'abcde'] == [None, 'B2', None, 'D', 'E']
+    assert shared.add('f', 'F', version=1)
+    assert shared.stats()['entries'] == 3
+
+
+def test_disk_cache_stats_skip_expired_entries(tmp_path):
+    shared = cache.DiskCache(str(tmp_path / 'shared'), ttl=0.05, max_entries=10, max_bytes=1024 * 1024)
+    shared.set('a', 1, version=1)
+    shared.set('b', 2, version=1)
+    assert shared.stats()['entries'] == 2
+    time.sleep(0.1)
+    assert shared.stats()['entries'] == 0
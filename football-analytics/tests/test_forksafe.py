@@ -0,0 +1,66 @@
+"""Tras un fork el hijo no hereda locks tomados por otros hilos del padre."""
+import os
+import threading
+import pytest
+import background
+import cache
+import graphs
+import metrics
+import snapshot
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='requiere os.fork')
+
+
+def module_locks():
+    return [
+        lambda: background._warmup_lock,
+        lambda: cache._version_lock,
+        lambda: graphs._layout_lock,
+        lambda: snapshot._state_lock,
+        lambda: metrics._flusher_lock,
+        lambda: metrics.HISTOGRAMS[0]._lock
+    ]
+
+
+def test_child_gets_fresh_locks():
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_locks():
+        locks = [get() for get in module_locks()]
+        for lock in locks:
+            lock.acquire()
+        held.set()
+        release.wait()
+        for lock in locks:
+            lock.release()
+
+    thread = threading.Thread(target=hold_locks)
+    thread.start()
+    held.wait()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            acquired = all(get().acquire(timeout=1) for get in module_locks())
+            os._exit(0 if acquired else 1)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        release.set()
+        thread.join()
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def test_child_starts_without_parent_warmup():
+    background._set_state(state='running', version=7, done=3, total=10)
+    background.cancel_warmup()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            fresh = (background.warmup_status()['state'] == 'idle' and not background._warmup_cancel.is_set()
+                     and background._warmup_thread['thread'] is None)
+            os._exit(0 if fresh else 1)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        background._warmup_cancel.clear()
+        background._set_state(**background._IDLE_STATE)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
@@ -0,0 +1,113 @@
+"""Layouts del grafo: caché exacta, arranque en caliente y reutilización entre procesos."""
+from collections import OrderedDict
+import networkx as nx
+import pytest
+import cache
+import graphs
+
+BASE_EDGES = [
+    ('A', 'B', 1), ('B', 'C', 2), ('C', 'D', 1), ('D', 'A', 3), ('A', 'C', 1),
+    ('E', 'A', 1), ('E', 'B', 2), ('F', 'E', 1), ('F', 'C', 1), ('G', 'F', 1)
+]
+
+
+def graph(edges):
+    G = nx.DiGraph()
+    G.add_weighted_edges_from(edges)
+    return G
+
+
+@pytest.fixture
+def layouts(monkeypatch):
+    monkeypatch.setattr(graphs, '_layout_cache', OrderedDict())
+    monkeypatch.setattr(graphs, '_shared_layouts', None)
+    return graphs._layout_cache
+
+
+@pytest.fixture
+def spring_calls(monkeypatch):
+    """Argumentos de cada llamada a spring_layout (el layout se calcula igual)"""
+    calls = []
+    original = nx.spring_layout
+
+    def spy(G, **kwargs):
+        calls.append(kwargs)
+        return original(G, **kwargs)
+
+    monkeypatch.setattr(graphs.nx, 'spring_layout', spy)
+    return calls
+
+
+@pytest.fixture
+def shared_layouts(layouts, tmp_path, monkeypatch):
+    shared = cache.TieredCache(
+        cache.TTLCache(ttl=600, max_entries=8, max_bytes=1024 * 1024),
+        cache.DiskCache(str(tmp_path / 'layouts'), ttl=600, max_entries=8, max_bytes=1024 * 1024)
+    )
+    monkeypatch.setattr(graphs, '_shared_layouts', shared)
+    return shared
+
+
+def test_warm_start_from_layout_of_another_process(shared_layouts, layouts):
+    first = graphs.compute_layout(graph(BASE_EDGES))
+    # El layout se calculó en otro proceso (un callback en segundo plano): aquí solo queda la caché compartida
+    layouts.clear()
+
+    second = graphs.compute_layout(graph(BASE_EDGES + [('H', 'A', 1)]))
+
+    assert set(second) == set(first) | {'H'}
+    # Solo aparece un nodo nuevo: los demás conservan su posición
+    assert all(second[node] == first[node] for node in first)
+
+
+def test_exact_hit_returns_cached_positions(layouts, spring_calls):
+    first = graphs.compute_layout(graph(BASE_EDGES))
+    # Mismas aristas en otro orden: misma huella, sin recalcular
+    second = graphs.compute_layout(graph(BASE_EDGES[::-1]))
+
+    assert second is first
+    assert len(spring_calls) == 1
+    assert spring_calls[0]['iterations'] == graphs.LAYOUT_CONFIG['iterations']
+
+
+def test_new_node_keeps_shared_positions(layouts, spring_calls):
+    first = graphs.compute_layout(graph(BASE_EDGES))
+    second = graphs.compute_layout(graph(BASE_EDGES + [('H', 'B', 2)]))
+
+    assert all(second[node] == first[node] for node in first)
+    warm = spring_calls[-1]
+    assert warm['iterations'] == graphs.LAYOUT_CONFIG['warm_iterations']
+    assert sorted(warm['fixed']) == sorted(first)
+
+
+def test_changed_weights_start_from_previous_layout(layouts, spring_calls):
+    first = graphs.compute_layout(graph(BASE_EDGES))
+    reweighted = [(u, v, w + 1) for u, v, w in BASE_EDGES]
+    second = graphs.compute_layout(graph(reweighted))
+
+    warm = spring_calls[-1]
+    # Mismos nodos: se parte de las posiciones anteriores con menos iteraciones y ninguno queda fijo
+    assert warm['iterations'] == graphs.LAYOUT_CONFIG['warm_iterations']
+    assert warm['pos'] == first and warm['fixed'] is None
+    assert set(second) == set(first)
+
+
+def test_little_overlap_computes_from_scratch(layouts, spring_calls):
+    graphs.compute_layout(graph(BASE_EDGES))
+    graphs.compute_layout(graph([('X', 'Y', 1), ('Y', 'Z', 1), ('Z', 'A', 1)]))
+
+    assert [call['iterations'] for call in spring_calls] == [graphs.LAYOUT_CONFIG['iterations']] * 2
+    assert 'pos' not in spring_calls[-1]
+
+
+def test_lru_evicts_least_recently_used(layouts, monkeypatch):
+    monkeypatch.setitem(graphs.LAYOUT_CONFIG, 'cache_size', 2)
+    graphs.compute_layout(graph(BASE_EDGES))
+    graphs.compute_layout(graph(BASE_EDGES[:5]))
+    # Un acierto pasa el layout al final de la LRU
+    graphs.compute_layout(graph(BASE_EDGES))
+    graphs.compute_layout(graph(BASE_EDGES[5:]))
+
+    assert list(layouts) == [graphs.graph_fingerprint(graph(BASE_EDGES)),
+                             graphs.graph_fingerprint(graph(BASE_EDGES[5:]))]
+    assert graphs.layout_cache_stats() == {'entries': 2, 'max_entries': 2}
@@ -0,0 +1,257 @@
+"""Importación incremental sobre SQLite: upsert, marcas de agua, puntos de control y parada de las etapas."""
+import threading
+import time
+from datetime import date, datetime, timedelta
+import pytest
+from conftest import DbApiConnection
+from api_client import ApiResponse
+from bulk_loader import TABLE_COLUMNS, bulk_upsert
+import import_data
+import import_pipeline
+from import_pipeline import start_run, unfinished_runs, resume_run, run_pages, run_in_thread, run_pipeline
+
+CODES = {'PL': 1, 'PD': 2}
+
+
+def api_match(match_id, day, home, away, score=(1, 0), status='FINISHED', updated='2024-05-20T10:00:00Z'):
+    return {
+        'id': match_id, 'utcDate': f"{day}T18:00:00Z", 'status': status, 'stage': 'REGULAR_SEASON',
+        'lastUpdated': updated,
+        'homeTeam': {'id': home, 'name': f"Equipo {home}"}, 'awayTeam': {'id': away, 'name': f"Equipo {away}"},
+        'score': {'fullTime': {'home': score[0], 'away': score[1]}}
+    }
+
+
+class FakeClient:
+    """iter_fetch de ApiClient con las respuestas de cada página (o la excepción de su descarga)"""
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def iter_fetch(self, requests_list):
+        for page, _, _ in requests_list:
+            response = self.responses[page['page_key']]
+            yield page, response if isinstance(response, Exception) else ApiResponse({'matches': response})
+
+
+class FlakyConnection(DbApiConnection):
+    """Pierde la conexión en el commit número `fail_at` (ese lote no se confirma)"""
+
+    def __init__(self, conn, fail_at):
+        super().__init__(conn)
+        self.commits = 0
+        self.fail_at = fail_at
+
+    def commit(self):
+        self.commits += 1
+        if self.commits == self.fail_at:
+            raise RuntimeError('conexión perdida')
+        super().commit()
+
+
+@pytest.fixture
+def importer(star_db, monkeypatch):
+    """(conexión DB-API, engine, llamadas a update_ratings) con dos temporadas por competición y lotes de 2"""
+    engine, _ = star_db
+    monkeypatch.setattr(import_data, 'IMPORT_COMPETITIONS', ['PL', 'PD'])
+    monkeypatch.setattr(import_data, 'IMPORT_SEASONS', ['2023', '2024'])
+    monkeypatch.setitem(import_pipeline.PIPELINE_CONFIG, 'batch_size', 2)
+    ratings_calls = []
+    monkeypatch.setattr(import_data, 'update_ratings', lambda conn, since: ratings_calls.append(since))
+    raw = engine.raw_connection()
+    yield raw, engine, ratings_calls
+    raw.close()
+
+
+def scalar(engine, sql):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(sql).scalar()
+
+
+def new_run(conn, full=False):
+    pages = import_data.plan_pages(conn, CODES, full)
+    return start_run(conn, 'full' if full else 'incremental', pages)
+
+
+def import_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('import-')]
+
+
+def wait_for_threads(timeout=2):
+    deadline = time.monotonic() + timeout
+    while import_threads() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return import_threads()
+
+
+PL_2024 = [api_match(1000 + i, f"2024-05-{10 + i:02d}", 1 + i % 3, 4 + i % 3,
+                     updated=f"2024-05-{11 + i:02d}T09:00:00Z") for i in range(5)]
+RESPONSES = {
+    'PL:2023': [api_match(1100, '2024-05-02', 2, 3, updated='2024-05-03T08:00:00Z')],
+    'PL:2024': PL_2024,
+    'PD:2023': [],
+    # Partido aún sin jugar: cuenta para lastUpdated, no para la última fecha terminada
+    'PD:2024': [api_match(1200, '2024-05-05', 5, 6), api_match(1201, '2024-06-01', 1, 2, score=(None, None),
+                                                               status='SCHEDULED', updated='2024-05-25T10:00:00Z')]
+}
+
+
+def test_upsert_keeps_existing_values_for_nulls(star_db):
+    engine, _ = star_db
+    conn = DbApiConnection(engine.raw_connection())
+    stats = dict.fromkeys(TABLE_COLUMNS['dim_match_stats'])
+    bulk_upsert(conn, 'dim_match_stats', [dict(stats, id=9001, possession_home=55.0, shots_home=4)])
+    # La API gratuita no trae estadísticas: un NULL nuevo no borra el valor guardado
+    bulk_upsert(conn, 'dim_match_stats', [dict(stats, id=9001, shots_home=6)])
+
+    with engine.connect() as sql:
+        row = sql.exec_driver_sql("SELECT possession_home, shots_home FROM dim_match_stats WHERE id = 9001").one()
+    assert tuple(row) == (55.0, 6)
+
+
+def test_upsert_moves_postponed_match(star_db):
+    engine, matches = star_db
+    conn = DbApiConnection(engine.raw_connection())
+    original = matches.iloc[0]
+    moved = date(2024, 6, 30)
+    bulk_upsert(conn, 'facts_matches', [{
+        'id': int(original['id']), 'home_team_id': int(original['home_team_id']),
+        'away_team_id': int(original['away_team_id']), 'competition_id': int(original['competition_id']),
+        'date_id': moved, 'stats_id': int(original['id']), 'home_score': None, 'away_score': None,
+        'status': 'POSTPONED', 'stage': 'REGULAR_SEASON'
+    }])
+
+    with engine.connect() as sql:
+        rows = sql.exec_driver_sql(
+            "SELECT date_id, home_score, away_score, status FROM facts_matches WHERE id = ?", (int(original['id']),)
+        ).all()
+    # Una sola fila, en la fecha nueva: el marcador de la fecha anterior no se conserva
+    assert [tuple(row) for row in rows] == [(moved.isoformat(), None, None, 'POSTPONED')]
+
+
+def test_plan_pages_from_watermark(importer):
+    raw, _, _ = importer
+    conn = DbApiConnection(raw)
+    import_data.save_watermark(conn, 1, datetime(2024, 5, 1, 12), date(2024, 4, 30))
+
+    pages = {page['page_key']: page for page in import_data.plan_pages(conn, dict(CODES, XX=99))}
+
+    # PL sigue su marca de agua con una sola ventana de fechas; PD aún no tiene y recorre las temporadas
+    assert sorted(pages) == ['PD:2023', 'PD:2024', 'PL:actual']
+    assert pages['PL:actual']['params'] == {
+        'dateFrom': (date(2024, 4, 30) - timedelta(days=import_data.IMPORT_LOOKBACK_DAYS)).isoformat(),
+        'dateTo': (date.today() + timedelta(days=import_data.IMPORT_AHEAD_DAYS)).isoformat()
+    }
+    assert pages['PL:actual']['since_updated'] == datetime(2024, 5, 1, 12)
+    assert pages['PD:2023']['params'] == {'season': '2023'}
+    assert pages['PD:2023']['since_updated'] is None
+    # --full ignora las marcas de agua
+    assert sorted(page['page_key'] for page in import_data.plan_pages(conn, CODES, full=True)) == [
+        'PD:2023', 'PD:2024', 'PL:2023', 'PL:2024']
+    assert import_data.match_params(date(2024, 4, 30), full=True) == {}
+
+
+def test_run_loads_matches_and_advances_watermarks(importer):
+    raw, engine, ratings_calls = importer
+    conn = DbApiConnection(raw)
+    before = scalar(engine, "SELECT COUNT(*) FROM facts_matches")
+
+    run_id = new_run(conn)
+    import_data.execute_run(conn, FakeClient(RESPONSES), run_id)
+
+    assert scalar(engine, "SELECT COUNT(*) FROM facts_matches") == before + 8
+    assert scalar(engine, f"SELECT status FROM import_runs WHERE id = {run_id}") == 'done'
+    assert import_data.get_watermark(conn, 1) == (datetime(2024, 5, 15, 9), date(2024, 5, 14))
+    assert import_data.get_watermark(conn, 2) == (datetime(2024, 5, 25, 10), date(2024, 5, 5))
+    assert ratings_calls == [date(2024, 5, 2)]
+    # Los resúmenes del rango cambiado incluyen los partidos nuevos
+    assert scalar(engine, "SELECT SUM(matches) FROM agg_team_day WHERE is_home = 1") == scalar(
+        engine, "SELECT COUNT(*) FROM facts_matches WHERE home_score IS NOT NULL")
+
+    # Siguiente importación con las mismas respuestas: nada cambió desde la marca de agua
+    again = new_run(conn)
+    import_data.execute_run(conn, FakeClient({'PL:actual': PL_2024, 'PD:actual': RESPONSES['PD:2024']}), again)
+    assert ratings_calls == [date(2024, 5, 2)]
+    assert import_data.get_watermark(conn, 1) == (datetime(2024, 5, 15, 9), date(2024, 5, 14))
+
+
+def test_pending_pages_keep_watermark_until_resumed(importer):
+    raw, engine, ratings_calls = importer
+    conn = DbApiConnection(raw)
+    run_id = new_run(conn)
+
+    failing = dict(RESPONSES, **{'PL:2023': ConnectionError('timeout')})
+    import_data.execute_run(conn, FakeClient(failing), run_id)
+
+    # PL tiene una página pendiente: su marca de agua no avanza; PD sí
+    assert import_data.get_watermark(conn, 1) == (None, None)
+    assert import_data.get_watermark(conn, 2) == (datetime(2024, 5, 25, 10), date(2024, 5, 5))
+    assert scalar(engine, f"SELECT status FROM import_runs WHERE id = {run_id}") == 'failed'
+    assert scalar(engine, f"SELECT error FROM import_pages WHERE run_id = {run_id} AND page_key = 'PL:2023'") \
+        == 'timeout'
+
+    assert [row[0] for row in unfinished_runs(conn)] == [run_id]
+    assert resume_run(conn, run_id)
+    assert [page['page_key'] for page in run_pages(conn, run_id)] == ['PL:2023']
+    import_data.execute_run(conn, FakeClient(RESPONSES), run_id)
+
+    assert import_data.get_watermark(conn, 1) == (datetime(2024, 5, 15, 9), date(2024, 5, 14))
+    assert scalar(engine, f"SELECT status FROM import_runs WHERE id = {run_id}") == 'done'
+    assert unfinished_runs(conn) == []
+
+
+def test_interrupted_run_resumes_after_last_checkpoint(importer, monkeypatch):
+    raw, engine, _ = importer
+    written = []
+    load = import_pipeline.bulk_load
+
+    def counting_load(conn, table, rows, *args, **kwargs):
+        if table == 'facts_matches':
+            written.extend(row['id'] for row in rows)
+        return load(conn, table, rows, *args, **kwargs)
+
+    monkeypatch.setattr(import_pipeline, 'bulk_load', counting_load)
+    responses = {'PL:2023': [], 'PL:2024': PL_2024, 'PD:2023': [], 'PD:2024': []}
+    before = scalar(engine, "SELECT COUNT(*) FROM facts_matches")
+    run_id = new_run(DbApiConnection(raw))
+
+    # Páginas en orden: PD:2023, PD:2024, PL:2023 y luego los lotes de PL:2024; falla el commit del segundo lote
+    flaky = FlakyConnection(raw, fail_at=5)
+    with pytest.raises(RuntimeError):
+        run_pipeline(flaky, FakeClient(responses), run_id, run_pages(flaky, run_id), report=lambda message: None)
+    # La escritura falló: las etapas de descarga y normalización se detienen
+    assert wait_for_threads() == []
+
+    conn = DbApiConnection(raw)
+    assert scalar(engine, "SELECT COUNT(*) FROM facts_matches") == before + 2
+    assert scalar(engine, f"SELECT batches_done FROM import_pages WHERE run_id = {run_id} AND page_key = 'PL:2024'") \
+        == 1
+    assert [row[0] for row in unfinished_runs(conn)] == [run_id]
+
+    written.clear()
+    assert resume_run(conn, run_id)
+    import_data.execute_run(conn, FakeClient(responses), run_id)
+
+    # Solo se escriben los lotes posteriores al último confirmado, sin duplicados
+    assert written == [1002, 1003, 1004]
+    assert scalar(engine, "SELECT COUNT(*) FROM facts_matches") == before + 5
+    assert scalar(engine, "SELECT COUNT(DISTINCT id) FROM facts_matches") == before + 5
+    assert import_data.get_watermark(conn, 1) == (datetime(2024, 5, 15, 9), date(2024, 5, 14))
+    assert scalar(engine, f"SELECT status FROM import_runs WHERE id = {run_id}") == 'done'
+
+
+def test_stop_event_ends_stage_threads():
+    stop = threading.Event()
+
+    def endless():
+        number = 0
+        while True:
+            number += 1
+            yield number
+
+    stage = run_in_thread(endless(), stop, maxsize=2, name='test')
+    assert next(stage) == 1
+    stop.set()
+    # El consumidor vacía lo que quedaba en la cola y termina; el productor deja de entregar
+    assert len(list(stage)) <= 3
+    assert wait_for_threads() == []
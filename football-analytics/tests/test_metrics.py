@@ -0,0 +1,118 @@
+"""/metrics reúne los ficheros de todos los workers y el perfilado por petición va tras un flag."""
+import os
+import json
+import pytest
+from flask import Flask
+import metrics
+
+
+def dead_pid():
+    pid = 999999
+    while metrics._process_alive(pid):
+        pid -= 1
+    return pid
+
+
+@pytest.fixture
+def multiprocess(tmp_path, monkeypatch):
+    histogram = metrics.Histogram('test_request_seconds', 'Duración de prueba', ['endpoint'], buckets=[0.1, 1])
+    monkeypatch.setitem(metrics.METRICS_CONFIG, 'multiprocess_dir', str(tmp_path))
+    monkeypatch.setitem(metrics.METRICS_CONFIG, 'flush_interval', 3600)
+    monkeypatch.setattr(metrics, '_flusher', {'pid': None, 'token': None})
+    monkeypatch.setattr(metrics, 'HISTOGRAMS', [histogram])
+    monkeypatch.setattr(metrics, '_collectors', [lambda: [
+        ('test_events_total', 'Eventos', 'counter', [({'event': 'checkout'}, 2)]),
+        ('test_pool', 'Conexiones', 'gauge', [({}, 3)])
+    ]])
+    return tmp_path, histogram
+
+
+def write_worker(directory, pid, observations, events, pool):
+    state = {
+        'pid': pid,
+        'histograms': {'test_request_seconds': [
+            [['/'], {'counts': [observations, observations, observations], 'sum': observations * 0.05,
+                     'count': observations}]
+        ]},
+        'families': [
+            ['test_events_total', 'Eventos', 'counter', [[{'event': 'checkout'}, events]]],
+            ['test_pool', 'Conexiones', 'gauge', [[{}, pool]]]
+        ]
+    }
+    with open(os.path.join(directory, f"{pid}-otro.json"), 'w') as f:
+        json.dump(state, f)
+
+
+def test_render_merges_all_workers(multiprocess):
+    directory, histogram = multiprocess
+    histogram.observe(0.5, endpoint='/')
+    write_worker(directory, os.getppid(), observations=4, events=10, pool=7)
+    write_worker(directory, dead_pid(), observations=6, events=5, pool=9)
+
+    lines = metrics.render_metrics().splitlines()
+
+    assert 'test_request_seconds_count{endpoint="/"} 11' in lines
+    assert 'test_request_seconds_bucket{endpoint="/",le="0.1"} 10' in lines
+    assert 'test_request_seconds_bucket{endpoint="/",le="+Inf"} 11' in lines
+    # Los contadores incluyen los del worker terminado; los gauges solo los vivos, por pid
+    assert 'test_events_total{event="checkout"} 17.0' in lines
+    gauges = sorted(line for line in lines if line.startswith('test_pool{'))
+    assert gauges == sorted([f'test_pool{{pid="{os.getpid()}"}} 3.0', f'test_pool{{pid="{os.getppid()}"}} 7.0'])
+
+
+def test_render_flushes_own_state(multiprocess):
+    directory, histogram = multiprocess
+    histogram.observe(0.05, endpoint='/')
+    metrics.render_metrics()
+    files = [name for name in os.listdir(directory) if name.endswith('.json')]
+    assert files == [f"{os.getpid()}-{metrics._flusher['token']}.json"]
+
+
+def test_single_process_without_directory(monkeypatch):
+    histogram = metrics.Histogram('test_local_seconds', 'Duración local', buckets=[1])
+    monkeypatch.setitem(metrics.METRICS_CONFIG, 'multiprocess_dir', '')
+    monkeypatch.setattr(metrics, 'HISTOGRAMS', [histogram])
+    monkeypatch.setattr(metrics, '_collectors', [])
+    histogram.observe(0.5)
+    assert 'test_local_seconds_count 1' in metrics.render_metrics().splitlines()
+
+
+@pytest.mark.parametrize('allowed', [False, True])
+def test_profile_header_needs_flag(monkeypatch, allowed):
+    monkeypatch.setitem(metrics.METRICS_CONFIG, 'profile_enabled', False)
+    monkeypatch.setitem(metrics.METRICS_CONFIG, 'profile_requests', allowed)
+    app = Flask(__name__)
+    with app.test_request_context('/', headers={'X-Profile': '1'}):
+        assert metrics._profile_requested() is allowed
+    with app.test_request_context('/', headers={'Cookie': 'profile=1'}):
+        assert metrics._profile_requested() is allowed
+
+
+def test_background_job_in_forked_child_is_reported(multiprocess, monkeypatch):
+    directory, histogram = multiprocess
+    callbacks = metrics.Histogram('test_callback_seconds', 'Callbacks de prueba', ['callback'], buckets=[1])
+    monkeypatch.setattr(metrics, 'CALLBACK_SECONDS', callbacks)
+    monkeypatch.setattr(metrics, 'HISTOGRAMS', [histogram, callbacks])
+
+    @metrics.instrumented('graph_job')
+    def job():
+        with metrics.span('graph_layout'):
+            pass
+
+    for _ in range(2):
+        pid = os.fork()
+        if pid == 0:
+            # Como el DiskcacheManager de Dash: el proceso del trabajo sale con os._exit
+            job()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+    lines = metrics.render_metrics().splitlines()
+    assert 'test_callback_seconds_count{callback="graph_job"} 2' in lines
+
+    # Los volcados de los trabajos terminados quedan sumados en un solo fichero
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    assert files == sorted([metrics.AGGREGATE_FILE, f"{os.getpid()}-{metrics._flusher['token']}.json"])
+    job()
+    lines = metrics.render_metrics().splitlines()
+    assert 'test_callback_seconds_count{callback="graph_job"} 3' in lines
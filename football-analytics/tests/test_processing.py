@@ -0,0 +1,76 @@
+"""El esquema compacto de partidos: tipos reducidos, diccionario de equipos común y columnas derivadas."""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import TEAMS
+from processing import RESULT_DTYPE, classify_results, derived_column, process_match_data, with_derived
+from queries import build_match_query
+
+
+def legacy_process(df):
+    """Cálculo anterior al esquema compacto: columnas object/int64 guardadas en el DataFrame"""
+    df['match_date'] = pd.to_datetime(df['match_date'])
+    df['result'] = classify_results(df['home_score'], df['away_score'])
+    df['total_goals'] = df['home_score'] + df['away_score']
+    df['possession_away'] = 100 - df['possession_home']
+    return df
+
+
+@pytest.fixture
+def raw_matches(star_db):
+    engine, _ = star_db
+    query, params = build_match_query()
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn, params=params)
+    # Tiros a puerta en la mitad de los partidos: una columna completa y otra con nulos
+    df['shots_on_target_home'] = np.arange(len(df)) % 7
+    df['shots_on_target_away'] = np.where(np.arange(len(df)) % 2, 3, np.nan)
+    return df
+
+
+def test_compact_dtypes(raw_matches):
+    df = process_match_data(raw_matches.copy())
+
+    assert df['home_score'].dtype == 'int8'
+    assert df['away_score'].dtype == 'int8'
+    assert df['shots_on_target_home'].dtype == 'int16'
+    # Con nulos no cabe en un entero: float32
+    assert df['shots_on_target_away'].dtype == 'float32'
+    assert df['possession_home'].dtype == 'float32'
+    assert df['competition'].dtype == 'category'
+    assert df['result'].dtype == RESULT_DTYPE
+    assert 'total_goals' not in df and 'possession_away' not in df
+
+
+def test_home_and_away_share_team_categories(raw_matches):
+    df = process_match_data(raw_matches.copy())
+
+    categories = df['home_team'].cat.categories
+    assert categories.equals(df['away_team'].cat.categories)
+    assert list(categories) == sorted(TEAMS.values())
+    # Mismo código, mismo equipo en las dos columnas
+    assert (categories[df['home_team'].cat.codes] == raw_matches['home_team']).all()
+    assert (categories[df['away_team'].cat.codes] == raw_matches['away_team']).all()
+
+
+def test_derived_columns_match_legacy_computation(raw_matches):
+    legacy = legacy_process(raw_matches.copy())
+    df = process_match_data(raw_matches.copy())
+
+    assert (df['result'].astype(str).to_numpy() == legacy['result'].to_numpy()).all()
+    assert (derived_column(df, 'total_goals').to_numpy() == legacy['total_goals'].to_numpy()).all()
+    np.testing.assert_allclose(derived_column(df, 'possession_away').to_numpy(dtype='float64'),
+                               legacy['possession_away'].to_numpy(dtype='float64'), rtol=1e-6, equal_nan=True)
+
+    extended = with_derived(df, 'total_goals', 'possession_away')
+    assert list(extended.columns) == list(df.columns) + ['total_goals', 'possession_away']
+    assert 'total_goals' not in df
+
+
+def test_total_goals_does_not_overflow_int8():
+    df = process_match_data(pd.DataFrame({
+        'home_team': ['A'], 'away_team': ['B'], 'home_score': [100], 'away_score': [90],
+        'possession_home': [50.0], 'match_date': ['2024-01-01']
+    }))
+    assert df['home_score'].dtype == 'int8'
+    assert derived_column(df, 'total_goals').iloc[0] == 190
@@ -0,0 +1,85 @@
+"""Traducción del filter_query de la tabla de detalle a SQL y filtros del dashboard en SQL y en memoria."""
+import json
+import pandas as pd
+import pytest
+from processing import process_match_data
+from queries import (
+    split_filter_part, build_table_filters, build_match_query, normalize_filters, filters_from_store,
+    filter_hash, to_date_key, SNAPSHOT_QUERY
+)
+from snapshot import build_snapshot_frame, filter_snapshot
+
+
+@pytest.mark.parametrize('part, expected', [
+    ('{home_score} ge 2', ('home_score', 'ge', 2.0)),
+    ('{home_score} >= 2', ('home_score', 'ge', 2.0)),
+    ('{away_score} < 1', ('away_score', 'lt', 1.0)),
+    ('{total_goals} eq 3', ('total_goals', 'eq', 3.0)),
+    ('{home_team} eq Getafe', ('home_team', 'eq', 'Getafe')),
+    ('{home_team} ne "Real Madrid"', ('home_team', 'ne', 'Real Madrid')),
+    # contains y datestartswith no convierten a número
+    ('{competition} contains 002', ('competition', 'contains', '002')),
+    ('{match_date} datestartswith 2000', ('match_date', 'datestartswith', '2000')),
+    # Los textos con "ge "/"ne " dentro del valor no cambian el operador
+    ('{home_team} contains Orange County', ('home_team', 'contains', 'Orange County')),
+    ('{competition} contains Premier League', ('competition', 'contains', 'Premier League')),
+    ("{home_team} eq 'O\\'Higgins'", ('home_team', 'eq', "O'Higgins")),
+    ('{home_team} unknown x', (None, None, None)),
+    ('sin columna', (None, None, None))
+])
+def test_split_filter_part(part, expected):
+    assert split_filter_part(part) == expected
+
+
+def test_build_table_filters_keeps_like_values_as_text():
+    conditions, params = build_table_filters(
+        '{competition} contains 002 && {match_date} datestartswith 2000 && {home_score} gt 1'
+    )
+    assert conditions == ['c.name LIKE :tf_0', 'fm.date_id LIKE :tf_1', 'fm.home_score > :tf_2']
+    assert params == {'tf_0': '%002%', 'tf_1': '2000%', 'tf_2': 1.0}
+
+
+def test_build_table_filters_skips_unknown_columns():
+    assert build_table_filters('{secret} eq 1') == ([], {})
+
+
+def comparable(df):
+    """Categorías como texto: la instantánea conserva todo el diccionario y la consulta solo el filtrado"""
+    return df.assign(**{name: df[name].astype(str) for name in df.columns
+                        if isinstance(df[name].dtype, pd.CategoricalDtype)}).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('start_date, end_date, competitions, teams', [
+    (None, None, None, None),
+    (None, None, [], []),
+    ('2024-02-01', None, [], None),
+    (None, '2024-03-15T00:00:00', None, []),
+    ('2024-02-01', '2024-03-31', ['2'], None),
+    (None, None, [1, 2], [3]),
+    ('2024-01-20', '2024-04-15', [], [2, 1]),
+    ('2024-03-01', '2024-03-10', [1], ['6', 4, 2])
+])
+def test_sql_and_snapshot_filters_return_same_rows(star_db, start_date, end_date, competitions, teams):
+    engine, _ = star_db
+    filters = normalize_filters(start_date, end_date, competitions, teams)
+    # Ida y vuelta por el dcc.Store (JSON): las tuplas llegan como listas
+    store = json.loads(json.dumps({'key': filter_hash(filters), 'filters': filters}))
+    filters = filters_from_store(store['filters'])
+
+    with engine.connect() as conn:
+        query, params = build_match_query(*filters)
+        from_sql = process_match_data(pd.read_sql(query, conn, params=params))
+        snapshot = build_snapshot_frame(pd.read_sql(SNAPSHOT_QUERY, conn))
+    from_snapshot = filter_snapshot(snapshot, filters)
+
+    assert len(from_sql) > 0
+    pd.testing.assert_frame_equal(comparable(from_snapshot), comparable(from_sql))
+
+
+def test_normalized_filters_are_stable_cache_keys():
+    a = normalize_filters('2024-02-01T00:00:00', '2024-03-31', ['2', 1], [5, '3'])
+    b = normalize_filters('2024-02-01', '2024-03-31', [1, 2], [3, 5])
+    assert a == b == (20240201, 20240331, (1, 2), (3, 5))
+    assert filter_hash(a) == filter_hash(list(a))
+    assert normalize_filters(None, None, [], None) == (None, None, (), ())
+    assert to_date_key('2024-12-31') == 20241231
@@ -0,0 +1,155 @@
+"""Ratings dispersos: filas solo para equipos que cambian y ranking "a fecha" por la última fila de cada equipo."""
+import random
+import sqlite3
+from datetime import date, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from conftest import DbApiConnection, DbApiCursor
+import ratings
+
+TEAM_COUNT = 12
+DAYS = 90
+RATINGS_SCHEMA = [
+    "CREATE TABLE dim_teams (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+    "CREATE TABLE facts_matches (id INTEGER PRIMARY KEY, home_team_id INT, away_team_id INT, competition_id INT, "
+    "date_id DATE, home_score INT, away_score INT)",
+    "CREATE TABLE team_ratings (date_id DATE NOT NULL, team_id INT NOT NULL, elo DOUBLE NOT NULL, "
+    "pagerank DOUBLE NOT NULL, matches INT NOT NULL, PRIMARY KEY (date_id, team_id))"
+]
+CONFIG = dict(ratings.RATINGS_CONFIG, tolerance=1e-10, chunk_size=37, batch_size=50)
+
+
+def _dates(row):
+    return tuple(date.fromisoformat(v) if isinstance(v, str) else v for v in row)
+
+
+class DateCursor(DbApiCursor):
+    """Devuelve las fechas como date, igual que mysql-connector"""
+
+    def fetchall(self):
+        return [_dates(row) for row in super().fetchall()]
+
+    def fetchone(self):
+        row = super().fetchone()
+        return None if row is None else _dates(row)
+
+
+class DateConnection(DbApiConnection):
+    def cursor(self):
+        return DateCursor(self._conn.cursor())
+
+
+def generate_fixtures(seed=3):
+    """Uno o dos partidos al día entre 12 equipos: la mayoría no juega cada día"""
+    rng = random.Random(seed)
+    rows, match_id = [], 0
+    for offset in range(DAYS):
+        day = date(2024, 1, 1) + timedelta(days=offset)
+        for _ in range(rng.choice([1, 2])):
+            match_id += 1
+            home, away = rng.sample(range(1, TEAM_COUNT + 1), 2)
+            rows.append((match_id, home, away, 1, day, rng.randrange(4), rng.randrange(4)))
+    return pd.DataFrame(rows, columns=['id', 'home_team_id', 'away_team_id', 'competition_id', 'date_id',
+                                       'home_score', 'away_score'])
+
+
+@pytest.fixture
+def ratings_db(tmp_path):
+    path = tmp_path / 'ratings.db'
+    matches = generate_fixtures()
+    raw = sqlite3.connect(path)
+    for ddl in RATINGS_SCHEMA:
+        raw.execute(ddl)
+    raw.executemany("INSERT INTO dim_teams VALUES (?, ?)", [(t, f"Equipo {t}") for t in range(1, TEAM_COUNT + 1)])
+    raw.executemany("INSERT INTO facts_matches VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(*row[:4], row[4].isoformat(), *row[5:]) for row in matches.itertuples(index=False)])
+    raw.commit()
+    yield DateConnection(raw), create_engine(f"sqlite:///{path}"), matches
+    raw.close()
+
+
+def replay(matches, end):
+    """Estado exacto reproduciendo todos los partidos hasta `end`"""
+    engine = ratings.RatingEngine(CONFIG)
+    played = matches[matches['date_id'] <= end]
+    for _, day_matches in played.groupby('date_id'):
+        for row in day_matches.itertuples():
+            engine.play(row.home_team_id, row.away_team_id, row.home_score, row.away_score)
+        engine.update_pagerank()
+    return {team_id: (engine.elo[i], float(engine.pagerank[i]), engine.matches[i])
+            for i, team_id in enumerate(engine.team_ids)}
+
+
+def ranking(engine, filters):
+    query, params = ratings.build_ranking_query(filters, limit=100)
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params=params).set_index('team').sort_index()
+
+
+def test_rows_only_for_teams_that_changed(ratings_db):
+    conn, engine, matches = ratings_db
+    ratings.update_ratings(conn, None, CONFIG)
+    stored = pd.read_sql("SELECT * FROM team_ratings ORDER BY team_id, date_id", engine)
+
+    # Menos filas que una por día y equipo que ya ha jugado
+    first_played = pd.concat([matches[['date_id', 'home_team_id']].set_axis(['date_id', 'team'], axis=1),
+                              matches[['date_id', 'away_team_id']].set_axis(['date_id', 'team'], axis=1)])
+    first_played = first_played.groupby('team')['date_id'].min()
+    days = sorted(matches['date_id'].unique())
+    dense = sum(int((first_played <= day).sum()) for day in days)
+    assert len(stored) < 0.75 * dense
+    # Todo equipo que jugó un día tiene fila ese día
+    played = set(zip(matches['date_id'].astype(str), matches['home_team_id'])) | set(
+        zip(matches['date_id'].astype(str), matches['away_team_id']))
+    assert played <= set(zip(stored['date_id'].astype(str), stored['team_id']))
+    # Entre dos filas seguidas de un equipo sin partidos, el PageRank se movió más de la tolerancia
+    for _, team_rows in stored.groupby('team_id'):
+        previous = team_rows.shift()
+        idle = (team_rows['matches'] == previous['matches']).to_numpy()
+        moved = ((team_rows['pagerank'] - previous['pagerank']).abs()
+                 > CONFIG['pagerank_store_tolerance'] * previous['pagerank']).to_numpy()
+        assert (moved[idle]).all()
+
+
+@pytest.mark.parametrize('end_key', [20240110, 20240205, 20240229, None])
+def test_as_of_ranking_uses_latest_row_per_team(ratings_db, end_key):
+    conn, engine, matches = ratings_db
+    ratings.update_ratings(conn, None, CONFIG)
+    end = ratings.key_to_date(end_key) if end_key else matches['date_id'].max()
+    expected = replay(matches, end)
+
+    result = ranking(engine, (None, end_key, (), ()))
+
+    assert len(result) == len(expected)
+    for team_id, (elo, pagerank, played) in expected.items():
+        row = result.loc[f"Equipo {team_id}"]
+        assert row['elo'] == pytest.approx(elo, abs=1e-9)
+        assert row['matches'] == played
+        assert row['pagerank'] == pytest.approx(pagerank, rel=2 * CONFIG['pagerank_store_tolerance'])
+        assert row['elo_change'] == pytest.approx(elo - CONFIG['initial'], abs=1e-9)
+
+
+def test_elo_change_from_latest_row_before_start(ratings_db):
+    conn, engine, matches = ratings_db
+    ratings.update_ratings(conn, None, CONFIG)
+    before = replay(matches, date(2024, 1, 31))
+    after = replay(matches, date(2024, 2, 29))
+
+    result = ranking(engine, (20240201, 20240229, (), ()))
+
+    for team_id, (elo, _, _) in after.items():
+        baseline = before[team_id][0] if team_id in before else CONFIG['initial']
+        assert result.loc[f"Equipo {team_id}", 'elo_change'] == pytest.approx(elo - baseline, abs=1e-9)
+
+
+def test_incremental_update_matches_rebuild(ratings_db):
+    conn, engine, matches = ratings_db
+    ratings.update_ratings(conn, None, CONFIG)
+    rebuilt = pd.read_sql("SELECT * FROM team_ratings ORDER BY date_id, team_id", engine)
+
+    ratings.update_ratings(conn, date(2024, 2, 10), CONFIG)
+    resumed = pd.read_sql("SELECT * FROM team_ratings ORDER BY date_id, team_id", engine)
+
+    pd.testing.assert_frame_equal(resumed.drop(columns='pagerank'), rebuilt.drop(columns='pagerank'))
+    assert resumed['pagerank'].to_numpy() == pytest.approx(rebuilt['pagerank'].to_numpy(), rel=1e-6)
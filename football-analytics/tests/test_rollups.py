@@ -0,0 +1,126 @@
+"""Los KPIs y el grafo de victorias desde los resúmenes coinciden con los partidos."""
+import math
+import pandas as pd
+import pytest
+from conftest import TEAMS
+from rollups import build_kpi_queries, combine_kpis, build_head_to_head_queries, _month_bounds
+
+
+def select_matches(matches, filters):
+    start_key, end_key, competition_ids, team_ids = filters
+    keys = matches['date_id'].map(lambda d: d.year * 10000 + d.month * 100 + d.day)
+    mask = pd.Series(True, index=matches.index)
+    if start_key is not None:
+        mask &= keys >= start_key
+    if end_key is not None:
+        mask &= keys <= end_key
+    if competition_ids:
+        mask &= matches['competition_id'].isin(competition_ids)
+    if team_ids:
+        mask &= matches['home_team_id'].isin(team_ids) | matches['away_team_id'].isin(team_ids)
+    return matches[mask]
+
+
+def rollup_kpis(engine, filters):
+    with engine.connect() as conn:
+        rows = [
+            (conn.execute(query, params).mappings().one(), sign)
+            for query, params, sign in build_kpi_queries(filters)
+        ]
+    return combine_kpis(rows)
+
+
+@pytest.mark.parametrize('filters', [
+    (None, None, (), ()),
+    (20240201, 20240331, (), ()),
+    (None, None, (1,), ()),
+    (None, None, (), (3,)),
+    (20240120, 20240415, (), (1, 2)),
+    (None, None, (2,), (1, 2, 5)),
+    (20240301, 20240310, (1, 2), (2, 4, 6))
+])
+def test_kpis_match_raw_matches(star_db, filters):
+    engine, matches = star_db
+    expected = select_matches(matches, filters)
+    kpis = rollup_kpis(engine, filters)
+
+    assert kpis['total_matches'] == len(expected)
+    assert kpis['home_win_rate'] == pytest.approx((expected['home_score'] > expected['away_score']).mean() * 100)
+    assert kpis['goals_per_match'] == pytest.approx((expected['home_score'] + expected['away_score']).mean())
+    possession = expected['possession_home'].dropna()
+    if possession.empty:
+        assert math.isnan(kpis['avg_possession'])
+    else:
+        assert kpis['avg_possession'] == pytest.approx(possession.mean())
+
+
+def test_overlap_correction_removes_matches_between_selected_teams(star_db):
+    engine, matches = star_db
+    filters = (None, None, (), (1, 2))
+    queries = build_kpi_queries(filters)
+    assert [sign for _, _, sign in queries] == [1, -1]
+
+    with engine.connect() as conn:
+        team_rows = conn.execute(queries[0][0], queries[0][1]).mappings().one()
+    between = matches[matches['home_team_id'].isin([1, 2]) & matches['away_team_id'].isin([1, 2])]
+    # Sin la corrección, cada partido entre los dos equipos se contaría dos veces
+    assert len(between) > 0
+    assert team_rows['matches'] == len(select_matches(matches, filters)) + len(between)
+    assert rollup_kpis(engine, filters)['total_matches'] == len(select_matches(matches, filters))
+
+
+def test_single_team_needs_no_correction():
+    assert len(build_kpi_queries((None, None, (), (3,)))) == 1
+    assert len(build_kpi_queries((None, None, (), ()))) == 1
+
+
+def rollup_head_to_head(engine, filters):
+    with engine.connect() as conn:
+        parts = [pd.read_sql(query, conn, params=params) for query, params in build_head_to_head_queries(filters)]
+    result = pd.concat(parts, ignore_index=True)
+    return result.groupby(['home_team', 'away_team'])[['home_wins', 'away_wins']].sum().astype(int).sort_index()
+
+
+def expected_head_to_head(matches, filters):
+    selected = select_matches(matches, filters)
+    return pd.DataFrame({
+        'home_team': selected['home_team_id'].map(TEAMS),
+        'away_team': selected['away_team_id'].map(TEAMS),
+        'home_wins': (selected['home_score'] > selected['away_score']).astype(int),
+        'away_wins': (selected['home_score'] < selected['away_score']).astype(int)
+    }).groupby(['home_team', 'away_team'])[['home_wins', 'away_wins']].sum().astype(int).sort_index()
+
+
+@pytest.mark.parametrize('filters', [
+    (None, None, (), ()),
+    (20240120, 20240310, (), ()),      # días sueltos en los dos extremos
+    (20240205, 20240220, (), ()),      # dentro de un solo mes
+    (20240201, 20240331, (), ()),      # meses completos exactos
+    (20240201, 20240315, (), ()),      # empieza el día 1, termina a mitad de mes
+    (20240116, 20240229, (), ()),      # termina el último día de un febrero bisiesto
+    (20231215, 20240131, (), ()),      # cruza el cambio de año
+    (None, 20240310, (), ()),
+    (20240120, None, (), ()),
+    (20240120, 20240410, (1,), (2, 5))
+])
+def test_head_to_head_matches_raw_matches(star_db, filters):
+    engine, matches = star_db
+    pd.testing.assert_frame_equal(rollup_head_to_head(engine, filters), expected_head_to_head(matches, filters))
+
+
+def test_head_to_head_splits_partial_months():
+    # Meses completos desde agg_head_to_head y un tramo de facts_matches por cada extremo
+    assert len(build_head_to_head_queries((20240120, 20240310, (), ()))) == 3
+    assert len(build_head_to_head_queries((20240201, 20240331, (), ()))) == 1
+    assert len(build_head_to_head_queries((20240205, 20240220, (), ()))) == 1
+
+
+@pytest.mark.parametrize('start_key, end_key, expected', [
+    (20240101, 20240131, (202401, 202401)),
+    (20240102, 20240130, (202402, 202312)),
+    (20231215, 20240229, (202401, 202402)),
+    (20241203, 20250115, (202501, 202412)),
+    (None, None, (None, None))
+])
+def test_month_bounds(start_key, end_key, expected):
+    assert _month_bounds(start_key, end_key) == expected
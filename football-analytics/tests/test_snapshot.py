@@ -0,0 +1,35 @@
+"""La instantánea se vuelve a abrir cuando se reescribe para la versión que ya se consultó."""
+import pandas as pd
+import pytest
+import snapshot
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot')
+    monkeypatch.setitem(snapshot.SNAPSHOT_CONFIG, 'dir', path)
+    monkeypatch.setitem(snapshot.SNAPSHOT_CONFIG, 'enabled', True)
+    monkeypatch.setattr(snapshot, '_state', {'df': None, 'version': None, 'checked_version': None,
+                                             'checked_mtime': None})
+    return path
+
+
+def frame(rows):
+    return pd.DataFrame({'home_score': list(range(rows)), 'competition': ['Liga A'] * rows})
+
+
+def test_snapshot_written_after_version_check_is_used(snapshot_dir):
+    snapshot.export_snapshot(frame(3), 1, snapshot_dir)
+    # Un worker ve la versión 2 antes de que termine la exportación
+    assert snapshot.get_snapshot(2) is None
+    assert snapshot.get_snapshot(2) is None
+    snapshot.export_snapshot(frame(5), 2, snapshot_dir)
+    df = snapshot.get_snapshot(2)
+    assert df is not None and len(df) == 5
+
+
+def test_snapshot_for_current_version_is_kept(snapshot_dir):
+    snapshot.export_snapshot(frame(4), 7, snapshot_dir)
+    first = snapshot.get_snapshot(7)
+    assert first is not None and len(first) == 4
+    assert snapshot.get_snapshot(7) is first
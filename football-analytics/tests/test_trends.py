@@ -0,0 +1,113 @@
+"""La forma vectorizada coincide con rolling()/groupby de pandas sobre los mismos partidos."""
+import numpy as np
+import pandas as pd
+import pytest
+from processing import process_match_data
+from queries import build_match_query
+from trends import TREND_METRICS, rolling_form, slice_form, period_form
+
+WINDOW = 3
+
+
+@pytest.fixture
+def matches(star_db):
+    engine, _ = star_db
+    query, params = build_match_query()
+    with engine.connect() as conn:
+        return process_match_data(pd.read_sql(query, conn, params=params))
+
+
+def naive_team_rows(df):
+    """Filas equipo-partido a mano: primero las de local, después las de visitante"""
+    home = pd.DataFrame({
+        'team': df['home_team'].astype(str), 'match_date': df['match_date'],
+        'goals_for': df['home_score'], 'goals_against': df['away_score'],
+        'possession': df['possession_home']
+    })
+    away = pd.DataFrame({
+        'team': df['away_team'].astype(str), 'match_date': df['match_date'],
+        'goals_for': df['away_score'], 'goals_against': df['home_score'],
+        'possession': 100 - df['possession_home']
+    })
+    rows = pd.concat([home, away], ignore_index=True).astype(
+        {'goals_for': 'float64', 'goals_against': 'float64', 'possession': 'float64'})
+    rows['points'] = np.where(rows['goals_for'] > rows['goals_against'], 3.0,
+                              np.where(rows['goals_for'] == rows['goals_against'], 1.0, 0.0))
+    return rows.sort_values(['team', 'match_date'], kind='stable').reset_index(drop=True)
+
+
+def naive_rolling(df, window):
+    rows = naive_team_rows(df)
+    for name in TREND_METRICS:
+        # rolling() ignora los NaN de la ventana, igual que la posesión que falta
+        rows[f"form_{name}"] = rows.groupby('team')[name].transform(
+            lambda values: values.rolling(window, min_periods=1).mean())
+    return rows
+
+
+def test_rolling_form_matches_pandas_rolling(matches):
+    form = rolling_form(matches, window=WINDOW)
+    expected = naive_rolling(matches, WINDOW)
+
+    assert len(form) == len(expected)
+    assert form['team'].astype(str).tolist() == expected['team'].tolist()
+    assert (form['match_date'].to_numpy() == expected['match_date'].to_numpy()).all()
+    assert (form['window'].to_numpy() == expected.groupby('team').cumcount().clip(upper=WINDOW - 1) + 1).all()
+    for name in TREND_METRICS:
+        np.testing.assert_allclose(form[f"form_{name}"].to_numpy(dtype='float64'),
+                                   expected[f"form_{name}"].to_numpy(), rtol=1e-5, equal_nan=True)
+
+
+def test_slice_keeps_form_from_earlier_matches(matches):
+    form = rolling_form(matches, window=WINDOW)
+    expected = naive_rolling(matches, WINDOW)
+
+    sliced = slice_form(form, 20240301, 20240315)
+
+    in_range = expected[(expected['match_date'] >= '2024-03-01') & (expected['match_date'] < '2024-03-16')]
+    assert len(sliced) == len(in_range)
+    # La forma del primer partido del rango incluye los partidos anteriores al rango
+    np.testing.assert_allclose(sliced['form_points'].to_numpy(dtype='float64'),
+                               in_range['form_points'].to_numpy(), rtol=1e-5)
+    assert slice_form(form).equals(form)
+
+
+@pytest.mark.parametrize('period', ['W', 'M'])
+def test_period_form_matches_groupby(matches, period):
+    form = rolling_form(matches, window=WINDOW)
+    rows = naive_team_rows(matches)
+    rows['period'] = rows['match_date'].dt.to_period(period).dt.start_time
+    expected = rows.groupby(['team', 'period'], sort=True).agg(
+        matches=('points', 'size'), **{name: (name, 'mean') for name in TREND_METRICS}
+    ).reset_index()
+
+    result = period_form(form, period)
+
+    assert result['team'].astype(str).tolist() == expected['team'].tolist()
+    assert (result['period'].to_numpy() == expected['period'].to_numpy()).all()
+    assert result['matches'].tolist() == expected['matches'].tolist()
+    for name in TREND_METRICS:
+        np.testing.assert_allclose(result[name].to_numpy(dtype='float64'), expected[name].to_numpy(),
+                                   rtol=1e-5, equal_nan=True)
+
+
+def test_load_form_computed_once_per_competitions(matches, monkeypatch):
+    import app
+
+    fetched = []
+
+    def fetch(filters, version):
+        fetched.append(filters)
+        return matches
+
+    app.match_cache.clear()
+    monkeypatch.setattr(app, 'get_data_version', lambda: 1)
+    monkeypatch.setattr(app, 'fetch_filtered_data', fetch)
+
+    full = app.load_form((None, None, (1,), ()))
+    by_team = app.load_form((20240301, 20240315, (1,), (2, 3)))
+
+    # Otro filtro de equipos y otro rango: mismo histórico, solo se recorta
+    assert fetched == [(None, None, (1,), ())]
+    assert by_team.equals(slice_form(full, 20240301, 20240315))
+    app.match_cache.clear()
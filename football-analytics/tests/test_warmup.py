@@ -0,0 +1,58 @@
+"""El precalentado se puede cancelar desde cualquier worker y las figuras con error no se cachean."""
+import pytest
+import app
+import background
+
+
+@pytest.fixture
+def version(monkeypatch):
+    app.match_cache.clear()
+    app.figure_cache.clear()
+    monkeypatch.setattr(app, 'get_data_version', lambda: 1)
+    return 1
+
+
+def test_run_warmup_stops_when_cancelled_elsewhere():
+    calls = []
+    cancelled = {'value': False}
+
+    def task(filters):
+        calls.append(filters)
+        cancelled['value'] = True
+
+    finished = background.run_warmup(1, [('a',), ('b',), ('c',)], [task], lambda: 1,
+                                     cancelled=lambda version: cancelled['value'])
+    assert not finished
+    assert calls == [('a',)]
+    assert background.warmup_status()['state'] == 'cancelled'
+
+
+def test_cancel_route_marks_current_version(version, monkeypatch):
+    # La petición pasa por before_request: sin hilo de precalentado real (no hay MySQL)
+    monkeypatch.setattr(app, 'start_warmup', lambda *args, **kwargs: None)
+    assert not app.warmup_cancelled(version)
+    response = app.server.test_client().post('/health/warmup/cancel')
+    assert response.status_code == 200
+    assert 'warmup' in response.get_json()
+    assert app.warmup_cancelled(version)
+    assert background._warmup_cancel.is_set()
+    background._warmup_cancel.clear()
+
+
+def test_error_figure_is_not_cached(version, monkeypatch):
+    attempts = []
+
+    def flaky_builder(filters, progress=None):
+        attempts.append(filters)
+        if len(attempts) == 1:
+            raise RuntimeError('base de datos no disponible')
+        return {'data': [], 'layout': {'title': 'ok'}}
+
+    monkeypatch.setitem(app.FIGURE_BUILDERS, 'goals', flaky_builder)
+    store = {'key': 'k', 'filters': [None, None, [], []]}
+
+    assert app.figure_output('goals', store, lambda message: {'error': message}) == {'error': 'Error al cargar datos'}
+    assert app.figure_output('goals', store, lambda message: {})['layout']['title'] == 'ok'
+    # La segunda figura sí queda en caché
+    assert app.figure_output('goals', store, lambda message: {})['layout']['title'] == 'ok'
+    assert len(attempts) == 2
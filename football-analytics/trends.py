@@ -0,0 +1,168 @@
+"""Forma reciente de los equipos y su evolución en el tiempo.
+
+Cada partido se desdobla en dos filas equipo-partido (local y visitante)
+que se ordenan por equipo y fecha. Sobre ese array las medias móviles de
+los últimos N partidos (puntos, goles a favor y en contra, posesión) salen
+de sumas acumuladas: la suma de la ventana es la diferencia de dos
+posiciones, sin bucles por equipo. Los agregados por semana o mes usan
+`np.add.reduceat` sobre los mismos tramos ordenados.
+
+La forma se calcula sobre todo el histórico de las competiciones
+filtradas; al mover el rango de fechas solo se recorta, sin recalcular, y
+la forma del primer día del rango ya tiene en cuenta los partidos
+anteriores.
+"""
+import os
+import numpy as np
+import pandas as pd
+from queries import key_to_date
+
+TRENDS_CONFIG = {
+    'window': int(os.getenv('TREND_WINDOW', '5')),
+    'top_n': int(os.getenv('TREND_TOP_N', '8'))
+}
+
+# Métricas por equipo-partido y su etiqueta en el gráfico
+TREND_METRICS = {
+    'points': 'Puntos por partido',
+    'goals_for': 'Goles a favor',
+    'goals_against': 'Goles en contra',
+    'possession': 'Posesión (%)'
+}
+# Granularidad: 'match' es la media móvil por partido; el resto, periodos de pandas
+TREND_PERIODS = {'match': 'Por partido', 'W': 'Por semana', 'M': 'Por mes'}
+
+FORM_COLUMNS = ['team', 'match_date', 'window'] + list(TREND_METRICS) + [f"form_{m}" for m in TREND_METRICS]
+
+
+def _empty_form():
+    return pd.DataFrame(columns=FORM_COLUMNS)
+
+
+def team_match_arrays(df):
+    """Filas equipo-partido ordenadas por equipo y fecha: (equipos, códigos, fechas, métricas)"""
+    teams = df['home_team'].cat.categories
+    home = df['home_team'].cat.codes.to_numpy()
+    away = df['away_team'].cat.codes.to_numpy()
+    dates = df['match_date'].to_numpy(dtype='datetime64[ns]')
+    home_score = df['home_score'].to_numpy(dtype='float32')
+    away_score = df['away_score'].to_numpy(dtype='float32')
+    possession = df['possession_home'].to_numpy(dtype='float32')
+
+    codes = np.concatenate([home, away])
+    goals_for = np.concatenate([home_score, away_score])
+    goals_against = np.concatenate([away_score, home_score])
+    metrics = {
+        'points': np.select([goals_for > goals_against, goals_for == goals_against], [3, 1], 0).astype('float32'),
+        'goals_for': goals_for,
+        'goals_against': goals_against,
+        'possession': np.concatenate([possession, 100 - possession])
+    }
+    # Sin equipo (código -1) o sin marcador no cuentan para la forma
+    valid = (codes >= 0) & ~np.isnan(goals_for) & ~np.isnan(goals_against)
+    codes, dates = codes[valid], np.concatenate([dates, dates])[valid]
+    order = np.lexsort((dates, codes))
+    return teams, codes[order], dates[order], {name: values[valid][order] for name, values in metrics.items()}
+
+
+def _window_sum(values, lower):
+    """Suma de values[lower[i]:i + 1] para cada i a partir de la suma acumulada"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype='float64')])
+    return cumulative[1:] - cumulative[lower]
+
+
+def rolling_form(df, window=None):
+    """Media de cada métrica en los últimos `window` partidos de cada equipo.
+
+    Devuelve una fila por equipo y partido (ordenadas por equipo y fecha)
+    con el valor del partido y su forma (`form_<métrica>`); `window` es el
+    número de partidos de la ventana, menor al principio del histórico.
+    """
+    window = window or TRENDS_CONFIG['window']
+    if df.empty:
+        return _empty_form()
+    teams, codes, dates, metrics = team_match_arrays(df)
+    positions = np.arange(len(codes))
+    # Inicio del tramo de cada equipo y límite inferior de la ventana (sin cruzar de equipo)
+    starts = np.r_[True, codes[1:] != codes[:-1]] if len(codes) else np.zeros(0, dtype=bool)
+    group_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    lower = np.maximum(positions - window + 1, group_start)
+
+    form = pd.DataFrame({
+        'team': pd.Categorical.from_codes(codes, categories=teams),
+        'match_date': dates,
+        'window': (positions - lower + 1).astype('int16')
+    })
+    for name, values in metrics.items():
+        form[name] = values
+        missing = np.isnan(values)
+        # La posesión puede faltar (la API gratuita no trae estadísticas): media de los valores presentes
+        counts = _window_sum(~missing, lower)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            form[f"form_{name}"] = (_window_sum(np.where(missing, 0, values), lower) / counts).astype('float32')
+    return form
+
+
+def slice_form(form, start_key=None, end_key=None):
+    """Recorta la forma precalculada al rango de fechas AAAAMMDD (sin recalcular)"""
+    if form.empty:
+        return form
+    dates = form['match_date'].to_numpy()
+    mask = np.ones(len(form), dtype=bool)
+    if start_key is not None:
+        mask &= dates >= np.datetime64(key_to_date(start_key))
+    if end_key is not None:
+        mask &= dates < np.datetime64(key_to_date(end_key)) + np.timedelta64(1, 'D')
+    return form.loc[mask].reset_index(drop=True)
+
+
+def period_form(form, period):
+    """Media de cada métrica por equipo y semana ('W') o mes ('M')"""
+    if form.empty:
+        return pd.DataFrame(columns=['team', 'period', 'matches'] + list(TREND_METRICS))
+    codes = form['team'].cat.codes.to_numpy()
+    periods = form['match_date'].dt.to_period(period).dt.start_time.to_numpy()
+    # Las filas ya vienen ordenadas por equipo y fecha: cada tramo (equipo, periodo) es contiguo
+    boundaries = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (periods[1:] != periods[:-1])])
+    matches = np.diff(np.r_[boundaries, len(codes)])
+    result = pd.DataFrame({
+        'team': pd.Categorical.from_codes(codes[boundaries], categories=form['team'].cat.categories),
+        'period': periods[boundaries],
+        'matches': matches
+    })
+    for name in TREND_METRICS:
+        values = form[name].to_numpy()
+        missing = np.isnan(values)
+        counts = np.add.reduceat((~missing).astype('int32'), boundaries)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[name] = (np.add.reduceat(np.where(missing, 0, values), boundaries) / counts).astype('float32')
+    return result
+
+
+def select_teams(form, team_names=(), top_n=None):
+    """Equipos a dibujar: los seleccionados o, si no hay, los que más partidos jugaron en el rango"""
+    if form.empty:
+        return []
+    if team_names:
+        present = set(form['team'].cat.categories[np.unique(form['team'].cat.codes)])
+        return [name for name in team_names if name in present]
+    counts = np.bincount(form['team'].cat.codes.to_numpy(), minlength=len(form['team'].cat.categories))
+    points = np.bincount(form['team'].cat.codes.to_numpy(), weights=form['points'].to_numpy(),
+                         minlength=len(counts))
+    # Más partidos primero y, a igualdad, más puntos
+    order = np.lexsort((-points, -counts))[:top_n or TRENDS_CONFIG['top_n']]
+    return [form['team'].cat.categories[code] for code in order if counts[code] > 0]
+
+
+def trend_series(form, metric, period='match', team_names=(), top_n=None):
+    """Serie para el gráfico: (DataFrame team/x/valor, nombre de la columna x)"""
+    teams = select_teams(form, team_names, top_n)
+    if not teams:
+        return pd.DataFrame(columns=['team', 'match_date', metric]), 'match_date'
+    # Filtrar antes de agregar: el coste del gráfico no depende del número total de equipos
+    form = form.loc[form['team'].isin(teams)]
+    form = form.assign(team=form['team'].cat.remove_unused_categories())
+    if period == 'match':
+        series = form[['team', 'match_date', 'window', f"form_{metric}"]].rename(columns={f"form_{metric}": metric})
+        return series, 'match_date'
+    return period_form(form, period)[['team', 'period', 'matches', metric]], 'period'